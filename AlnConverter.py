@@ -72,23 +72,17 @@ class AlnConverter(tkinter.Frame):
     def convert(self):        
         self.output_frame.text_widget.delete(1.0, tkinter.END)
         seqs = list()
-        import udav_fasta      
+        import udav_fasta, udav_base
         try: #------------------------------------ 1) Input
-            for string in self.input_frame.get_strings():
-                string = string.strip()
-                if len(string) == 0:
-                    continue
-                if string[0] == "#": # Now also considering output of <bioenergetics_graph.py>
-                    continue
-                if string[0] == ">":               
-                    new_seq = udav_fasta.get_sequence_data(string, self.input_format.get()) 
-                    seqs.append(new_seq)
-                else:
-                    seqs[-1].sequence += string 
+            # Now also considering output of <bioenergetics_graph.py> (comments with '#')
+            for (name, sequence) in udav_base.iterate_fasta(self.input_frame.text_widget, "#"):
+                new_seq = udav_fasta.get_sequence_data(">" + name, self.input_format.get()) 
+                new_seq.sequence = sequence
+                seqs.append(new_seq)
             self.host.set_status("Successful convertion!", self.host.header)   
         except udav_fasta.FastaException:
             self.host.set_status("Wrong input fasta format, check that it matches your selecton!", "#FF0000")            
-        del udav_fasta
+        del udav_fasta, udav_base
 
         prot_type = self.output_class.get()
         if prot_type == "":
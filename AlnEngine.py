@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains stages of the <Alnalyser> pipeline which do not depend on Tkinter:
+alignment parsing, purification (cut of the gappy columns, self-hits, length filters),
+selection of proteins to remove and features obtaining. All stages work with texts
+(in the same format as in the project files) or with in-memory objects, so they are
+used both by the GUI tabs and by the <Aln_run.py> script.
+
+Modules from the <script_dir> (udav_base, udav_soft, remove_seq_limits, obtain_features) should be importable
+(i.e. <script_dir> should be added to the sys.path) before the stages are called
+"""
+import os, re, subprocess
+import io, contextlib, hashlib
+import Settings
+
+PARSE_SECTIONS = ["fixed", "pure", "ngphylogeny", "blocks_regions", "ids"]
+PURIFICATION_TAGS = ["no_hit", "poor_hit", "partial_hit", "short_seq", "long_seq"]
+
+def run_command(args, verbose = True, job = None):
+    """
+    Method runs the program with <args> (list of the program path and its arguments; no shell is
+    used, so the process is the program itself) and returns its exit code; output is hidden if
+    <verbose> is False. If <job> (see <AlnJobs.Job>) is given, the process is registered in it,
+    so it is terminated if the job is cancelled (<AlnJobs.Job_cancelled> is then raised)
+    """
+    output = None
+    if not verbose:
+        output = subprocess.DEVNULL
+    process = subprocess.Popen(args, stdout = output, stderr = output)
+    if job != None:
+        job.set_process(process)
+    exit_code = process.wait()
+    if job != None:
+        job.set_process(None)
+        job.check_cancelled()
+    return exit_code
+
+def write_text_file(curr_text, filename, use_codecs = False):
+    """
+    Method writes <curr_text> into the <filename> with a single call. Returns False
+    (and does not create the file) if the text is empty
+    """
+    if len(curr_text.strip()) == 0:
+        return False
+    if use_codecs:
+        output_file = open(filename, "w", encoding = "utf_8")
+    else:
+        output_file = open(filename, "w")
+    output_file.write(curr_text + "\n")
+    output_file.close()
+    return True
+
+def read_text_file(filename, use_codecs = False):
+    """
+    Method returns stripped text of the <filename> (same as it is shown in the text widgets)
+    """
+    if use_codecs:
+        input_file = open(filename, "r", encoding = "utf_8")
+    else:
+        input_file = open(filename, "r")
+    curr_text = input_file.read()
+    input_file.close()
+    return curr_text.strip()
+
+def read_domain_info_file(dom_filename):
+    dom_dict = dict()
+    dom_file = open(dom_filename)
+    for string in dom_file:
+        string = string.strip()
+        if len(string) == 0:
+            continue
+        fields = string.split("\t")
+        dom_dict[fields[0]] = (fields[1], fields[2])
+    dom_file.close()
+    return dom_dict
+
+class Artifact_store:
+    """
+    Class keeps objects built from the section texts (parsed alignment, featured sequences,
+    self-hit tables) in memory, so they are shared between the stages instead of being
+    passed through temporary files. Each object is kept with the key of the texts it was
+    built from and is rebuilt only if any of them changes. Files are created only for the
+    external programs, always with the same scratch prefix (<scratch_prefix>.<extension>)
+    """
+    def __init__(self, scratch_prefix):
+        self.scratch_prefix = scratch_prefix
+        self.artifacts = dict() # Name of the artifact to a tuple of (key, object)
+
+    def get_key(self, texts):
+        key = hashlib.md5()
+        for curr_text in texts:
+            key.update(curr_text.strip().encode("utf-8"))
+            key.update(b"\0")
+        return key.hexdigest()
+
+    def get(self, name, texts, builder):
+        """
+        Method returns object <name> built by the <builder> from the list of <texts> (they are
+        given to it as arguments); if the same texts were already used, stored object is returned
+        """
+        key = self.get_key(texts)
+        record = self.artifacts.get(name)
+        if (record != None) and (record[0] == key):
+            return record[1]
+        result = builder(*texts)
+        self.artifacts[name] = (key, result)
+        return result
+
+    def find(self, name, texts):
+        """
+        Method returns object <name> if it was built from the same <texts>, otherwise None
+        """
+        record = self.artifacts.get(name)
+        if (record != None) and (record[0] == self.get_key(texts)):
+            return record[1]
+        return None
+
+    def put(self, name, texts, result):
+        self.artifacts[name] = (self.get_key(texts), result)
+
+    def discard(self, name = None):
+        """
+        Method removes artifact <name> (or all of them if <name> is None)
+        """
+        if name == None:
+            self.artifacts.clear()
+        elif name in self.artifacts:
+            del self.artifacts[name]
+
+    def get_scratch_filename(self, extension):
+        return "%s.%s" % (self.scratch_prefix, extension)
+
+    def write_scratch(self, extension, curr_text):
+        """
+        Method writes <curr_text> into the scratch file with the <extension> and returns its name
+        """
+        scratch_filename = self.get_scratch_filename(extension)
+        write_text_file(curr_text, scratch_filename)
+        return scratch_filename
+
+    def remove_scratch(self, extensions):
+        for extension in extensions:
+            scratch_filename = self.get_scratch_filename(extension)
+            if os.path.isfile(scratch_filename):
+                os.remove(scratch_filename)
+
+def get_output_context(verbose):
+    """
+    Method returns context manager which hides printed output of the in-process stages
+    if <verbose> is False
+    """
+    if verbose:
+        return contextlib.nullcontext()
+    return contextlib.redirect_stdout(io.StringIO())
+
+def read_alignment_sequences(aln_text):
+    """
+    Method reads alignment given as fasta <aln_text> into the list of <udav_base.Alignment_sequence>
+    objects. Returns None (with a warning) if the alignment is empty or sequences are of different length
+    """
+    import udav_base
+    seq_list = list()
+    if len(aln_text.strip()) != 0:
+        seq_list = udav_base.read_alignment(aln_text.split("\n"))
+    del udav_base
+    if len(seq_list) == 0:
+        print ("    [..WARNING..] Alignment is empty!")
+        return None
+    if isinstance(seq_list, str): # Error message was returned
+        print ("    [..WARNING..] %s" % seq_list)
+        return None
+    return seq_list
+
+def parse_alignment(aln_text, verbose = True):
+    """
+    Method parses the alignment given as fasta <aln_text> with methods of the <remove_seq_limits.py>
+    script (same as '-d -x' options) without temporary files. Returns dictionary with texts of
+    the sections listed in PARSE_SECTIONS ('blocks_regions' is present only if the alignment
+    contained BLOCKS sequence)
+    """
+    seq_list = read_alignment_sequences(aln_text)
+    if seq_list == None:
+        return dict()
+    import remove_seq_limits
+    try:
+        with get_output_context(verbose):
+            texts = remove_seq_limits.parse_alignment(seq_list, delete = True, id_only = True)
+    except SystemExit: # Fatal errors of the script should not stop the caller
+        print ("    [..WARNING..] Alignment was not parsed due to the fatal error!")
+        texts = dict()
+    del remove_seq_limits
+
+    results = dict()
+    for extension in PARSE_SECTIONS:
+        if extension in texts:
+            results[extension] = texts[extension].strip()
+    return results
+
+def get_organism_name(curr_name, curr_id):
+    curr_org_name = curr_name.replace(curr_id, "")
+    if re.match("^[^\|]+\|[^\|]+\|[^\|]+$", curr_name):
+        curr_org_name = curr_name.split("|")[2]
+    elif re.match("^[^\|]+\|[^\|]+$", curr_name):
+        curr_org_name = curr_name.split("|")[1]
+    return curr_org_name
+
+def read_alignment_matrix(fasta_text):
+    """
+    Method reads alignment given as fasta <fasta_text> into <udav_base.Alignment_matrix>
+    (ValueError is raised if sequences are of different length)
+    """
+    import udav_base
+    seqs = udav_base.Alignment_matrix()
+    for (name, sequence) in udav_base.iterate_fasta(fasta_text.split("\n")):
+        seqs.add_sequence(name.strip(">"), sequence)
+    del udav_base
+    return seqs
+
+class Purification_data:
+    """
+    Data of the purification stage: mainly gappy parts of the alignment are cut according
+    to the <presence_threshold> (in %), and for each protein its organism and sequence are stored
+    """
+    def __init__(self, seqs, presence_threshold, max_name_length = 50, separator = "  :  "):
+        import udav_base
+        matrix = udav_base.get_alignment_matrix(seqs)
+        (self.valid_start, self.valid_end) = matrix.get_occupancy().get_range(presence_threshold)
+        self.seqs_cut = list()                      # List of sequences with the mainly gappy parts of alignment cut
+        self.id_to_org_and_seq = dict()             # Hash of protein ids to a tuple of (0) their organism name and (1) full sequences
+        self.id_list = list()                       # List of protein ids in order of their occurence
+        self.strings = list()                       # Strings to show: names fitted to <max_name_length> and cut sequences
+        self.name_length = max_name_length + len(separator)
+        self.max_name_length = max_name_length      # Number of name symbols shown before the separator
+        self.id_to_features = None                  # Self-hits found by <find_self_hits()>
+
+        for i in range(len(matrix)):
+            curr_name = matrix.names[i]
+            curr_id = matrix.ids[i]
+            fit_name = curr_name[0:max_name_length]
+            if len(fit_name) < max_name_length:
+                fit_name += (max_name_length - len(fit_name)) * " "
+            seq_part = matrix.get_sequence(i, self.valid_start, self.valid_end)
+            self.seqs_cut.append(udav_base.Sequence(curr_name, seq_part))
+            self.strings.append(fit_name + ("%s%s" % (separator, seq_part)))
+            if curr_id in self.id_to_org_and_seq:
+                print ("    [..WARNING..] Non-unique ID '%s' detected; purification may work unproperly!" % curr_id)
+            self.id_to_org_and_seq[curr_id] = (get_organism_name(curr_name, curr_id), matrix.get_sequence(i))
+            self.id_list.append(curr_id)
+        del udav_base
+
+def get_fasta_text(seqs):
+    """
+    Method returns fasta text of the <seqs> (objects with <name> and <sequence>), one line per sequence
+    """
+    return "".join([">%s\n%s\n\n" % (s.name, s.sequence) for s in seqs])
+
+def write_query_shards(seqs, filename_prefix, shard_number):
+    """
+    Method splits <seqs> (objects with <name> and <sequence>) into at most <shard_number> parts
+    with close total number of residues and writes non-empty ones into the <filename_prefix>_0, _1, ... files.
+    Order of the sequences is kept (parts are consecutive); returns list of the written filenames
+    """
+    total_length = sum([len(s.sequence) for s in seqs])
+    shards = list()
+    for i in range(shard_number):
+        shards.append(list())
+    curr_length = 0
+    for s in seqs: # Sequence goes to the part where its middle is
+        middle = 2 * curr_length + len(s.sequence)
+        shards[min(shard_number - 1, middle * shard_number // max(1, 2 * total_length))].append(s)
+        curr_length += len(s.sequence)
+    filenames = list()
+    for i in range(shard_number):
+        if len(shards[i]) == 0:
+            continue
+        filename = "%s_%i" % (filename_prefix, len(filenames))
+        write_text_file("".join([">%s\n%s\n" % (s.name, s.sequence.replace("-", "")) for s in shards[i]]), filename)
+        filenames.append(filename)
+    return filenames
+
+def find_self_hits(seqs_cut, hmmer_dir, temp_prefix, verbose = True, job = None):
+    """
+    Method builds a profile from the <seqs_cut> alignment and searches it against the same
+    sequences without gaps. Returns dictionary of protein IDs to their self-hit features
+    (see <udav_soft.read_Pfam_output()>). <job> (if given) is informed about each step and
+    could cancel the search (see <run_command()>)
+    """
+    import udav_base, udav_soft
+    # --------------------------------------- 1) HMMbuild
+    #FIX: version 1.2.0 (both inputs are prepared in memory and written with a single call)
+    aligned_filename = "%s.aln" % temp_prefix
+    pure_filename = "%s.pure" % temp_prefix
+    write_text_file(udav_base.get_pure_text(seqs_cut, True, True)[0], pure_filename)
+    write_text_file(get_fasta_text(seqs_cut), aligned_filename)
+    (hmmbuild_name, hmmbuild_path) = Settings.get_program_name(hmmer_dir, "hmmbuild")
+    (hmmsearch_name, hmmsearch_path) = Settings.get_program_name(hmmer_dir, "hmmsearch")
+    hmm_filename = "%s.hmm" % temp_prefix
+    result_filename = "%s.self_out" % temp_prefix
+    domtable_filename = "%s.self_domtable" % temp_prefix
+    table_filename = "%s.self_table" % temp_prefix
+
+    try:
+        if job != None:
+            job.report("Running HMMbuild")
+        print ("    Running HMMbuild for the cutted alignment...")
+        #FIX: version 0.2.8 (--wnone option suppresses weightening of sequences in hmmbuild thus poor sequences do not alter profile that much)
+        run_command([hmmbuild_path, "--wnone", "--informat=afa", hmm_filename, aligned_filename], verbose, job)
+        # --------------------------------------- 2) HMMsearch
+        if job != None:
+            job.report("Running HMMsearch")
+        print ("    Running HMMsearch to search for the self-hits...")
+        run_command([hmmsearch_path, "--tblout", table_filename, "--domtblout", domtable_filename, "-o", result_filename, hmm_filename, pure_filename], verbose, job)
+
+        # --------------------------------------- 3) Obtaining features
+        if job != None:
+            job.report("Obtaining self-hit features")
+        print ("    Obtaining self-hit features...")
+        (id_to_features, domains) = udav_soft.read_Pfam_output(domtable_filename, "1.0", False, None, add_score = True, hmmsearch_output = True)
+    finally: # Files are removed even if the search was cancelled
+        for curr_filename in [aligned_filename, pure_filename, hmm_filename, result_filename, domtable_filename, table_filename]:
+            if os.path.isfile(curr_filename):
+                os.remove(curr_filename)
+    del udav_base, udav_soft
+    return id_to_features
+
+def get_self_hit_info(id_to_org_and_seq, id_to_features, evalue_threshold, sigma_num, actions, marked):
+    """
+    Method finds proteins without self-hits, with poor (e-value above <evalue_threshold>) and
+    partial (shorter than the mean by more than <sigma_num> std. deviations) self-hits.
+    Tuples (protein_id, reason, organism) are appended to the <actions> list and IDs are appended
+    to the respective lists of the <marked> dictionary. Returns tuple of arguments for the
+    log histogram of self-hit lengths, or None if no self-hits were found
+    """
+    hit_positions = dict()
+    print ("    List of self-hits (<from-to..e-value..Score>):")
+    for protein_id in id_to_org_and_seq.keys():
+        (curr_org, curr_seq) = id_to_org_and_seq[protein_id]
+        if not protein_id in id_to_features: # No hit found at all
+            actions.append((protein_id, "no hit", curr_org))
+            marked["no_hit"].append(protein_id)
+        else:
+            #[profile name] 1..456..1e-56..256.7 <...>
+            lowest_evalue = 100
+            best_start = -1
+            best_end = -1
+            curr_features = id_to_features[protein_id].split(" ")[1:]
+            print ("    %s\t%s" % (protein_id, curr_features))
+            for feature in curr_features:
+                values = feature.strip("\t").split("..")
+                evalue = float(values[2])
+                if evalue < lowest_evalue:
+                    lowest_evalue = evalue
+                    best_start = values[0]
+                    best_end = values[1]
+            if lowest_evalue > evalue_threshold:
+                marked["poor_hit"].append(protein_id)
+                actions.append((protein_id, "poor hit", curr_org))
+            hit_positions[protein_id] = (int(best_start), int(best_end))
+    if len(hit_positions) == 0:
+        print ("    [..WARNING..] No self-hits found, length of hits will not be analysed")
+        return None
+
+    mean_length = 0
+    values = list()
+    for protein_id in hit_positions.keys():
+        curr_length = hit_positions[protein_id][1] - hit_positions[protein_id][0] + 1
+        values.append(curr_length)
+        mean_length += curr_length
+    mean_length = float(mean_length)/len(hit_positions.keys())
+    dispersion = 0
+    for protein_id in hit_positions.keys():
+        curr_length = hit_positions[protein_id][1] - hit_positions[protein_id][0] + 1
+        dispersion += (curr_length - mean_length) ** 2
+    dispersion = dispersion/len(hit_positions.keys())
+    std_deviation = dispersion ** 0.5
+    for protein_id in hit_positions.keys():
+        curr_length = hit_positions[protein_id][1] - hit_positions[protein_id][0] + 1
+        if mean_length - curr_length > sigma_num * std_deviation: # Oh-o
+            marked["partial_hit"].append(protein_id)
+            actions.append((protein_id, "partial hit", id_to_org_and_seq[protein_id][0]))
+
+    info_string = "Length of hit part to a profile created from the alignment\n"
+    info_string += "M(x): %.3f; D(x): %.3f; std. deviation = %.3f\n" % (mean_length, dispersion, std_deviation)
+    info_string += "Number of std. deviations allowed: %s" % sigma_num
+
+    begin = int(mean_length - (sigma_num * std_deviation))
+    end = int(mean_length + (sigma_num * std_deviation))
+    nsteps = 20
+    step = (float(end - begin))/nsteps
+    step = int(step)
+    return (values, info_string, begin, step, nsteps)
+
+def get_length_info(id_to_org_and_seq, min_length, max_length, actions, marked):
+    """
+    Method marks proteins shorter than <min_length> and longer than <max_length>
+    (None if not considered); see <get_self_hit_info()> for <actions> and <marked>
+    """
+    for protein_id in id_to_org_and_seq.keys():
+        curr_seq = id_to_org_and_seq[protein_id][1].replace("-", "")
+        if (min_length != None) and (len(curr_seq) < min_length):
+            actions.append((protein_id, "short hit", id_to_org_and_seq[protein_id][0]))
+            marked["short_seq"].append(protein_id)
+        if (max_length != None) and (len(curr_seq) > max_length):
+            actions.append((protein_id, "long hit", id_to_org_and_seq[protein_id][0]))
+            marked["long_seq"].append(protein_id)
+
+def get_purification_actions(id_to_org_and_seq, id_to_features, evalue_threshold = 1e-5, sigma_num = 2, min_length = None, max_length = None):
+    """
+    Method applies purification options to the proteins. Returns a tuple of:
+    (0) list of suggested actions as tuples (protein_id, reason, organism);
+    (1) dictionary of PURIFICATION_TAGS to lists of protein IDs marked with them;
+    (2) tuple of arguments for the log histogram of self-hit lengths (None if
+        self-hits were not searched or found)
+    """
+    actions = list()
+    marked = dict()
+    for tag_name in PURIFICATION_TAGS:
+        marked[tag_name] = list()
+    histogram = None
+    if id_to_features != None:
+        histogram = get_self_hit_info(id_to_org_and_seq, id_to_features, evalue_threshold, sigma_num, actions, marked)
+    get_length_info(id_to_org_and_seq, min_length, max_length, actions, marked)
+    return (actions, marked, histogram)
+
+def merge_purification_actions(actions):
+    """
+    Method merges reasons for the same protein in the <actions> (see <get_purification_actions()>).
+    Returns list of tuples (protein_id, list of unique reasons, organism) in order of the first occurence
+    """
+    id_to_action = dict()
+    for (protein_id, reason, curr_org) in actions:
+        if not protein_id in id_to_action:
+            id_to_action[protein_id] = (protein_id, list(), curr_org)
+        if not reason in id_to_action[protein_id][1]: # Different reason
+            id_to_action[protein_id][1].append(reason)
+    return list(id_to_action.values())
+
+def get_organism_counts(id_to_org_and_seq, ids_to_remove = ()):
+    """
+    Method returns dictionary of organisms to the number of their proteins in the <id_to_org_and_seq>
+    which are not in the <ids_to_remove>
+    """
+    org_to_count = dict()
+    for protein_id in id_to_org_and_seq.keys():
+        curr_org = id_to_org_and_seq[protein_id][0]
+        if not curr_org in org_to_count:
+            org_to_count[curr_org] = 0
+        if not protein_id in ids_to_remove:
+            org_to_count[curr_org] += 1
+    return org_to_count
+
+def set_organism_remains(ids_to_remove, id_to_org_and_seq, org_to_remaining = None):
+    """
+    For each protein ID in <ids_to_remove> (dictionary of IDs to lists [reason, organism_remains])
+    method sets if any other protein from the same organism remains in the sample. Number of the
+    remaining proteins of each organism (<org_to_remaining>) is counted if not given.
+    Returns number of proteins which were not found (likely were removed previously)
+    """
+    if org_to_remaining == None:
+        org_to_remaining = get_organism_counts(id_to_org_and_seq, ids_to_remove)
+    p = 0
+    for protein_id in ids_to_remove.keys():
+        if not protein_id in id_to_org_and_seq: # This protein was likely removed already
+            p += 1
+            continue
+        ids_to_remove[protein_id][1] = org_to_remaining[id_to_org_and_seq[protein_id][0]] > 0
+    return p
+
+def obtain_features(fixed_text, domain_text, TMHMM_text, evalue, overlap, max_dist, max_hmm_overlap, unite = False, verbose = True):
+    """
+    Method obtains features of the alignment given as fasta <fixed_text> with domains from the
+    HMMer --domtblout <domain_text> and TMHMM results <TMHMM_text> (any of them could be empty)
+    by methods of the <obtain_features.py> script, without temporary files.
+    Returns tuple of (0) text of the features and (1) dictionary of domain IDs found to a tuple of
+    their (occurence, description), or None if domain table was empty
+    """
+    seq_list = read_alignment_sequences(fixed_text)
+    if seq_list == None:
+        return ("", None)
+    domain_source = None
+    if len(domain_text.strip()) != 0:
+        domain_source = io.StringIO(domain_text)
+    TMHMM_source = None
+    if len(TMHMM_text.strip()) != 0:
+        TMHMM_source = io.StringIO(TMHMM_text)
+    import obtain_features
+    try:
+        with get_output_context(verbose):
+            (features_text, domains) = obtain_features.get_features_text(seq_list, TMHMM_source, domain_source, float(evalue), float(overlap),
+                                                                         unite, int(max_dist), float(max_hmm_overlap))
+    except SystemExit: # Fatal errors (e.g. wrong domain table format) should not stop the caller
+        print ("    [..WARNING..] Features were not obtained due to the fatal error!")
+        (features_text, domains) = ("", None)
+    del obtain_features
+
+    domain_dict = None
+    if domains != None:
+        domain_dict = dict()
+        for domain in domains.values():
+            domain_dict[domain.name] = (domain.ac, domain.description)
+    return (features_text.strip(), domain_dict)
@@ -2,7 +2,7 @@
 import os
 import tkinter
 import tkinter.filedialog as tkFileDialog
-import Aln_basic
+import Aln_basic, AlnEngine
 
 class AlnFeatures(tkinter.Frame):
     def __init__(self, parent, host):
@@ -20,6 +20,7 @@ class AlnFeatures(tkinter.Frame):
         self.unite_domains = None     # Variable for the boolean option to apply domain unite or not
         self.max_distance = None      # Entry for the parameter of domain uniting
         self.max_hmm_overlap = None   # Entry for the parameter of domain uniting
+        self.obtain_button = None     # Button to obtain features
         
         self.create_UI()    
 
@@ -80,8 +81,8 @@ class AlnFeatures(tkinter.Frame):
         radio = tkinter.Radiobutton(self.features.panel, text = "Pfam", variable = self.feature_mode, value = "Pfam")
         radio.grid(row = 0, column = 12, sticky = "NSW", padx = self.p, pady = self.p)
 
-        obtain = tkinter.Button(self.features.panel, text = "Obtain", background = self.host.header, foreground = "#FFFFFF", command = self.obtain_features)
-        obtain.grid(row = 0, column = 13, sticky = "NSW", padx = self.p, pady = self.p)
+        self.obtain_button = tkinter.Button(self.features.panel, text = "Obtain", background = self.host.header, foreground = "#FFFFFF", command = self.obtain_features)
+        self.obtain_button.grid(row = 0, column = 13, sticky = "NSW", padx = self.p, pady = self.p)
         central_panel.add(self.features)
 
         self.update_idletasks()
@@ -93,6 +94,9 @@ class AlnFeatures(tkinter.Frame):
         TMHMM_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.TMHMM" % self.host.get_project_name())
         if ask_filename:
             TMHMM_filename = tkFileDialog.asksaveasfilename(filetypes = (("Plain output of the TMHMM", "*.TMHMM"), ("All", "*.*")))
+        if not ask_filename:
+            self.host.save_section(self.TMHMM_results.text_widget, TMHMM_filename)
+            return
         Aln_basic.write_widget_into_file(self.TMHMM_results.text_widget, TMHMM_filename, ask_filename)
 
     def save_features(self, ask_filename = True):
@@ -103,44 +107,24 @@ class AlnFeatures(tkinter.Frame):
 
     def obtain_features(self):
         print ("    Obtaining features...")
+        self.host.load_pending_sections(self.host.parse_tab)
         curr_mode = self.feature_mode.get()
-        domain_filename = os.path.join(self.host.settings.work_dir, "%s.domain_table" % self.host.temp_name)
-        domain_not_empty = None
+        Aln_basic.finish_chunked_loading() # Domain table could still be loaded by chunks
         if curr_mode == "COG":
-            domain_not_empty = Aln_basic.write_widget_into_file(self.hmmresults_COG.text_widget, domain_filename)                
+            domain_text = self.hmmresults_COG.text_widget.get(1.0, tkinter.END)
         else:
-            domain_not_empty = Aln_basic.write_widget_into_file(self.hmmresults_Pfam.text_widget, domain_filename)
-        fixed_filename = os.path.join(self.host.settings.work_dir, "%s.fixed" % self.host.temp_name)
-        dom_filename = os.path.join(self.host.settings.work_dir, "%s.domain_info" % self.host.temp_name)
-        Aln_basic.write_widget_into_file(self.host.parse_tab.fixed.text_widget, fixed_filename)
-
-        obtain_features_path = os.path.join(self.host.settings.script_dir, "obtain_features.py")
-
-        data_for_features = ""
-        if domain_not_empty:
-            data_for_features += "-p %s" % domain_filename
-        if not self.TMHMM_results.text_is_empty():
-            TM_filename = os.path.join(self.host.settings.work_dir, "%s.TMHMM" % self.host.temp_name)           
-            Aln_basic.write_widget_into_file(self.TMHMM_results.text_widget, TM_filename)
-            data_for_features += " -t %s" % TM_filename
-        self.host.set_status("Working")
-        features_filename = os.path.join(self.host.settings.work_dir, "%s.features" % self.host.temp_name)
-        command = "%s -i %s -o %s %s -e %s -f %s --max_dist %s --max_hmm_overlap %s -d %s" % (obtain_features_path, 
-                                                       fixed_filename, features_filename, data_for_features, 
-                                                       self.evalue_threshold.get(), self.overlap_threshold.get(),
-                                                       self.max_distance.get(), self.max_hmm_overlap.get(), dom_filename)        
-        if self.unite_domains.get():
-            command += " --unite"
-        if not self.host.verbose.get():
-            command += " 1> nul 2> nul"
-        print ("Executing command: '%s'" % command)
-        os.system(command)
-
-        self.host.set_status("Ready")
-        Aln_basic.read_widget_from_file(self.features.text_widget, os.path.join(self.host.settings.work_dir, "%s.features" % self.host.temp_name))
+            domain_text = self.hmmresults_Pfam.text_widget.get(1.0, tkinter.END)
+        #FIX: version 1.2.0 (features are obtained by the <AlnEngine> in a separate process)
+        args = (self.host.parse_tab.fixed.text_widget.get(1.0, tkinter.END), domain_text, self.TMHMM_results.text_widget.get(1.0, tkinter.END),
+                self.evalue_threshold.get(), self.overlap_threshold.get(), self.max_distance.get(), self.max_hmm_overlap.get(),
+                self.unite_domains.get(), self.host.verbose.get())
+        self.host.jobs.submit("Features", AlnEngine.obtain_features, args, self.show_features, [self.obtain_button], in_process = True)
+
+    def show_features(self, result):
+        (features_text, domain_dict) = result
+        Aln_basic.read_widget_from_string(self.features.text_widget, features_text)
         
-        if os.path.isfile(dom_filename): # File was created (non-empty domains)
-            domain_dict = Aln_basic.read_domain_info_file(dom_filename)
+        if domain_dict != None: # File was created (non-empty domains)
             self.host.load_domain_info(domain_dict) # Loading domain info into the info tab
         print ("    [..DONE..]")  
 
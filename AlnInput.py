@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
-import os, re
+import os, re, io
 import tkinter
 import tkinter.messagebox as tkMessageBox
-import Aln_basic, Settings
+import Aln_basic, Settings, AlnEngine
 
 class AlnInput(tkinter.Frame):
     """
@@ -137,51 +137,55 @@ class AlnInput(tkinter.Frame):
             return
         print ("    Alignment construction started...")
         (muscle_name, muscle_path) = Settings.get_program_name(self.host.settings.muscle_dir, "muscle")
-        unaligned_filename = os.path.join(self.host.settings.work_dir, "%s.fasta" % self.host.temp_name)
-        Aln_basic.write_widget_into_file(self.seq_input_frame.text_widget, unaligned_filename)
-        aligned_filename = os.path.join(self.host.settings.work_dir, "%s.aln" % self.host.temp_name)
+        #FIX: version 1.2.0 (only the files required by the MUSCLE are created, with the scratch prefix)
+        unaligned_filename = self.host.artifacts.write_scratch("fasta", self.seq_input_frame.text_widget.get(1.0, tkinter.END))
+        aligned_filename = self.host.artifacts.get_scratch_filename("aln")
 
-        self.host.set_status("Alignment")
-        maxiters_option = ""
+        muscle_args = [muscle_path, "-in", unaligned_filename, "-out", aligned_filename]
         if self.maxiters.get() != "":
             try:
-                maxiters_option = "-maxiters %i" % int(self.maxiters.get())
+                muscle_args += ["-maxiters", "%i" % int(self.maxiters.get())]
             except TypeError:
                 print ("Option -maxiters is not an integer and is ignored!")
-        gapopen_option = ""
         if self.gapopen.get() != "":
             if Aln_basic.is_negative_float(self.gapopen.get(), "-gapopen"):
-                gapopen_option = "-gapopen %s" % self.gapopen.get()
-        gapextend_option = ""
+                muscle_args += ["-gapopen", self.gapopen.get()]
         if self.gapextend.get() != "":
             if Aln_basic.is_negative_float(self.gapextend.get(), "-gapextend"):
-                gapextend_option = "-gapextend %s" % self.gapextend.get()
-        muscle_command = "%s -in %s -out %s %s %s %s" % (muscle_path, unaligned_filename, aligned_filename, maxiters_option, gapopen_option, gapextend_option)
+                muscle_args += ["-gapextend", self.gapextend.get()]
         print ("Muscle command to be ran:")
-        print (muscle_command)        
-        if self.host.verbose.get():                     
-            os.system(muscle_command)
-        else:
-            os.system("%s 1> nul 2> nul" % muscle_command)
+        print (" ".join(muscle_args))
+        #FIX: version 1.2.0 (MUSCLE is run by a job, so the window is responsive and the run could be cancelled)
+        self.host.jobs.submit("Alignment", self.run_muscle, (muscle_args, aligned_filename, self.insert_blocks.get(), self.host.verbose.get()),
+                              self.show_alignment, [self.seq_input_frame.button],
+                              on_error = lambda error: self.host.set_status("Alignment was not built, check the console!", "#FF0000"))
 
-        Aln_basic.read_widget_from_file(self.aln_input_frame.text_widget, aligned_filename)
-        if self.insert_blocks.get(): # Empty sequence >BLOCKS should be added
-            curr_seqs = Aln_basic.read_fasta_from_strings(self.aln_input_frame.get_strings())
-            self.aln_input_frame.text_widget.delete(1.0, tkinter.END)
-            upd_aln_file = open(aligned_filename, "w")            
+    def run_muscle(self, job, muscle_args, aligned_filename, insert_blocks, verbose):
+        """
+        Method is run by the <self.host.jobs>: returns text of the alignment built by the MUSCLE
+        (with empty >BLOCKS and >SITE sequences if <insert_blocks> is True); widgets are not touched here
+        """
+        try:
+            job.report("running MUSCLE")
+            AlnEngine.run_command(muscle_args, verbose, job)
+            job.report("reading alignment")
+            if not insert_blocks:
+                return AlnEngine.read_text_file(aligned_filename)
+            # Empty sequence >BLOCKS should be added (in memory, the file is not rewritten)
+            curr_seqs = Aln_basic.read_fasta_from_strings(aligned_filename)
+            upd_aln_file = io.StringIO()
             upd_aln_file.write(">BLOCKS\n")
             upd_aln_file.write("%s\n\n" % ("-" * len(curr_seqs[0].sequence)))
             upd_aln_file.write(">SITE\n")
             upd_aln_file.write("%s\n\n" % ("-" * len(curr_seqs[0].sequence)))
             for s in curr_seqs:
                 s.print_fasta(upd_aln_file, 60)
-            upd_aln_file.close()
-            Aln_basic.read_widget_from_file(self.aln_input_frame.text_widget, aligned_filename)            
-                    
-        self.host.set_status("Ready")
+            return upd_aln_file.getvalue()
+        finally:
+            self.host.artifacts.remove_scratch(["fasta", "aln"])
 
-        os.remove(unaligned_filename)
-        os.remove(aligned_filename)
+    def show_alignment(self, aln_text):
+        Aln_basic.read_widget_from_string(self.aln_input_frame.text_widget, aln_text)
         print ("    [..DONE..]")
 
     def check_input(self):
@@ -189,11 +193,9 @@ class AlnInput(tkinter.Frame):
         if self.aln_input_frame.text_is_empty(): # No alignment is provided
             self.host.set_status("No alignment is provided!", "#FF0000")
         else:
-            aligned_filename = os.path.join(self.host.settings.work_dir, "%s.aln" % self.host.temp_name)  
-            Aln_basic.write_widget_into_file(self.aln_input_frame.text_widget, aligned_filename)    
             import udav_base
-            try:
-                seq_list = udav_base.read_alignment(aligned_filename)
+            try: #FIX: version 1.2.0 (alignment is read from the widget directly, not from a temporary file)
+                seq_list = udav_base.read_alignment(self.aln_input_frame.text_widget)
                 if type(seq_list) == type(""): # This means that at least one sequence in alignment differs in length from other
                     self.host.set_status(seq_list, "#FF0000")
                 else:
@@ -220,20 +222,19 @@ class AlnInput(tkinter.Frame):
             except IndexError:
                 self.host.set_status("Alignment is corrupted; check that it is in FASTA format!", "#888800")
             del udav_base
-            os.remove(aligned_filename)
         print ("    [..DONE..]")
 
     def save_alignment(self):
         aligned_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.aln" % self.host.get_project_name())
-        Aln_basic.write_widget_into_file(self.aln_input_frame.text_widget, aligned_filename, False)
+        self.host.save_section(self.aln_input_frame.text_widget, aligned_filename)
   
     def save_sequence_sample(self):
         sequence_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.sample" % self.host.get_project_name())
-        Aln_basic.write_widget_into_file(self.seq_input_frame.text_widget, sequence_filename, False)
+        self.host.save_section(self.seq_input_frame.text_widget, sequence_filename)
 
     def save_taxonomy_data(self):
         tax_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.tax" % self.host.get_project_name())
-        Aln_basic.write_widget_into_file(self.tax_input_frame.text_widget, tax_filename, False)
+        self.host.save_section(self.tax_input_frame.text_widget, tax_filename)
 
     def clear(self):
         self.seq_input_frame.text_widget.delete(1.0, tkinter.END)
@@ -242,6 +243,8 @@ class AlnInput(tkinter.Frame):
 
     def apply_actions(self, ids_to_remove, ids_to_fix):
         print ("    Removement started...")
+        self.host.load_pending_sections(self)
+        self.host.load_pending_sections(self.host.log_tab)
         seqs = None
         if self.seq_input_frame.text_is_empty():
             tkMessageBox.showwarning("Unaligned sequences are not provided", "Alnalyser cannot find unaligned sequences. They will be loaded from the alignment panel and unaligned. Consider building new alignment after this step!")
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+This module runs long stages of the <Alnalyser> (alignment, parsing, self-hits, features,
+project loading) outside of the Tk main loop. Jobs are run either in a thread pool (stages
+which mainly wait for the external programs or files) or in a process pool (stages written
+in Python); their progress and results are put into a queue which is polled from the main
+loop with <after()>, so the widgets are changed only in the main thread.
+External programs which run for hours (e.g. hmmscan against the profile databases) are
+started by the <External_scheduler> instead. Module does not import Tkinter: <master> could be any widget
+"""
+import os, signal, queue, threading, subprocess
+import concurrent.futures
+
+class Job_cancelled(Exception):
+    pass
+
+def stop_process(process, timeout = 10):
+    """
+    Method terminates the <process> (subprocess.Popen) and waits until it exits, so its files are not
+    written any more when they are removed; the process is killed if it is still running after <timeout> seconds
+    """
+    if process.poll() != None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+class Job:
+    """
+    Single running stage; it is given to the functions run in a thread pool, so they could
+    <report()> progress, <check_cancelled()> between steps and register external <process>
+    (it is terminated on cancel). Functions run in a process pool only get their arguments
+    """
+    def __init__(self, name, results, buttons):
+        self.name = name
+        self.results = results       # Queue of the <Job_manager>
+        self.buttons = buttons       # Buttons disabled while the job is running
+        self.cancelled = threading.Event()
+        self.process = None          # External program currently run by the job (subprocess.Popen)
+        self.future = None           # concurrent.futures.Future of the job
+
+    def report(self, stage):
+        self.results.put((self, "progress", stage))
+
+    def check_cancelled(self):
+        if self.cancelled.is_set():
+            raise Job_cancelled(self.name)
+
+    def set_process(self, process):
+        self.process = process
+        if (process != None) and self.cancelled.is_set():
+            stop_process(process)
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.future != None:
+            self.future.cancel()
+        process = self.process
+        if process != None:
+            stop_process(process)
+
+class Job_manager:
+    """
+    Runs jobs and polls their results. <on_progress> is called in the main loop with the
+    job and its current stage (None when the last running job is finished)
+    """
+    def __init__(self, master, on_progress, max_threads = 4, max_processes = None, poll_interval = 100):
+        self.master = master
+        self.on_progress = on_progress
+        self.poll_interval = poll_interval
+        self.thread_pool = concurrent.futures.ThreadPoolExecutor(max_threads)
+        self.max_processes = max_processes
+        self.process_pool = None      # Created when the first process job is submitted
+        self.results = queue.Queue()
+        self.jobs = dict()            # Name of the running job to its <Job> object
+        self.handlers = dict()        # Name of the running job to a tuple of (on_done, on_error)
+        self.polling = False
+
+    def is_running(self, name):
+        return name in self.jobs
+
+    def submit(self, name, function, args = (), on_done = None, buttons = (), in_process = False, on_error = None):
+        """
+        Method starts the job <name>: function(job, *args) is called in a thread pool or, if <in_process>
+        is True, function(*args) is called in a process pool (it should be importable and return picklable result).
+        <on_done> is called in the main loop with the result; <on_error> (if given) with the exception.
+        Returns <Job> object or None if the job with the same name is already running
+        """
+        if name in self.jobs:
+            print ("    [..WARNING..] '%s' is already running, please wait!" % name)
+            return None
+        job = Job(name, self.results, list(buttons))
+        for button in job.buttons:
+            button.configure(state = "disabled")
+        if in_process:
+            if self.process_pool == None:
+                self.process_pool = concurrent.futures.ProcessPoolExecutor(self.max_processes) # Workers get the same sys.path
+            job.future = self.process_pool.submit(function, *args)
+        else:
+            job.future = self.thread_pool.submit(function, job, *args)
+        self.jobs[name] = job
+        self.handlers[name] = (on_done, on_error)
+        job.future.add_done_callback(lambda future: self.results.put((job, "done", None)))
+        self.on_progress(job, "started")
+        if not self.polling:
+            self.polling = True
+            self.master.after(self.poll_interval, self.poll)
+        return job
+
+    def cancel(self, name = None):
+        """
+        Method cancels the job <name> (all jobs if None); result of the cancelled job is not used
+        """
+        for job_name in list(self.jobs.keys()):
+            if (name == None) or (job_name == name):
+                print ("    Cancelling '%s'..." % job_name)
+                self.jobs[job_name].cancel()
+
+    def poll(self):
+        while True:
+            try:
+                (job, message, stage) = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if message == "progress":
+                if job.name in self.jobs:
+                    self.on_progress(job, stage)
+            else:
+                self.finish(job)
+        if len(self.jobs) != 0:
+            self.master.after(self.poll_interval, self.poll)
+        else:
+            self.polling = False
+
+    def finish(self, job):
+        del self.jobs[job.name]
+        (on_done, on_error) = self.handlers.pop(job.name)
+        for button in job.buttons:
+            button.configure(state = "normal")
+        if len(self.jobs) == 0:
+            self.on_progress(None, None)
+        if job.cancelled.is_set() or job.future.cancelled():
+            print ("    [..WARNING..] '%s' was cancelled" % job.name)
+            return
+        error = job.future.exception()
+        if isinstance(error, Job_cancelled):
+            print ("    [..WARNING..] '%s' was cancelled" % job.name)
+        elif error != None:
+            print ("    [..ERROR..] '%s' failed: %s" % (job.name, error))
+            if on_error != None:
+                on_error(error)
+        elif on_done != None:
+            on_done(job.future.result())
+
+    def shutdown(self):
+        self.cancel()
+        self.thread_pool.shutdown(wait = False)
+        if self.process_pool != None:
+            self.process_pool.shutdown(wait = False)
+
+def output_is_complete(filename, trailer = "# [ok]"):
+    """
+    Method returns True if the last line of the <filename> is the <trailer> (as written by HMMer
+    at the end of its tables); only the tail of the file is read
+    """
+    try:
+        output_file = open(filename, "rb")
+    except IOError:
+        return False
+    output_file.seek(0, 2)
+    size = output_file.tell()
+    output_file.seek(max(0, size - 1024))
+    tail = output_file.read()
+    output_file.close()
+    return tail.decode("utf-8", "replace").rstrip().split("\n")[-1].strip() == trailer
+
+def process_is_alive(pid):
+    """
+    Method returns True if the process with the <pid> is running (it could be not a child of this one)
+    """
+    if pid == None:
+        return False
+    if os.name == "nt": # os.kill() would terminate the process on Windows
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid) # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return exit_code.value == 259 # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError: # Process exists but belongs to another user
+        return True
+    return True
+
+def stop_pid(pid):
+    """
+    Method terminates the process with the <pid> started by the previous session (no handle is kept for it)
+    """
+    if process_is_alive(pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+class External_job:
+    """
+    External program run by the <External_scheduler>: its arguments (<args>, without CPU number),
+    option to give the number of CPUs (<cpu_option>, e.g. '--cpu' of HMMer) and the <output_filename>
+    which ends with the '# [ok]' line when the program is finished. Job is started only after the jobs
+    writing files from the <wait_for> list are finished (e.g. outputs are merged after all parts are ready).
+    Jobs with the same <group> (e.g. parts of the same query) are run together (see <External_scheduler>);
+    files from the <cleanup> list are removed if the job fails or is cancelled
+    """
+    def __init__(self, name, args, output_filename, cpu_option = None, wait_for = (), group = None, cleanup = ()):
+        self.name = name
+        self.args = args
+        self.output_filename = output_filename
+        self.cpu_option = cpu_option
+        self.wait_for = list(wait_for)
+        self.group = group
+        self.cleanup = list(cleanup)
+        self.process = None   # subprocess.Popen of the running job (None if it is waiting or was started by the previous session)
+        self.pid = None       # Process ID of the running job (kept in the state file)
+        self.status = "waiting"
+
+class External_scheduler:
+    """
+    Runs external programs with at most <max_jobs> of them at the same time; each job gets an equal
+    part of the <total_cpus>. Jobs of the same group take a single place: they are all started at once and
+    share the <total_cpus> between them; if one of them fails, the others are stopped and fail too.
+    Process handles are kept, so the finish is known from the exit code;
+    jobs are also stored in the <state_filename>, so those started in the previous session are checked
+    by the tail of their output and fail if their process is not running any more. <on_finished> is called in the main loop with the job and True if it succeeded
+    """
+    def __init__(self, master, on_finished, state_filename, max_jobs = 2, total_cpus = None, poll_interval = 1000):
+        self.master = master
+        self.on_finished = on_finished
+        self.state_filename = state_filename
+        self.max_jobs = max(1, max_jobs)
+        self.total_cpus = total_cpus
+        if self.total_cpus == None:
+            self.total_cpus = os.cpu_count() or 1
+        self.poll_interval = poll_interval
+        self.jobs = list()    # All unfinished jobs in order of their submission
+        self.polling = False
+
+    def get_cpus(self, job = None):
+        if (job != None) and (job.group != None):
+            group_size = len([other for other in self.jobs if other.group == job.group])
+            return max(1, self.total_cpus // group_size)
+        return max(1, self.total_cpus // self.max_jobs)
+
+    def get_slot(self, job):
+        """
+        Method returns the key of the place taken by the running <job> (jobs of the same group share it)
+        """
+        if job.group != None:
+            return job.group
+        return job.output_filename
+
+    def get_pending_number(self):
+        return len(self.jobs)
+
+    def submit(self, name, args, output_filename, cpu_option = None, wait_for = (), group = None, cleanup = ()):
+        self.submit_jobs([External_job(name, args, output_filename, cpu_option, wait_for, group, cleanup)])
+
+    def submit_jobs(self, jobs):
+        """
+        Method adds <jobs> (list of <External_job>) at once, so all parts of a group are known
+        (and share the CPUs) before any of them is started
+        """
+        self.jobs += jobs
+        self.start_waiting()
+        self.save_state()
+        self.schedule_poll()
+
+    def start_waiting(self):
+        running = set([self.get_slot(job) for job in self.jobs if job.status == "running"])
+        unfinished_outputs = set([job.output_filename for job in self.jobs])
+        for job in self.jobs:
+            if job.status != "waiting":
+                continue
+            if len(unfinished_outputs.intersection(job.wait_for)) != 0:
+                continue
+            if (len(running) >= self.max_jobs) and (not self.get_slot(job) in running):
+                continue
+            args = list(job.args)
+            if job.cpu_option != None:
+                args[1:1] = [job.cpu_option, str(self.get_cpus(job))]
+            print ("Running the following command:")
+            print (" ".join(args))
+            if os.path.isfile(job.output_filename): # Old output should not be taken for the new one
+                os.remove(job.output_filename)
+            job.process = subprocess.Popen(args, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+            job.pid = job.process.pid
+            job.status = "running"
+            running.add(self.get_slot(job))
+
+    def check(self):
+        """
+        Method finds finished jobs, starts the waiting ones and returns list of tuples (job, succeeded)
+        """
+        finished = list()
+        for job in self.jobs:
+            if job.status != "running":
+                continue
+            if job.process != None:
+                exit_code = job.process.poll()
+                if exit_code != None:
+                    finished.append((job, exit_code == 0))
+            elif output_is_complete(job.output_filename): # Started by the previous session
+                finished.append((job, True))
+            elif not process_is_alive(job.pid): # Process died (e.g. the computer was restarted)
+                finished.append((job, output_is_complete(job.output_filename)))
+        failed_groups = set([job.group for (job, succeeded) in finished if (not succeeded) and (job.group != None)])
+        finished_jobs = [job for (job, succeeded) in finished]
+        for job in self.jobs: # Other parts of the failed group are stopped, so their files could be removed
+            if (job.group in failed_groups) and (not job in finished_jobs):
+                self.stop(job)
+                finished.append((job, False))
+        failed_outputs = set([job.output_filename for (job, succeeded) in finished if not succeeded])
+        for job in self.jobs: # Jobs waiting for the failed ones would not succeed either
+            if (job.status == "waiting") and (len(failed_outputs.intersection(job.wait_for)) != 0):
+                finished.append((job, False))
+                failed_outputs.add(job.output_filename)
+        for (job, succeeded) in finished:
+            self.jobs.remove(job)
+            if not succeeded:
+                self.remove_files(job)
+        if len(finished) != 0:
+            self.start_waiting()
+            self.save_state()
+        return finished
+
+    def cancel(self):
+        """
+        Method terminates jobs started in this session and forgets all unfinished jobs
+        """
+        for job in self.jobs:
+            self.stop(job)
+        for job in self.jobs:
+            self.remove_files(job)
+        print ("    %i external job(s) cancelled" % len(self.jobs))
+        self.jobs = list()
+        self.save_state()
+
+    def stop(self, job):
+        """
+        Method terminates the running <job> and waits for it (if it was started in this session)
+        """
+        if job.status != "running":
+            return
+        if job.process != None:
+            stop_process(job.process)
+        else:
+            stop_pid(job.pid)
+
+    def remove_files(self, job):
+        for filename in job.cleanup:
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+    def schedule_poll(self):
+        if (not self.polling) and (len(self.jobs) != 0):
+            self.polling = True
+            self.master.after(self.poll_interval, self.poll)
+
+    def poll(self):
+        self.polling = False
+        for (job, succeeded) in self.check():
+            self.on_finished(job, succeeded)
+        self.schedule_poll()
+
+    def save_state(self):
+        """
+        Method writes unfinished jobs into the <state_filename>, one per line: status, output filename,
+        name, CPU option ('-' if none), files to wait for (joined by os.pathsep), process ID ('-' if none),
+        group ('-' if none), files to remove on failure (joined by os.pathsep) and arguments separated by tabs
+        """
+        if len(self.jobs) == 0:
+            if os.path.isfile(self.state_filename):
+                os.remove(self.state_filename)
+            return
+        state_file = open(self.state_filename, "w")
+        for job in self.jobs:
+            cpu_option = job.cpu_option
+            if cpu_option == None:
+                cpu_option = "-"
+            pid = "-"
+            if job.pid != None:
+                pid = str(job.pid)
+            group = job.group
+            if group == None:
+                group = "-"
+            state_file.write("\t".join([job.status, job.output_filename, job.name, cpu_option, os.pathsep.join(job.wait_for), pid,
+                                        group, os.pathsep.join(job.cleanup)] + job.args) + "\n")
+        state_file.close()
+
+    def restore(self):
+        """
+        Method reads jobs of the previous session from the <state_filename>: running jobs are
+        only checked by their output and process ID, waiting jobs are started again
+        """
+        if not os.path.isfile(self.state_filename):
+            return
+        state_file = open(self.state_filename)
+        for string in state_file:
+            fields = string.rstrip("\n").split("\t")
+            if len(fields) < 9:
+                continue
+            cpu_option = fields[3]
+            if cpu_option == "-":
+                cpu_option = None
+            wait_for = list()
+            if fields[4] != "":
+                wait_for = fields[4].split(os.pathsep)
+            group = fields[6]
+            if group == "-":
+                group = None
+            cleanup = list()
+            if fields[7] != "":
+                cleanup = fields[7].split(os.pathsep)
+            job = External_job(fields[2], fields[8:], fields[1], cpu_option, wait_for, group, cleanup)
+            job.status = fields[0]
+            if fields[5].isdigit():
+                job.pid = int(fields[5])
+            self.jobs.append(job)
+        state_file.close()
+        print ("    %i external job(s) of the previous session restored" % len(self.jobs))
+        self.start_waiting()
+        self.save_state()
+        self.schedule_poll()
@@ -50,6 +50,7 @@ class AlnLog(tkinter.Frame):
         central_panel.sash_place(1, 780, 1)
 
     def write_to_log(self, message, is_important = False):
+        self.host.load_pending_sections(self)
         self.auto_log.text_widget.insert(tkinter.END, "\n\n")   
         t = time.localtime()
         time_string = "%02i.%02i.%i\t%02i:%02i:%02i" % (t.tm_mday, t.tm_mon, t.tm_year, t.tm_hour, t.tm_min, t.tm_sec)
@@ -73,6 +74,8 @@ class AlnLog(tkinter.Frame):
             start = end_position
 
     def get_current_project_state(self):
+        self.host.load_pending_sections(self.host.input_tab)
+        self.host.load_pending_sections(self.host.parse_tab)
         seq_n = self.host.input_tab.seq_input_frame.count_fasta()
         aln_n = self.host.input_tab.aln_input_frame.count_fasta()
         aln_length = self.host.parse_tab.fixed.count_seq_length()
@@ -87,6 +90,7 @@ class AlnLog(tkinter.Frame):
         self.write_to_log(curr_message, True)
 
     def write_histogram(self, values, info_string, begin, step, nsteps):        
+        self.host.load_pending_sections(self)
         pos = begin
         result = list()
         n = 0      
@@ -131,13 +135,22 @@ class AlnLog(tkinter.Frame):
 
     def save_logs(self, ask_if_exists = True):
         auto_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.auto_log" % self.host.get_project_name())
-        Aln_basic.write_widget_into_file(self.auto_log.text_widget, auto_filename, ask_if_exists, True)
+        if ask_if_exists:
+            Aln_basic.write_widget_into_file(self.auto_log.text_widget, auto_filename, ask_if_exists, True)
+        else:
+            self.host.save_section(self.auto_log.text_widget, auto_filename, True)
 
         rem_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.rem_log" % self.host.get_project_name())
-        Aln_basic.write_widget_into_file(self.remove_log.text_widget, rem_filename, ask_if_exists, True)
+        if ask_if_exists:
+            Aln_basic.write_widget_into_file(self.remove_log.text_widget, rem_filename, ask_if_exists, True)
+        else:
+            self.host.save_section(self.remove_log.text_widget, rem_filename, True)
 
         man_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.man_log" % self.host.get_project_name())
-        Aln_basic.write_widget_into_file(self.manual_log.text_widget, man_filename, ask_if_exists, True)
+        if ask_if_exists:
+            Aln_basic.write_widget_into_file(self.manual_log.text_widget, man_filename, ask_if_exists, True)
+        else:
+            self.host.save_section(self.manual_log.text_widget, man_filename, True)
 
     def clear(self):
         self.auto_log.text_widget.delete(1.0, tkinter.END)
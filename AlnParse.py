@@ -1,10 +1,9 @@
 # -*- coding: utf-8 -*-
-import os, platform
+import sys, os, platform
 import tkinter
 import tkinter.messagebox as tkMessageBox
 import tkinter.filedialog as tkFileDialog
-import Aln_basic, Settings
-import subprocess
+import Aln_basic, Settings, AlnEngine, AlnJobs
 
 class AlnParse(tkinter.Frame):
     def __init__(self, parent, host):
@@ -93,13 +92,13 @@ class AlnParse(tkinter.Frame):
         tree_filename = tkFileDialog.askopenfilename(initialdir = self.host.settings.work_dir, filetypes = (("Inkscape vector file", "*.svg"), ))
         if tree_filename == "": # Cancel
             return
-        old_order_seqs = Aln_basic.read_fasta_from_strings(self.fixed.get_strings())
+        old_order_seqs = self.fixed.get_records()
 
         sort_and_color_path = os.path.join(self.host.settings.script_dir, "sort_and_color.py")
-        fixed_filename = os.path.join(self.host.settings.work_dir, "%s.fixed" % self.host.temp_name)
-        Aln_basic.write_widget_into_file(self.fixed.text_widget, fixed_filename)
+        #FIX: version 1.2.0 (script requires files, so they are created with the scratch prefix and removed right after)
+        fixed_filename = self.host.artifacts.write_scratch("fixed", self.fixed.text_widget.get(1.0, tkinter.END))
 
-        temp_out_prefix = os.path.join(self.host.settings.work_dir, self.host.temp_name)
+        temp_out_prefix = self.host.artifacts.scratch_prefix
         command = "%s -i %s -o %s -t %s" % (sort_and_color_path, fixed_filename, temp_out_prefix, tree_filename)
         if not self.host.verbose.get():
             command += "1> nul 2> nul"
@@ -107,9 +106,10 @@ class AlnParse(tkinter.Frame):
 
         temp_sorted_filename = "%s.tree_sorted" % temp_out_prefix
         Aln_basic.read_widget_from_file(self.fixed.text_widget, temp_sorted_filename)
+        self.host.artifacts.remove_scratch(["fixed", "tree_sorted"])
                 
         self.IDs.text_widget.delete(1.0, tkinter.END)
-        new_order_seqs = Aln_basic.read_fasta_from_strings(self.fixed.get_strings())
+        new_order_seqs = self.fixed.get_records()
         new_ids = ""
         for s in new_order_seqs:
             new_ids += "%s\n" % s.ID            
@@ -127,6 +127,10 @@ class AlnParse(tkinter.Frame):
             name_prefix = tkFileDialog.asksaveasfilename(filetypes = (("Prefix for fixed (fasta) and MEGA", "*.*"), ))
         fixed_filename = name_prefix + ".fixed"
         mega_filename = name_prefix + "_fixed.meg"
+        if not ask_filename: #FIX: version 1.2.0 (unchanged files are not re-written on project saving)
+            if self.host.save_section(self.fixed.text_widget, fixed_filename):
+                Aln_basic.export_MEGA_format(self.fixed.text_widget, mega_filename, os.path.basename(fixed_filename))
+            return
         Aln_basic.write_widget_into_file(self.fixed.text_widget, fixed_filename, ask_filename)
         Aln_basic.export_MEGA_format(self.fixed.text_widget, mega_filename, os.path.basename(fixed_filename))
 
@@ -134,6 +138,9 @@ class AlnParse(tkinter.Frame):
         pure_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.pure" % self.host.get_project_name())
         if ask_filename:
             pure_filename = tkFileDialog.asksaveasfilename(filetypes = (("Non-aligned sequences with pure names (fasta)", "*.pure"), ("All", "*.*")))
+        if not ask_filename:
+            self.host.save_section(self.pure.text_widget, pure_filename)
+            return
         Aln_basic.write_widget_into_file(self.pure.text_widget, pure_filename, ask_filename)
 
     def save_ngphylogeny(self):
@@ -146,6 +153,10 @@ class AlnParse(tkinter.Frame):
             name_prefix = tkFileDialog.asksaveasfilename(filetypes = (("Prefix for blocks and MEGA files", "*.*"),))
         blocks_filename = name_prefix + ".blocks_regions"
         mega_filename = name_prefix + "_blocks.meg"
+        if not ask_filename:
+            if self.host.save_section(self.blocks.text_widget, blocks_filename):
+                Aln_basic.export_MEGA_format(self.blocks.text_widget, mega_filename, os.path.basename(blocks_filename))
+            return
         Aln_basic.write_widget_into_file(self.blocks.text_widget, blocks_filename, ask_filename)
         Aln_basic.export_MEGA_format(self.blocks.text_widget, mega_filename, os.path.basename(blocks_filename))
 
@@ -154,6 +165,16 @@ class AlnParse(tkinter.Frame):
         if ask_filename:
             ids_filename = tkFileDialog.asksaveasfilename(filetypes = (("List of protein IDs", "*.ids"), ("All", "*.*")))       
 
+        if not ask_filename:
+            self.host.save_section(self.IDs.text_widget, ids_filename, False, self.get_converted_IDs, self.host.get_section_addition("ids"))
+            return
+        Aln_basic.write_text_into_file(self.get_converted_IDs(), ids_filename, ask_filename)
+
+    def get_converted_IDs(self):
+        """
+        Method returns text of the IDs panel converted according to the <self.ID_save_mode>;
+        the panel itself is not changed
+        """
         curr_ID_save_mode = self.ID_save_mode.get()
         curr_text = self.IDs.text_widget.get(1.0, tkinter.END).strip()
         if curr_ID_save_mode != "No change":
@@ -194,12 +215,8 @@ class AlnParse(tkinter.Frame):
                         new_id = id_to_gi[curr_id]
                 strings[i] = new_id
                 i += 1
-            self.IDs.text_widget.delete(1.0, tkinter.END)
-            self.IDs.text_widget.insert(tkinter.END, "\n".join(strings).strip())
-
-        Aln_basic.write_widget_into_file(self.IDs.text_widget, ids_filename, ask_filename)
-        self.IDs.text_widget.delete(1.0, tkinter.END)     
-        self.IDs.text_widget.insert(tkinter.END, curr_text)            
+            curr_text = "\n".join(strings).strip()
+        return curr_text
 
     def enable_pure_analysis(self):
         print ("    Enabling analysis buttons...")
@@ -242,12 +259,32 @@ class AlnParse(tkinter.Frame):
         Aln_basic.write_widget_into_file(self.pure.text_widget, pure_filename)
         result_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.%s_out" % (self.host.get_project_name(), database_type))
         table_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.%s_table" % (self.host.get_project_name(), database_type))
-        args = [hmmscan_path, "--domtblout", table_filename, "-o", result_filename, profile_database, pure_filename]
-        print ("Running the following command:")
-        print (" ".join(args))
-        subprocess.Popen(args, stderr = subprocess.PIPE, stdout = subprocess.PIPE)
-        #self.host.pending_filenames.append(result_filename)
-        self.host.pending_filenames.append(table_filename)
+        #FIX: version 1.2.0 (hmmscan is started by the scheduler which limits the number of jobs and their CPUs)
+        shard_number = int(getattr(self.host.settings, "hmmscan_shards", "1"))
+        if shard_number <= 1:
+            args = [hmmscan_path, "--domtblout", table_filename, "-o", result_filename, profile_database, pure_filename]
+            self.host.external_jobs.submit("hmmscan (%s)" % database_type, args, table_filename, "--cpu")
+            self.host.enable_check_button()
+            return
+        #FIX: version 1.2.0 (query is split into parts of close length which are searched in parallel and merged)
+        query_prefix = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.%s_query" % (self.host.get_project_name(), database_type))
+        query_filenames = AlnEngine.write_query_shards(self.pure.get_records(), query_prefix, shard_number)
+        shard_tables = list()
+        shard_results = list()
+        for i in range(len(query_filenames)):
+            shard_tables.append("%s_%i" % (table_filename, i))
+            shard_results.append("%s_%i" % (result_filename, i))
+        shard_files = shard_tables + shard_results + query_filenames
+        shard_jobs = list()
+        for i in range(len(query_filenames)): # Parts are run together, each with its share of CPUs; if any fails, all files are removed
+            args = [hmmscan_path, "--domtblout", shard_tables[i], "-o", shard_results[i], profile_database, query_filenames[i]]
+            shard_jobs.append(AlnJobs.External_job("hmmscan (%s, part %i)" % (database_type, i + 1), args, shard_tables[i], "--cpu",
+                                                   group = table_filename, cleanup = shard_files))
+        self.host.external_jobs.submit_jobs(shard_jobs)
+        merge_path = os.path.join(self.host.settings.script_dir, "merge_hmmer_outputs.py")
+        args = [sys.executable, merge_path, "-t", table_filename, "-o", result_filename, "--tables"] + shard_tables + ["--reports"] + shard_results
+        args += ["--cleanup"] + shard_files
+        self.host.external_jobs.submit("hmmscan (%s)" % database_type, args, table_filename, wait_for = shard_tables, cleanup = shard_files)
         self.host.enable_check_button()
 
     def check_numbers(self):
@@ -267,7 +304,7 @@ class AlnParse(tkinter.Frame):
 
     def histo_to_log(self):
         values = list()
-        seqs = Aln_basic.read_fasta_from_strings(self.pure.get_strings())
+        seqs = self.pure.get_records()
         for s in seqs:            
             values.append(len(s.sequence))
         info_string = "Length of proteins in the alignment"        
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains class <ProjectContainer> which stores all sections of an <Alnalyser>
+project (alignment, fixed, pure, domain tables, logs etc.) in a single zip file.
+Each section is a separate member of the archive, so any of them could be read and decoded
+without touching the others. A manifest with sizes and SHA1 hashes of each section
+is stored together with the data
+"""
+import os, hashlib, zipfile
+
+CONTAINER_EXTENSION = "alnproj"
+MANIFEST_NAME = "manifest.tsv"
+MANIFEST_HEADER = "#alnalyser_project"
+
+def get_container_filename(project_dir, project_name):
+    return os.path.join(project_dir, "%s.%s" % (project_name, CONTAINER_EXTENSION))
+
+def get_hash(data):
+    """
+    Method returns SHA1 hex digest of the <data> given as bytes
+    """
+    return hashlib.sha1(data).hexdigest()
+
+class ProjectContainer:
+    def __init__(self, filename):
+        self.filename = filename # Path to the zip file
+        self.manifest = dict()   # Section name -> (SHA1 hash, size in bytes, archive member name)
+        self.sections = list()   # Section names in the order of the manifest
+
+    def exists(self):
+        return os.path.isfile(self.filename)
+
+    def read_manifest(self):
+        """
+        Method reads only the manifest of the container; section data is not decoded
+        """
+        self.manifest = dict()
+        self.sections = list()
+        container = zipfile.ZipFile(self.filename, "r")
+        try:
+            manifest_text = container.read(MANIFEST_NAME).decode("utf_8")
+        finally:
+            container.close()
+        for string in manifest_text.split("\n"):
+            string = string.strip()
+            if len(string) == 0 or string.startswith("#"):
+                continue
+            fields = string.split("\t")
+            if len(fields) != 4:
+                print ("    [..WARNING..] Malformed manifest string in the project file '%s': %s" % (self.filename, string))
+                continue
+            self.manifest[fields[0]] = (fields[1], int(fields[2]), fields[3])
+            self.sections.append(fields[0])
+        return self.sections
+
+    def get_sections(self):
+        return list(self.sections)
+
+    def get_hash(self, section):
+        return self.manifest[section][0]
+
+    def read_raw_section(self, section):
+        """
+        Method returns bytes of the <section> as they are stored in the container
+        """
+        container = zipfile.ZipFile(self.filename, "r")
+        try:
+            data = container.read(self.manifest[section][2])
+        finally:
+            container.close()
+        if get_hash(data) != self.manifest[section][0]:
+            print ("    [..WARNING..] Section '%s' of the project file '%s' does not match its hash from the manifest!" % (section, self.filename))
+        return data
+
+    def read_section(self, section):
+        return self.read_raw_section(section).decode("utf_8")
+
+    def write(self, project_name, sections):
+        """
+        Method writes the container de novo. <sections> is a list of tuples (section, data)
+        where <data> is either a string or another <ProjectContainer>; in the latter case
+        the section is copied from it as it is, one section at a time. Data is first written to
+        a temporary file which then replaces the container, so the old project is never
+        left half-written
+        """
+        temp_filename = self.filename + ".tmp"
+        manifest = dict()
+        names = list()
+        container = zipfile.ZipFile(temp_filename, "w", zipfile.ZIP_DEFLATED)
+        try:
+            for (section, data) in sections:
+                if isinstance(data, ProjectContainer):
+                    data = data.read_raw_section(section)
+                else:
+                    data = data.encode("utf_8")
+                member_name = "%s.%s" % (project_name, section)
+                container.writestr(member_name, data)
+                manifest[section] = (get_hash(data), len(data), member_name)
+                names.append(section)
+            manifest_strings = [MANIFEST_HEADER]
+            for section in names:
+                manifest_strings.append("%s\t%s\t%i\t%s" % (section, manifest[section][0], manifest[section][1], manifest[section][2]))
+            container.writestr(MANIFEST_NAME, "\n".join(manifest_strings) + "\n")
+        finally:
+            container.close()
+        os.replace(temp_filename, self.filename)
+        self.manifest = manifest
+        self.sections = names
+
+def is_log_section(section):
+    return section.endswith("_log")
+
+def read_project(project_dir, project_name, required_sections):
+    """
+    Method returns dictionary of the <required_sections> to their texts for the project saved
+    in the <project_dir> either as a single container or as separate files (the latter are
+    taken if they are newer than the container). Missing sections are not included
+    """
+    sections = dict()
+    container = ProjectContainer(get_container_filename(project_dir, project_name))
+    container_mtime = None
+    if container.exists():
+        container_mtime = os.path.getmtime(container.filename)
+        container.read_manifest()
+    for section in required_sections:
+        section_filename = os.path.join(project_dir, "%s.%s" % (project_name, section))
+        if os.path.isfile(section_filename):
+            if section in container.manifest and os.path.getmtime(section_filename) <= container_mtime:
+                sections[section] = container.read_section(section).strip()
+                continue
+            encoding = None
+            if is_log_section(section):
+                encoding = "utf_8"
+            section_file = open(section_filename, "r", encoding = encoding)
+            sections[section] = section_file.read().strip()
+            section_file.close()
+        elif section in container.manifest:
+            sections[section] = container.read_section(section).strip()
+    return sections
+
+def write_project(project_dir, project_name, sections, single_file = False):
+    """
+    Method saves <sections> (dictionary of section names to texts) of the project into
+    the <project_dir>. If <single_file> is True, sections are saved into the container
+    (other sections already stored in it are kept), otherwise into separate files.
+    Sections with empty text are not written, and their copies left from the previous
+    save are removed so they are not taken for the current ones. Method returns the
+    list of sections actually written
+    """
+    if not os.path.isdir(project_dir):
+        print ("    Creating project directory de novo: '%s'" % project_dir)
+        os.mkdir(project_dir)
+    written = list()
+    for section in sorted(sections.keys()):
+        if len(sections[section].strip()) != 0:
+            written.append(section)
+    if single_file:
+        container = ProjectContainer(get_container_filename(project_dir, project_name))
+        new_sections = list()
+        if container.exists():
+            for section in container.read_manifest():
+                if not section in sections:
+                    new_sections.append((section, container))
+        for section in written:
+            new_sections.append((section, sections[section]))
+        container.write(project_name, new_sections)
+        return written
+    for section in sorted(sections.keys()):
+        section_filename = os.path.join(project_dir, "%s.%s" % (project_name, section))
+        if not section in written:
+            if os.path.isfile(section_filename):
+                os.remove(section_filename)
+            continue
+        encoding = None
+        if is_log_section(section):
+            encoding = "utf_8"
+        section_file = open(section_filename, "w", encoding = encoding)
+        section_file.write(sections[section] + "\n")
+        section_file.close()
+    return written
@@ -3,7 +3,7 @@ import os, re
 import tkinter
 import tkinter.messagebox as tkMessageBox
 import tkinter.ttk as ttk
-import Aln_basic, Settings
+import Aln_basic, AlnEngine
 
 class ActionMenu(tkinter.Menu):
     def __init__(self, parent, host):
@@ -27,20 +27,16 @@ class ActionMenu(tkinter.Menu):
         self.add_command(label="Remove mark", command = self._unmark)   
 
     def _normal(self):
-        for item_id in self.selection:
-            self.host.purify_tab.actions.item(item_id, tags = ("normal",))
+        self.host.purify_tab.set_action_tags(self.selection, ("normal",))
 
     def _removal(self):
-        for item_id in self.selection:
-            self.host.purify_tab.actions.item(item_id, tags = ("removal",))
+        self.host.purify_tab.set_action_tags(self.selection, ("removal",))
 
     def _fix(self):
-        for item_id in self.selection:
-            self.host.purify_tab.actions.item(item_id, tags = ("fix",))
+        self.host.purify_tab.set_action_tags(self.selection, ("fix",))
 
     def _unmark(self):
-        for item_id in self.selection:
-            self.host.purify_tab.actions.item(item_id, tags = ())
+        self.host.purify_tab.set_action_tags(self.selection, ())
         
     def show_menu(self, event):       
         try:
@@ -85,22 +81,10 @@ class TextMenu(tkinter.Menu):
         self.selection = list()
         try:
             a = event.widget.purify_text_widget # Checking if this is a text widget in "Purify" tab
-            if event.widget.tag_ranges("sel"):
-                start = "%s linestart" % tkinter.SEL_FIRST               
-                first_id = event.widget.get(start, "%s+%ic" % (start, self.host.purify_tab.name_length))
-                first_id = first_id.split("|")[0]
-                end = "%s linestart" % tkinter.SEL_LAST
-                last_id = event.widget.get(end, "%s+%ic" % (end, self.host.purify_tab.name_length))
-                last_id = last_id.split("|")[0]
-
-                adding = False
-                for protein_id in self.host.purify_tab.id_list:
-                    if protein_id == first_id:
-                        adding = True
-                    if adding == True:
-                        self.selection.append(protein_id)
-                    if protein_id == last_id:
-                        adding = False                   
+            selected_rows = self.host.purify_tab.alignment.get_selected_rows()
+            if selected_rows != None: #FIX: version 1.2.0 (selected rows are mapped to IDs by their numbers, including those scrolled out of the window)
+                (first_row, last_row) = selected_rows
+                self.selection = self.host.purify_tab.id_list[first_row:last_row + 1]
             self.post(event.x_root, event.y_root)
         except AttributeError:
             pass
@@ -124,6 +108,7 @@ class AlnPurify(tkinter.Frame):
         self.load_taxonomy = None            # Button to load taxonomy
         self.act = None                      # Button to apply actions
         self.presence_entry = None           # Entry for the presence threshold (for Aln_basic.get_valid_alignment_range())
+        self.occupancy_canvas = None         # Canvas with the sparkline of the column occupancy profile
 
         self.featured_sequences = None       # Featured sequences
         self.valid_start = None              # Position in the alignment where showing region is starting (configured in <Alnalyser.purify()> method)
@@ -132,7 +117,13 @@ class AlnPurify(tkinter.Frame):
         self.id_to_features = None           # Hash of protein IDs to features created by a self-hmmer search during purification
         self.id_to_org_and_seq = None        # Hash of protein IDs to their (organism name, sequence)
         self.id_list = None                  # List of protein IDs in order of their occurence in the widget
+        self.id_to_rows = None               # Hash of protein IDs to the list of (row, end of the ID in this row)
+        self.id_to_action = dict()           # Hash of protein IDs in the <self.actions> (also used as item IDs) to lists [reasons, organism, tags]
+        self.org_to_remaining = None         # Hash of organisms to the number of their proteins not marked for removal
+        self.lost_orgs = set()               # Organisms with all proteins marked for removal
+        self.organism_report = None          # Label with the <self.lost_orgs> shown
         self.seqs_cut = None                 # List of cutted sequences (as present in the widget tab)
+        self.alignment_matrix = None         # <udav_base.Alignment_matrix> of the purified alignment (with its cached occupancy profile)
         
         self.create_UI()
 
@@ -181,9 +172,11 @@ class AlnPurify(tkinter.Frame):
         actions.bind("<Double-Button-1>", self.get_click)
         self.actions = actions
         self.actions.menu_available = True # To show <ActionMenu> only at this widget    
+        self.organism_report = tkinter.Label(base_frame, anchor = "w", justify = tkinter.LEFT, foreground = "#FF0000")
+        self.organism_report.grid(row = 2, column = 0, columnspan = 2, sticky = "NSEW")
         central_panel.add(base_frame)
 
-        self.alignment = Aln_basic.TextFrameWithLabelAndButton(central_panel, self.p, self.host.header, "#FFFFFF", "Suggested changes in alignment:", "Load domains")   
+        self.alignment = Aln_basic.AlignmentFrame(central_panel, self.p, self.host.header, "#FFFFFF", "Suggested changes in alignment:", "Load domains")   
         self.alignment.button.configure(state = tkinter.DISABLED, command = self.create_domain_tags)
         self.alignment.text_widget.purify_text_widget = True # To show <TextMenu> only at this widget    
         self.show_features = tkinter.Button(self.alignment.panel, state = tkinter.DISABLED, text = "Show domains", command = self.show_domains)
@@ -198,62 +191,97 @@ class AlnPurify(tkinter.Frame):
         self.presence_entry = tkinter.Entry(self.alignment.panel, width = 3)
         self.presence_entry.insert(tkinter.END, "0")
         self.presence_entry.grid(row = 0, column = 7, padx = self.p, pady = self.p)
+        self.presence_entry.bind("<KeyRelease>", self.presence_changed)
+        self.occupancy_canvas = tkinter.Canvas(self.alignment.panel, width = 150, height = 20, background = "#FFFFFF", highlightthickness = 0)
+        self.occupancy_canvas.grid(row = 0, column = 8, padx = self.p, pady = self.p)
         
         central_panel.add(self.alignment)
 
         self.update_idletasks()
         central_panel.sash_place(0, base_frame.winfo_reqwidth(), 1)
 
+    def get_presence_threshold(self):
+        presence_threshold = None
+        try:
+            presence_threshold = int(self.presence_entry.get())
+        except ValueError:
+            pass
+        return presence_threshold
+
+    def presence_changed(self, event):
+        """
+        Method shows the region for the new presence threshold from the cached occupancy profile;
+        the alignment itself is cut only on the next purification
+        """
+        presence_threshold = self.get_presence_threshold()
+        if (self.alignment_matrix == None) or (presence_threshold == None):
+            return
+        (start, end) = self.alignment_matrix.get_occupancy().get_range(presence_threshold)
+        self.alignment.add_label_data("showing a region [%i; %i], threshold gives [%i; %i]" % (self.valid_start + 1, self.valid_end, start + 1, end))
+        self.draw_occupancy()
+
+    def draw_occupancy(self):
+        """
+        Method draws the occupancy profile of <self.alignment_matrix> as a sparkline: each bar
+        is the mean presence of the columns it covers, the region for the current presence
+        threshold is highlighted and the threshold itself is shown as a red line
+        """
+        canvas = self.occupancy_canvas
+        canvas.delete("all")
+        if self.alignment_matrix == None:
+            return
+        profile = self.alignment_matrix.get_occupancy()
+        if len(profile) == 0:
+            return
+        width = int(canvas.cget("width"))
+        height = int(canvas.cget("height"))
+        presence_threshold = self.get_presence_threshold()
+        start = end = None
+        if presence_threshold != None:
+            (start, end) = profile.get_range(presence_threshold)
+        bins = min(width, len(profile))
+        for b in range(bins):
+            first = b * len(profile) // bins
+            last = max(first + 1, (b + 1) * len(profile) // bins)
+            value = sum(profile.presence[first:last]) / (last - first)
+            color = "#A0A0A0"
+            if (start != None) and (first < end) and (last > start):
+                color = self.host.header
+            x0 = b * width // bins
+            x1 = max(x0 + 1, (b + 1) * width // bins)
+            canvas.create_rectangle(x0, height - value * height / 100.0, x1, height, fill = color, width = 0)
+        if presence_threshold != None:
+            y = height - presence_threshold * height / 100.0
+            canvas.create_line(0, y, width, y, fill = "#FF0000")
+
     def get_click(self, event):
         curr_id = event.widget.identify_row(event.y)
         curr_text_id = self.host.purify_tab.actions.item(curr_id)["text"]
-        id_start = self.alignment.text_widget.search(curr_text_id, 1.0, stopindex = tkinter.END)
-        id_end = '%s+%dc' % (id_start, len(curr_text_id))
+        if (self.id_to_rows == None) or (not curr_text_id in self.id_to_rows):
+            return
+        (row, end) = self.id_to_rows[curr_text_id][0]
         self.alignment.text_widget.focus()
-        self.alignment.text_widget.tag_remove("sel", 1.0, tkinter.END)
-        self.alignment.text_widget.tag_add("sel", id_start, id_end)
-        self.alignment.text_widget.see(id_start)        
+        self.alignment.select((row, 0), (row, end))
 
     def find_self_hits(self):
-        import udav_base, udav_soft
-        # --------------------------------------- 1) HMMbuild
-        aligned_filename = os.path.join(self.host.settings.work_dir, "%s.aln" % self.host.temp_name)
-        pure_filename = os.path.join(self.host.settings.work_dir, "%s.pure" % self.host.temp_name)
-        udav_base.print_pure_sequences(self.seqs_cut, pure_filename, True, True)
-        alnfile = open(aligned_filename, "w")
-        for s in self.seqs_cut:
-            s.print_fasta(alnfile)
-        alnfile.close()
-        (hmmbuild_name, hmmbuild_path) = Settings.get_program_name(self.host.settings.hmmer_dir, "hmmbuild")
-        (hmmsearch_name, hmmsearch_path) = Settings.get_program_name(self.host.settings.hmmer_dir, "hmmsearch")
-        hmm_filename = os.path.join(self.host.settings.work_dir, "%s.hmm" % self.host.temp_name)
-        result_filename = os.path.join(self.host.settings.work_dir, "%s.self_out" % self.host.temp_name)
-        domtable_filename = os.path.join(self.host.settings.work_dir, "%s.self_domtable" % self.host.temp_name)
-        table_filename = os.path.join(self.host.settings.work_dir, "%s.self_table" % self.host.temp_name)
-
-        self.host.set_status("Running HMMbuild", "#FF0000")
-        print ("    Running HMMbuild for the cutted alignment...")
-        #FIX: version 0.2.8 (--wnone option suppresses weightening of sequences in hmmbuild thus poor sequences do not alter profile that much)
-        if self.host.verbose.get():        
-            os.system("%s --wnone --informat=afa %s %s" % (hmmbuild_path, hmm_filename, aligned_filename))
-        else:
-            os.system("%s --wnone --informat=afa %s %s 1> nul 2> nul" % (hmmbuild_path, hmm_filename, aligned_filename))
-        # --------------------------------------- 2) HMMsearch
-        self.host.set_status("Running HMMsearch", "#FF0000")   
-        print ("    Running HMMsearch to search for the self-hits...")     
-        if self.host.verbose.get():
-            os.system("%s --tblout %s --domtblout %s -o %s %s %s" % (hmmsearch_path, table_filename, domtable_filename, result_filename, hmm_filename, pure_filename))
-        else:
-            os.system("%s --tblout %s --domtblout %s -o %s %s %s 1> nul 2> nul" % (hmmsearch_path, table_filename, domtable_filename, result_filename, hmm_filename, pure_filename))        
-
-        # --------------------------------------- 3) Obtaining features
-        self.host.set_status("Obtaining self-hit features", "#FF0000")
-        print ("    Obtaining self-hit features...")           
-        (self.id_to_features, domains) = udav_soft.read_Pfam_output(domtable_filename, "1.0", False, None, add_score = True, hmmsearch_output = True)
-        del udav_base, udav_soft
-        #os.remove(result_filename)
-        #os.remove(domtable_filename)
-        #os.remove(table_filename)
+        #FIX: version 1.2.0 (self-hits are kept for the cut alignment and not searched again if it was not changed)
+        texts = [AlnEngine.get_fasta_text(self.seqs_cut)]
+        id_to_features = self.host.artifacts.find("self_hits", texts)
+        if id_to_features != None:
+            self.show_self_hits(texts, id_to_features)
+            return
+        #FIX: version 1.2.0 (search is run by a job; scratch files have their own prefix, so other jobs could run at the same time)
+        search = lambda job, seqs_cut, verbose: AlnEngine.find_self_hits(seqs_cut, self.host.settings.hmmer_dir, "%s_self" % self.host.artifacts.scratch_prefix,
+                                                                         verbose, job)
+        self.host.jobs.submit("Self-hits search", search, (self.seqs_cut, self.host.verbose.get()), lambda result: self.show_self_hits(texts, result),
+                              [self.self_hits_button, self.white_crow_button])
+
+    def show_self_hits(self, texts, id_to_features):
+        self.host.artifacts.put("self_hits", texts, id_to_features)
+        if AlnEngine.get_fasta_text(self.seqs_cut) != texts[0]: # Alignment was purified again while the search was running
+            print ("    [..WARNING..] Self-hits were found for the previous alignment and will not be used!")
+            return
+        self.id_to_features = id_to_features
 
         self.evalue_threshold.configure(state = tkinter.NORMAL)
         self.evalue_threshold.delete(0, tkinter.END) #FIX: version 0.2.8 (removing values before appending)
@@ -263,8 +291,6 @@ class AlnPurify(tkinter.Frame):
         self.sigma_num_self.insert(tkinter.END, "2")
         self.self_hits_button.configure(state = tkinter.DISABLED)
 
-        self.host.set_status("Ready")
-
     def show_blocks_regions(self, blocks_string):
         if blocks_string == None: # No string was found
             return
@@ -287,106 +313,96 @@ class AlnPurify(tkinter.Frame):
                    blocks[-1]["end"] = real_end
                    reading_block = False
 
-        strings = self.alignment.get_strings()
-        for i in range(len(strings)): #-------- 2) Adding <blocks> tag
-            for b in blocks:
-                tag_start = "%i.%i" % (i + 1, b["start"] + self.name_length)
-                tag_end = "%i.%i" % (i + 1, b["end"] + self.name_length + 1)
-                self.alignment.text_widget.tag_add("blocks", tag_start, tag_end)
-
-    def add_tag_to_text(self, strings_to_search, tag_name, fore = None, back = None):
-        for string in strings_to_search:
-            start = "1.0"
-            while True:
-                hit_position = self.alignment.text_widget.search(string, start, stopindex = tkinter.END)
-                if not hit_position:
-                    break
-                end_position = '%s+%dc' % (hit_position, len(string))
-                self.alignment.text_widget.tag_add(tag_name, hit_position, end_position)                               
-                start = end_position
+        self.alignment.remove_overlay("blocks", False) #-------- 2) Adding <blocks> overlay to all rows
+        for b in blocks:
+            self.alignment.add_column_overlay("blocks", b["start"] + self.name_length, b["end"] + self.name_length + 1)
+        self.alignment.render()
+
+    def add_tag_to_ids(self, protein_ids, tag_name, fore = None, back = None):
+        for protein_id in protein_ids: #FIX: version 1.2.0 (exact IDs are tagged in their rows without text search)
+            for (row, end) in self.id_to_rows.get(protein_id, ()):
+                self.alignment.add_overlay(tag_name, row, 0, end)
+        self.alignment.render()
         if fore != None:
             self.alignment.text_widget.tag_config(tag_name, foreground = fore)
         if back != None:  
             self.alignment.text_widget.tag_config(tag_name, background = back)               
 
     def add_to_actions(self, protein_id, column_values, curr_tags = ()):
-        should_add = True
-        for a in self.actions.get_children(""):
-            a_id = self.actions.item(a)["text"]
-            if a_id == protein_id: # This protein id is already in the actions list
-                should_add = False
-                curr_values = self.actions.item(a)["values"]
-                if not column_values[0] in curr_values[0]: # Different reason
-                    self.actions.item(a, values = ("%s, %s" % (curr_values[0], column_values[0]), curr_values[1]))
-                break
-        if should_add:
-            self.actions.insert("", "end", text = protein_id, values = column_values, tags = curr_tags)
-
-    def get_self_hit_info(self, evalue_threshold, sigma_num, no_hit, poor_hit, partial_hit):
-        hit_positions = dict()        
-        print ("    List of self-hits (<from-to..e-value..Score>):")
-        for protein_id in self.id_to_org_and_seq.keys():
-            (curr_org, curr_seq) = self.id_to_org_and_seq[protein_id]
-            if not protein_id in self.id_to_features: # No hit found at all
-                self.add_to_actions(protein_id, ("no hit", curr_org))
-                no_hit.append(protein_id)
-            else:
-                #[profile name] 1..456..1e-56..256.7 <...>
-                lowest_evalue = 100
-                best_start = -1
-                best_end = -1
-                curr_features = self.id_to_features[protein_id].split(" ")[1:]             
-                print ("    %s\t%s" % (protein_id, curr_features))
-                for feature in curr_features:
-                    values = feature.strip("\t").split("..")
-                    evalue = float(values[2])
-                    if evalue < lowest_evalue:
-                        lowest_evalue = evalue
-                        best_start = values[0]
-                        best_end = values[1]
-                if lowest_evalue > evalue_threshold:
-                    poor_hit.append(protein_id)
-                    self.add_to_actions(protein_id, ("poor hit", curr_org))
-                hit_positions[protein_id] = (int(best_start), int(best_end))
-       
-        mean_length = 0
-        values = list()
-        for protein_id in hit_positions.keys():
-            curr_length = hit_positions[protein_id][1] - hit_positions[protein_id][0] + 1
-            values.append(curr_length)
-            mean_length += curr_length
-        mean_length = float(mean_length)/len(hit_positions.keys())
-        dispersion = 0
-        for protein_id in hit_positions.keys():
-            curr_length = hit_positions[protein_id][1] - hit_positions[protein_id][0] + 1
-            dispersion += (curr_length - mean_length) ** 2
-        dispersion = dispersion/len(hit_positions.keys())
-        std_deviation = dispersion ** 0.5
-        #print ("Mean is: %s" % mean_length)
-        #print ("Dispersion is: %s" % dispersion)
-        #print ("Std deviation is: %s" % std_deviation)
-        #print ("------------------------------------")         
-        for protein_id in hit_positions.keys():
-            curr_length = hit_positions[protein_id][1] - hit_positions[protein_id][0] + 1
-            if mean_length - curr_length > sigma_num * std_deviation: # Oh-o
-                #print ("BAD\tID = %s, curr length = %s" % (protein_id, curr_length))
-                partial_hit.append(protein_id)
-                self.add_to_actions(protein_id, ("partial hit", self.id_to_org_and_seq[protein_id][0]))
-            #else:
-                #print ("GOOD\tID = %s, curr length = %s" % (protein_id, curr_length))
-        
-        info_string = "Length of hit part to a profile created from the alignment\n"
-        info_string += "M(x): %.3f; D(x): %.3f; std. deviation = %.3f\n" % (mean_length, dispersion, std_deviation)
-        info_string += "Number of std. deviations allowed: %s" % sigma_num
-
-        begin = int(mean_length - (sigma_num * std_deviation))
-        end = int(mean_length + (sigma_num * std_deviation))
-        nsteps = 20
-        step = (float(end - begin))/nsteps
-        step = int(step)
-        self.host.log_tab.write_histogram(values, info_string, begin, step, nsteps)  
-  
-    def get_length_info(self, short_seq, long_seq):
+        """
+        Method adds protein to the actions list or merges a new reason (<column_values> are
+        (reason, organism); reason could be a comma-separated list) into its existing item
+        """
+        #FIX: version 1.2.0 (items are found by the <self.id_to_action> instead of scanning the Treeview)
+        reasons = column_values[0].split(", ")
+        if protein_id in self.id_to_action: # This protein id is already in the actions list
+            action = self.id_to_action[protein_id]
+            new_reasons = [r for r in reasons if not r in action[0]]
+            if len(new_reasons) != 0: # Different reason
+                action[0].extend(new_reasons)
+                self.actions.item(protein_id, values = (", ".join(action[0]), action[1]))
+            return
+        self.id_to_action[protein_id] = [reasons, column_values[1], tuple(curr_tags)]
+        self.count_removal(protein_id, (), curr_tags)
+        self.actions.insert("", "end", iid = protein_id, text = protein_id, values = (column_values[0], column_values[1]), tags = curr_tags)
+
+    def add_actions(self, actions, curr_tags = ()):
+        """
+        Method adds all <actions> (list of tuples (protein_id, reason, organism)) with reasons of
+        each protein merged beforehand, so every item is inserted once with its final values
+        """
+        for (protein_id, reasons, curr_org) in AlnEngine.merge_purification_actions(actions):
+            self.add_to_actions(protein_id, (", ".join(reasons), curr_org), curr_tags)
+        self.show_organism_report()
+
+    def set_action_tags(self, protein_ids, curr_tags):
+        for protein_id in protein_ids:
+            self.count_removal(protein_id, self.id_to_action[protein_id][2], curr_tags)
+            self.id_to_action[protein_id][2] = tuple(curr_tags)
+            self.actions.item(protein_id, tags = curr_tags)
+        self.show_organism_report()
+
+    def remove_actions(self, protein_ids = None):
+        """
+        Method removes given <protein_ids> (all if None) from the actions list
+        """
+        if protein_ids == None:
+            protein_ids = list(self.id_to_action.keys())
+        for protein_id in protein_ids:
+            self.count_removal(protein_id, self.id_to_action[protein_id][2], ())
+            del self.id_to_action[protein_id]
+        if len(protein_ids) != 0:
+            self.actions.delete(*protein_ids)
+        self.show_organism_report()
+
+    def count_removal(self, protein_id, old_tags, new_tags):
+        """
+        Method updates number of the remaining proteins of the organism if the protein
+        was marked for removal (<new_tags>) or unmarked (<old_tags>)
+        """
+        if (self.org_to_remaining == None) or (not protein_id in self.id_to_org_and_seq):
+            return
+        change = int("removal" in old_tags) - int("removal" in new_tags)
+        if change == 0:
+            return
+        curr_org = self.id_to_org_and_seq[protein_id][0]
+        self.org_to_remaining[curr_org] += change
+        if self.org_to_remaining[curr_org] == 0:
+            self.lost_orgs.add(curr_org)
+        else:
+            self.lost_orgs.discard(curr_org)
+
+    def show_organism_report(self, max_shown = 5):
+        if len(self.lost_orgs) == 0:
+            self.organism_report.configure(text = "")
+            return
+        lost_orgs = sorted(self.lost_orgs)
+        shown = ", ".join(lost_orgs[0:max_shown])
+        if len(lost_orgs) > max_shown:
+            shown += ", ..."
+        self.organism_report.configure(text = "No protein remains for %i organism(s): %s" % (len(lost_orgs), shown))
+
+    def get_length_limits(self):
         min_length = None
         max_length = None
         try:
@@ -397,15 +413,7 @@ class AlnPurify(tkinter.Frame):
             max_length = float(self.max_length.get())
         except ValueError:
             print ("    [..WARNING..] Maximal protein length will not be considered")
-
-        for protein_id in self.id_to_org_and_seq.keys():
-            curr_seq = self.id_to_org_and_seq[protein_id][1].replace("-", "")
-            if (min_length != None) and (len(curr_seq) < min_length):
-                self.add_to_actions(protein_id, ("short hit", self.id_to_org_and_seq[protein_id][0]))
-                short_seq.append(protein_id) 
-            if (max_length != None) and (len(curr_seq) > max_length):
-                self.add_to_actions(protein_id, ("long hit", self.id_to_org_and_seq[protein_id][0]))
-                long_seq.append(protein_id) 
+        return (min_length, max_length)
 
     def apply_purification_options(self):
         print ("    Applying purification options!")
@@ -415,40 +423,37 @@ class AlnPurify(tkinter.Frame):
                     "org_join"    : ("#000000", "#FF00FF"),
                     "short_seq"   : (None, None),
                     "long_seq"    : (None, None)}
-        for name in self.alignment.text_widget.tag_names():            
+        for name in self.alignment.get_overlay_names():
             if (name in tag_info) or (name == "bold") or (name == "italic"):
-                self.alignment.text_widget.tag_remove(name, 1.0, tkinter.END)           
-        for value in self.actions.get_children(""):
-            curr_tags = self.actions.item(value)["tags"]
-            if len(curr_tags) == 0: # No decision is made about this protein
-                self.actions.delete(value) 
-
-        no_hit = list()
-        poor_hit = list()
-        partial_hit = list()        
-        short_seq = list()
-        long_seq = list()
+                self.alignment.remove_overlay(name, False)
+        undecided = [protein_id for protein_id in self.id_to_action.keys() if len(self.id_to_action[protein_id][2]) == 0]
+        self.remove_actions(undecided) # No decision is made about these proteins
+
+        curr_evalue_threshold = 1e-5
+        sigma_num_self = 2        
         if self.id_to_features != None:
-            curr_evalue_threshold = 1e-5
             try:
                 curr_evalue_threshold = float(self.evalue_threshold.get())
             except ValueError:
                 print ("    [..WARNING..] Bad value entered as an e-value threshold; default %s is used!" % curr_evalue_threshold)
-
-            sigma_num_self = 2        
             try:
                 sigma_num_self = float(self.sigma_num_self.get())
             except ValueError:
                 print ("    [..WARNING..] Bad value entered as sigma number; default %s is used!" % sigma_num_self)
-            self.get_self_hit_info(curr_evalue_threshold, sigma_num_self, no_hit, poor_hit, partial_hit)
+        (min_length, max_length) = self.get_length_limits()
 
-        self.get_length_info(short_seq, long_seq)
+        #FIX: version 1.2.0 (proteins are marked by the <AlnEngine>)
+        (actions, marked, histogram) = AlnEngine.get_purification_actions(self.id_to_org_and_seq, self.id_to_features, curr_evalue_threshold,
+                                                                         sigma_num_self, min_length, max_length)
+        self.add_actions(actions)
+        if histogram != None:
+            self.host.log_tab.write_histogram(*histogram)
 
-        self.add_tag_to_text(no_hit, "no_hit", tag_info["no_hit"][0], tag_info["no_hit"][1])
-        self.add_tag_to_text(poor_hit, "poor_hit", None, tag_info["poor_hit"][1])
-        self.add_tag_to_text(partial_hit, "partial_hit", tag_info["partial_hit"][0], None)
-        self.add_tag_to_text(short_seq, "italic", None, None)
-        self.add_tag_to_text(long_seq, "bold", None, None)
+        self.add_tag_to_ids(marked["no_hit"], "no_hit", tag_info["no_hit"][0], tag_info["no_hit"][1])
+        self.add_tag_to_ids(marked["poor_hit"], "poor_hit", None, tag_info["poor_hit"][1])
+        self.add_tag_to_ids(marked["partial_hit"], "partial_hit", tag_info["partial_hit"][0], None)
+        self.add_tag_to_ids(marked["short_seq"], "italic", None, None)
+        self.add_tag_to_ids(marked["long_seq"], "bold", None, None)
 
         print ("    [..DONE..]")
 
@@ -461,14 +466,14 @@ class AlnPurify(tkinter.Frame):
             tkMessageBox.showinfo("Obtain features first", "Before purification analysis please obtain features in the 'Features' tab!")            
             raise ValueError
 
-        import udav_base
+        self.host.load_pending_sections(self.host.input_tab)
         self.host.set_status("Obtaining sequence features, check the console for progress", "#FF0000")
-        aligned_filename = os.path.join(self.host.settings.work_dir, "%s.aln" % self.host.temp_name)
-        Aln_basic.write_widget_into_file(self.host.input_tab.aln_input_frame.text_widget, aligned_filename, False)        
-        features_filename = os.path.join(self.host.settings.work_dir, "%s.features" % self.host.temp_name)
-        Aln_basic.write_widget_into_file(self.host.features_tab.features.text_widget, features_filename, False)  
-        self.featured_sequences = udav_base.get_featured(aligned_filename, None, features_filename, dict(), dict(), False)
-        del udav_base
+        #FIX: version 1.2.0 (featured sequences are obtained from the texts without temporary files and shared via <self.host.artifacts>)
+        def get_featured(aln_text, features_text): # Could be called later by the <self.host.artifacts>, so module is imported here
+            import udav_base
+            return udav_base.get_featured(aln_text.split("\n"), None, features_text.split("\n"), dict(), dict(), False)
+        self.featured_sequences = self.host.artifacts.get("featured_sequences", [self.host.input_tab.aln_input_frame.text_widget.get(1.0, tkinter.END),
+                                                          self.host.features_tab.features.text_widget.get(1.0, tkinter.END)], get_featured)
         self.host.set_status("Ready")
         print ("    [..DONE..]")
 
@@ -476,9 +481,9 @@ class AlnPurify(tkinter.Frame):
         """
         COGs or other domains are mapped in the order specified in the <self.host.domain_colors> list
         """        
-        for tag_name in self.alignment.text_widget.tag_names():
+        for tag_name in self.alignment.get_overlay_names():
             if (tag_name[0] == tag_name[0].upper()) and (tag_name[0] != "["): # This is not a technical or taxonomy tag, but domain/COG name
-                self.alignment.text_widget.tag_delete(tag_name)
+                self.alignment.remove_overlay(tag_name)
 
         if self.featured_sequences == None: # No features were obtained previously
             try:
@@ -487,17 +492,17 @@ class AlnPurify(tkinter.Frame):
                 return
                  
         req_domain_to_color = self.host.domain_to_color
-        id_to_req_features = dict()
+        domain_to_ranges = dict() #FIX: version 1.2.0 (regions are indexed by domain name: row -> list of (start, end))
         blocks_seq = None
         for s in self.featured_sequences:
             if s.ID == "BLOCKS":
                 blocks_seq = s.sequence
                 continue
-            if s.ID == "SITE":
+            if (s.ID == "SITE") or (not s.ID in self.id_to_rows):
                 continue
-            id_to_req_features[s.ID] = list()
             for feature in s.features:                           
                 if feature.name in req_domain_to_color: # This domain has a certain color and should be drawn             
+                    row_to_ranges = domain_to_ranges.setdefault(feature.name, dict())
                     for region in feature.regions:                        
                         suggested_start = feature.get_begin(region) - (self.valid_start + 1)
                         suggested_end = feature.get_end(region) - (self.valid_start + 1)
@@ -505,7 +510,8 @@ class AlnPurify(tkinter.Frame):
                         real_end = min(self.valid_end - self.valid_start + 1, suggested_end)
                         #print ("feature = %s: region = '%s', REAL start = '%s', REAL end = '%s'" % (feature.name, region, real_start, real_end))
                         if real_end > 0: # Thus it is in the showing range 
-                            id_to_req_features[s.ID].append((feature.name, real_start, real_end))
+                            for (row, id_end) in self.id_to_rows[s.ID]:
+                                row_to_ranges.setdefault(row, list()).append((real_start + self.name_length, real_end + self.name_length + 1))
 
         # --------------------------------------- 2) Adding tags to a widget
         proper_color_order = self.host.domain_colors
@@ -514,17 +520,10 @@ class AlnPurify(tkinter.Frame):
                 proper_color_order.append(proper_color_order.pop(i))
                 break
         
-            
         for pair in proper_color_order: # FIX 0.2.3 Tags are now added in a proper order, as listed in color scheme
-            for i in range(len(self.id_list)):
-                protein_id = self.id_list[i]
-                if protein_id in id_to_req_features:
-                    for feature in id_to_req_features[protein_id]:
-                        if pair[0] == feature[0]:
-                            tag_start = "%i.%i" % (i + 1, feature[1] + self.name_length)
-                            tag_end = "%i.%i" % (i + 1, feature[2] + self.name_length + 1)                                              
-                            #print ("id = %s, domain = %s, start = %s, end = %s" % (protein_id, feature[0], tag_start, tag_end))
-                            self.alignment.text_widget.tag_add(feature[0], tag_start, tag_end)
+            if pair[0] in domain_to_ranges: #FIX: version 1.2.0 (all regions of a domain are set at once; later domains are raised above)
+                self.alignment.set_overlay(pair[0], domain_to_ranges[pair[0]])
+        self.alignment.render()
         self.show_features.configure(state = tkinter.NORMAL)
         self.hide_features.configure(state = tkinter.NORMAL)
         self.show_domains()
@@ -545,30 +544,14 @@ class AlnPurify(tkinter.Frame):
 
     def apply_actions(self):
         ids_to_remove = dict() #---------------------- 1) Finding IDs to remove
-        for action_id in self.actions.get_children():   
-            curr_tags = self.actions.item(action_id)["tags"]
+        for protein_id in self.id_to_action.keys():
+            (reasons, curr_org, curr_tags) = self.id_to_action[protein_id]
             if "removal" in curr_tags:
-                curr_protein_id = self.actions.item(action_id)["text"]
-                reason = self.actions.item(action_id)["values"][0]
-                ids_to_remove[curr_protein_id] = [reason, None]
+                ids_to_remove[protein_id] = [", ".join(reasons), None]
         ids_to_fix = dict() #---------------------- 2) Fixing N-terminal truncation (not available)
 
                             #---------------------- 3) Getting organism information
-        p = 0
-        for protein_id in ids_to_remove.keys():
-            organism_remains = False
-            if not protein_id in self.id_to_org_and_seq: # This protein was likely removed already
-                #ids_to_remove.pop(protein_id)
-                p += 1
-                continue
-            curr_org = self.id_to_org_and_seq[protein_id][0]
-            for protein_jd in self.id_to_org_and_seq.keys():
-                if not protein_jd in ids_to_remove:
-                    remaining_org = self.id_to_org_and_seq[protein_jd][0]
-                    if remaining_org == curr_org: # Organism for this protein ID remains in the sample
-                        organism_remains = True
-                        break
-            ids_to_remove[protein_id][1] = organism_remains
+        p = AlnEngine.set_organism_remains(ids_to_remove, self.id_to_org_and_seq, self.org_to_remaining) #FIX: version 1.2.0 (counts are kept while marking)
         print ("    Previously removed proteins: %i" % p)
         self.host.input_tab.apply_actions(ids_to_remove, ids_to_fix)
 
@@ -577,6 +560,7 @@ class AlnPurify(tkinter.Frame):
         import udav_base, udav_tree_svg
         if self.host.gi_to_tax == None:
             self.host.set_status("Reading assignment of gi to taxonomy", "#FF0000")            
+            self.host.load_pending_sections(self.host.input_tab)
             curr_tax_text = self.host.input_tab.tax_input_frame.text_widget.get(1.0, tkinter.END).strip()
             strings = curr_tax_text.split("\n")
             first_symbol = None
@@ -633,9 +617,9 @@ class AlnPurify(tkinter.Frame):
             return    
         
         self.host.set_status("Coloring alignment", "#FF0000")
-        for tag_name in self.alignment.text_widget.tag_names(): #--- 1) Removing previous marking, if any
+        for tag_name in self.alignment.get_overlay_names(): #--- 1) Removing previous marking, if any
             if tag_name[0] == "[": # This is taxonomy tag
-                self.alignment.text_widget.tag_delete(tag_name)
+                self.alignment.remove_overlay(tag_name)
 
         for tax_name in self.host.tax_to_color.keys(): #------------------- 2) Loading new taxonomy tags
             tag_name = "[%s]" % tax_name
@@ -654,9 +638,8 @@ class AlnPurify(tkinter.Frame):
             curr_tag = "[Unknown]"
             if protein_id in self.host.gi_to_tax:
                 curr_tag = "[%s]" % self.host.gi_to_tax[protein_id]                
-            tag_start = "%i.%i" % (i + 1, self.name_length - 4)
-            tag_end = "%i.%i" % (i + 1, self.name_length - 1)                                                                                     
-            self.alignment.text_widget.tag_add(curr_tag, tag_start, tag_end)
+            self.alignment.add_overlay(curr_tag, i, self.name_length - 4, self.name_length - 1)
+        self.alignment.render()
 
         self.host.set_status("READY", self.host.header)
 
@@ -672,16 +655,10 @@ class AlnPurify(tkinter.Frame):
         actions_filename = os.path.join(self.host.settings.work_dir, self.host.get_project_name(), "%s.actions" % self.host.get_project_name())
         actions_file = open(actions_filename, "w")
         actions_file.write("#protein_id\ttag\tvalues\n")
-        for action_id in self.actions.get_children():   
-            curr_tags = self.actions.item(action_id)["tags"]
+        for protein_id in self.id_to_action.keys():
+            (reasons, curr_org, curr_tags) = self.id_to_action[protein_id]
             if len(curr_tags) != 0: # There was a decision about this protein
-                curr_protein_id = self.actions.item(action_id)["text"]
-                curr_values = self.actions.item(action_id)["values"]
-                curr_tag = curr_tags[0]
-                string = "%s\t%s" % (curr_protein_id, curr_tag)
-                for value in curr_values:
-                    string += "\t%s" % value
-                actions_file.write("%s\n" % string)
+                actions_file.write("%s\t%s\t%s\t%s\n" % (protein_id, curr_tags[0], ", ".join(reasons), curr_org))
         actions_file.close()
 
     def load_actions(self, filename):
@@ -715,6 +692,10 @@ class AlnPurify(tkinter.Frame):
         self.hide_features.configure(state = tkinter.DISABLED)
 
     def clear(self):
-        self.alignment.text_widget.delete(1.0, tkinter.END)
-        for value in self.actions.get_children(""):
-            self.actions.delete(value)
\ No newline at end of file
+        self.alignment.clear_rows()
+        self.alignment_matrix = None
+        self.occupancy_canvas.delete("all")
+        self.remove_actions()
+        self.org_to_remaining = None
+        self.lost_orgs = set()
+        self.show_organism_report()
\ No newline at end of file
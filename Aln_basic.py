@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 import os, sys, platform
-import codecs
 import tkinter
 import tkinter.messagebox as tkMessageBox
 import tkinter.font
+import AlnEngine
 
 def exists(setting_object, setting_name, method_to_check_existence, object_name, addition_to_path = ""):
     """
@@ -29,109 +29,138 @@ def write_widget_into_file(text_widget, filename, ask_if_exists = False, use_cod
     """
     Method returns True if the were was written correctly and False if some errors occured
     """
-    curr_text = text_widget.get(1.0, tkinter.END)
+    finish_chunked_loading(text_widget) # Half-loaded text should not be written
+    return write_text_into_file(text_widget.get(1.0, tkinter.END), filename, ask_if_exists, use_codecs)
+
+def write_text_into_file(curr_text, filename, ask_if_exists = False, use_codecs = False):
+    """
+    Same as <write_widget_into_file>, but the text is already taken from the widget.
+    Whole text is written with a single call
+    """
     if len(curr_text.strip()) == 0: # Text is empty
         return False
     if filename == "": # No filename provided, save was canceled
         return False
 
-    strings = curr_text.split("\n")
     if os.path.isfile(filename) and ask_if_exists:
         answer = tkMessageBox.askyesno("File exists", "File %s exists, are you sure you want to re-write it?" % filename)
         if answer != True:
             return False
-    if use_codecs:
-        output_file = codecs.open(filename, "w", encoding = "utf_8")
-    else:
-        output_file = open(filename, "w")
-    for string in strings:
-        output_file.write("%s\n" % string)
-    output_file.close()
-    return True
+    return AlnEngine.write_text_file(curr_text, filename, use_codecs) #FIX: version 1.2.0 (text is not written line by line)
 
-def read_widget_from_file(text_widget, filename, use_codecs = False):
-    text_widget.delete(1.0, tkinter.END)
-    if use_codecs:
-        input_file = codecs.open(filename, "r", encoding = "utf_8")
-    else:
-        input_file = open(filename, "r")
-    for string in input_file:        
-        text_widget.insert(tkinter.END, string)
-    input_file.close()
+CHUNKED_LOAD_THRESHOLD = 16 * 1024 * 1024 # Texts larger than this (in symbols) are inserted by chunks in the automatic mode
+LOAD_CHUNK_SIZE = 1024 * 1024             # Number of symbols inserted at once in the chunked mode
+chunked_loads = dict()                    # Text widget path -> (widget, id of the scheduled <after> call, method inserting the rest) for unfinished chunked loads
+
+def cancel_chunked_loading(text_widget = None):
+    """
+    Method stops chunked loading into the <text_widget> (or into all widgets if it is None)
+    """
+    for widget_path in list(chunked_loads.keys()):
+        if text_widget == None or widget_path == str(text_widget):
+            (curr_widget, after_id, finish) = chunked_loads.pop(widget_path)
+            curr_widget.after_cancel(after_id)
+
+def finish_chunked_loading(text_widget = None):
+    """
+    Method inserts the rest of the text into the <text_widget> (or into all widgets if it is None)
+    which is still loaded by chunks; it should be called before the text of the widget is read or saved
+    """
+    for widget_path in list(chunked_loads.keys()):
+        if text_widget == None or widget_path == str(text_widget):
+            (curr_widget, after_id, finish) = chunked_loads.pop(widget_path)
+            curr_widget.after_cancel(after_id)
+            finish()
+
+def insert_text_by_chunks(text_widget, text, on_done = None, chunk_size = LOAD_CHUNK_SIZE):
+    """
+    Method inserts <text> into the empty <text_widget> by pieces of <chunk_size> symbols; after each
+    piece control returns to the Tk event loop (via <after>), so the program is responsive
+    while very large texts are loaded. <on_done> (if given) is called after the last piece
+    """
+    def insert_rest(start):
+        text_widget.insert(tkinter.END, text[start:])
+        chunked_loads.pop(str(text_widget), None)
+        if on_done != None:
+            on_done()
+
+    def insert_chunk(start):
+        if start + chunk_size >= len(text):
+            insert_rest(start)
+            return
+        text_widget.insert(tkinter.END, text[start:start + chunk_size])
+        after_id = text_widget.after(1, insert_chunk, start + chunk_size)
+        chunked_loads[str(text_widget)] = (text_widget, after_id, lambda: insert_rest(start + chunk_size))
+    insert_chunk(0)
+
+def read_widget_from_file(text_widget, filename, use_codecs = False, chunked = False, on_done = None):
+    """
+    Method reads the <filename> at once and inserts its stripped text into the <text_widget>
+    (see <read_widget_from_string()> for <chunked> and <on_done>). Returns the inserted text
+    """
+    #FIX: version 1.2.0 (file is not inserted line by line and then re-inserted stripped)
+    return read_widget_from_string(text_widget, AlnEngine.read_text_file(filename, use_codecs), chunked, on_done)
 
-    stripped_text = text_widget.get(1.0, tkinter.END).strip()
+def read_widget_from_string(text_widget, text, chunked = False, on_done = None):
+    """
+    Method inserts stripped <text> (e.g. a section of the project container) into the <text_widget>
+    in one call. If <chunked> is True (or None and the text is larger than CHUNKED_LOAD_THRESHOLD),
+    text is inserted by chunks yielding to the event loop and this method returns before the
+    loading is finished; <on_done> (if given) is called when the whole text is inserted.
+    Returns the inserted text
+    """
+    text = text.strip()
+    if chunked == None:
+        chunked = len(text) > CHUNKED_LOAD_THRESHOLD
+    cancel_chunked_loading(text_widget)
     text_widget.delete(1.0, tkinter.END)
-    text_widget.insert(tkinter.END, stripped_text)
+    if chunked:
+        insert_text_by_chunks(text_widget, text, on_done)
+    else:
+        text_widget.insert(tkinter.END, text)
+        if on_done != None:
+            on_done()
+    return text
 
 def read_domain_info_file(dom_filename):
-    dom_dict = dict()
-    dom_file = open(dom_filename)
-    for string in dom_file:
-        string = string.strip()
-        if len(string) == 0:
-            continue
-        fields = string.split("\t")
-        dom_dict[fields[0]] = (fields[1], fields[2])
-    dom_file.close()
-    return dom_dict
+    return AlnEngine.read_domain_info_file(dom_filename)
 
 def get_valid_alignment_range(seqs, presence_threshold):
     """
     Method returns <start> and <end> in the sequence alignment <seqs> coordinates,
     where at least <presence_threshold> % of sequences contain letters.
+    <seqs> could be either a list of sequences or <udav_base.Alignment_matrix>; in the
+    latter case the occupancy profile is cached in the matrix and reused for other thresholds
+    """
+    import udav_base
+    matrix = udav_base.get_alignment_matrix(seqs)
+    del udav_base
+    return matrix.get_occupancy().get_range(presence_threshold)
+
+def read_fasta_from_strings(strings, remove_gaps = False, as_matrix = False):
+    """
+    Method reads fasta-formatted <strings> into a list of <udav_base.Sequence> objects;
+    <strings> could also be a Tk Text widget or a file name (see <udav_base.iterate_fasta()>).
+    If <as_matrix> is True, <udav_base.Alignment_matrix> is returned instead (all
+    sequences should be of the same length, otherwise ValueError is raised)
     """
-    start = 0
-    i = start
-    while i < len(seqs[0].sequence):
-        j = 0
-        presence = 0
-        while j < len(seqs):
-            curr_letter = seqs[j].sequence[i]
-            if curr_letter != "-":
-                presence += 1
-            j += 1
-        presence = 100*float(presence)/float(len(seqs))
-        if presence > presence_threshold:
-            start = i
-            break
-        i += 1
-
-    end = len(seqs[0].sequence) - 1
-    i = end
-    while i >= 0:
-        j = 0
-        presence = 0
-        while j < len(seqs):
-            curr_letter = seqs[j].sequence[i]
-            if curr_letter != "-":
-                presence += 1
-            j += 1
-        presence = 100*float(presence)/len(seqs)
-        if presence > presence_threshold:
-            end = i + 1
-            break
-        i -= 1
-    return (start, end)
-
-def read_fasta_from_strings(strings, remove_gaps = False):
-    seqs = list()
     import udav_base
-    for string in strings:
-        string = string.strip()
-        if len(string) == 0:
-            continue
-        if string[0] == ">":             
-            seqs.append(udav_base.Sequence(string.strip(">"), ""))
+    if as_matrix:
+        seqs = udav_base.Alignment_matrix()
+    else:
+        seqs = list()
+    for (name, sequence) in udav_base.iterate_fasta(strings):
+        if remove_gaps:
+            sequence = sequence.replace("-", "")
+        if as_matrix:
+            seqs.add_sequence(name.strip(">"), sequence)
         else:
-            if remove_gaps:
-                string = string.replace("-", "")
-            seqs[-1].sequence += string
+            seqs.append(udav_base.Sequence(name.strip(">"), sequence))
     del udav_base    
     return seqs
 
 def export_MEGA_format(text_widget, filename, title):
-    strings = text_widget.get(1.0, tkinter.END).split("\n")    
-    seqs = read_fasta_from_strings(strings)
+    seqs = read_fasta_from_strings(text_widget)
     if len(seqs) == 0:
         return
     if filename == "": # No filename provided, save was canceled
@@ -155,6 +184,37 @@ def export_MEGA_format(text_widget, filename, title):
             mega_file.write("%s\n" % s.sequence[begin:])
     mega_file.close()
 
+class TrackedText(tkinter.Text):
+    """
+    Text widget which uses the Tk modified flag to detect changes since the last <pop_changed()> call;
+    modified flag seen by the program (<edit_modified()>) is kept separately and works as usual
+    """
+    def __init__(self, parent, **options):
+        tkinter.Text.__init__(self, parent, **options)
+        self.modified = False # Modified flag as set by the program
+        self.changed = False  # Text was changed since the last <pop_changed()> call
+
+    def sync_modified(self):
+        if tkinter.Text.edit_modified(self):
+            self.modified = True
+            self.changed = True
+            tkinter.Text.edit_modified(self, False)
+
+    def edit_modified(self, arg = None):
+        self.sync_modified()
+        if arg == None:
+            return self.modified
+        self.modified = bool(arg)
+
+    def pop_changed(self):
+        """
+        Method returns True if text was changed since the previous call
+        """
+        self.sync_modified()
+        changed = self.changed
+        self.changed = False
+        return changed
+
 class TextFrameWithLabelAndButton(tkinter.Frame):
     def __init__(self, parent, padding, background, text_color, label_text, button_text):
         tkinter.Frame.__init__(self, parent)
@@ -165,10 +225,13 @@ class TextFrameWithLabelAndButton(tkinter.Frame):
         self.label = None
         self.text_widget = None       
         self.button = None
+        self.y_scrollbar = None
+        self.x_scrollbar = None
         self.font_size = 8
         self.normal_font = None   # tkinter.font.Font for the text
         self.bold_font = None     # tkinter.font.Font for the "bold" tag
         self.italic_font = None   # tkinter.font.Font for the "italic" tag
+        self.records = None       # Fasta records parsed from the text widget (see <self.get_records()>)
         self.create_UI(label_text, button_text)
 
     def create_UI(self, label_text, button_text):
@@ -190,11 +253,13 @@ class TextFrameWithLabelAndButton(tkinter.Frame):
         text_scr_x = tkinter.Scrollbar(self, orient = tkinter.HORIZONTAL)
         text_scr_x.grid(row = 2, column = 0, sticky = "NSEW")
         self.normal_font = tkinter.font.Font(self.text_widget, ("Courier New", self.font_size))
-        self.text_widget = tkinter.Text(self, state = tkinter.NORMAL, font = self.normal_font,
+        self.text_widget = TrackedText(self, state = tkinter.NORMAL, font = self.normal_font,
                                         yscrollcommand = text_scr_y.set, xscrollcommand = text_scr_x.set, wrap = tkinter.NONE)
         self.text_widget.grid(row = 1, column = 0, sticky = "NSEW")
         text_scr_y.configure(command = self.text_widget.yview)
         text_scr_x.configure(command = self.text_widget.xview)
+        self.y_scrollbar = text_scr_y
+        self.x_scrollbar = text_scr_x
         self.bold_font = tkinter.font.Font(self.text_widget, self.text_widget.cget("font"))
         self.bold_font.configure(weight = "bold")
         self.text_widget.tag_configure("bold", font = self.bold_font)
@@ -242,8 +307,17 @@ class TextFrameWithLabelAndButton(tkinter.Frame):
     def get_strings(self):
         return self.text_widget.get(1.0, tkinter.END).strip().split("\n")
 
+    def get_records(self):
+        """
+        Method returns list of <udav_base.Sequence> objects read from the text widget; they are
+        parsed again only if the text was changed since the previous call (records should not be modified)
+        """
+        if self.text_widget.pop_changed() or (self.records == None): #FIX: version 1.2.0 (records are cached)
+            self.records = read_fasta_from_strings(self.text_widget)
+        return self.records
+
     def count_fasta(self):
-        seqs = read_fasta_from_strings(self.get_strings())
+        seqs = self.get_records()
         n = len(seqs)
         self.add_label_data("%i sequences" % n)
         return n
@@ -256,7 +330,7 @@ class TextFrameWithLabelAndButton(tkinter.Frame):
     def count_seq_length(self):        
         result = None
         lengths = dict()        
-        seqs = read_fasta_from_strings(self.get_strings())
+        seqs = self.get_records()
         for s in seqs:           
             lengths[len(s.sequence)] = True
         if len(lengths.keys()) == 0: # No sequences found
@@ -268,6 +342,301 @@ class TextFrameWithLabelAndButton(tkinter.Frame):
         self.add_label_data(result)   
         return result
 
+class AlignmentFrame(TextFrameWithLabelAndButton):
+    """
+    Frame with the alignment kept in memory as a list of <rows> (strings) of which only those
+    visible are inserted into the text widget (the vertical scrollbar moves this window).
+    Coloring is kept as interval data and is applied to the visible rows only:
+    - overlays:        tag name -> {row -> list of (start, end) columns}
+    - column overlays: tag name -> list of (start, end) columns to be marked in every row
+    Tags are created (and thus prioritized) in the order the overlays were added.
+    The text widget is read-only; selection is kept as positions in the <rows>, so it is copied
+    (and used to mark rows) in full even if only a part of it is visible
+    """
+    def __init__(self, parent, padding, background, text_color, label_text, button_text):
+        TextFrameWithLabelAndButton.__init__(self, parent, padding, background, text_color, label_text, button_text)
+        self.rows = list()
+        self.first_row = 0             # Index of the first row shown in the text widget
+        self.overlays = dict()
+        self.column_overlays = dict()
+        self.selection = None          # Tuple ((row, column), (row, column)) of the selection start and end (not included)
+        self.shown_selection = None    # Tuple of text widget indices of the selection part shown by the last <render()>
+        self.anchor = None             # Position (row, column) of the last click, selection is extended from it with Shift
+        self.y_scrollbar.configure(command = self.yview)
+        self.text_widget.configure(yscrollcommand = "", state = tkinter.DISABLED)
+        self.text_widget.bind("<Button-1>", self.click)
+        self.text_widget.bind("<Shift-Button-1>", self.shift_click)
+        for sequence in ["<<Copy>>", "<Control-c>", "<Control-ntilde>"]:
+            self.text_widget.bind(sequence, self.copy)
+        for sequence in ["<<SelectAll>>", "<Control-a>", "<Control-ocircumflex>"]:
+            self.text_widget.bind(sequence, self.select_all)
+        self.text_widget.bind("<Configure>", lambda event: self.render())
+        if platform.system() == "Linux":
+            self.text_widget.bind("<Button-4>", lambda event: self.yview("scroll", -3, "units"))
+            self.text_widget.bind("<Button-5>", lambda event: self.yview("scroll", 3, "units"))
+        else:
+            self.text_widget.bind("<MouseWheel>", lambda event: self.yview("scroll", -3 if event.delta > 0 else 3, "units"))
+        self.text_widget.bind("<Prior>", lambda event: self.yview("scroll", -1, "pages"))
+        self.text_widget.bind("<Next>", lambda event: self.yview("scroll", 1, "pages"))
+
+    def change_font(self, event):
+        TextFrameWithLabelAndButton.change_font(self, event)
+        self.render()
+
+    def get_strings(self):
+        return self.rows
+
+    def text_is_empty(self):
+        return len(self.rows) == 0
+
+    def set_rows(self, rows):
+        """
+        Method shows the list of strings <rows> from its beginning; all overlays are removed
+        """
+        for tag_name in self.get_overlay_names():
+            self.remove_overlay(tag_name)
+        self.rows = rows
+        self.first_row = 0
+        self.selection = None
+        self.anchor = None
+        self.text_widget.tag_remove("sel", 1.0, tkinter.END)
+        self.shown_selection = None
+        self.render()
+
+    def clear_rows(self):
+        self.set_rows(list())
+
+    def get_visible_row_number(self):
+        height = self.text_widget.winfo_height()
+        if height <= 1: # Widget is not shown yet
+            return 50
+        return height // max(1, self.normal_font.metrics("linespace")) + 1
+
+    def get_row(self, text_index):
+        """
+        Method returns number of the row shown at the <text_index> of the text widget
+        """
+        return self.first_row + int(self.text_widget.index(text_index).split(".")[0]) - 1
+
+    def get_position(self, text_index):
+        """
+        Method returns tuple (row, column) of the <text_index> of the text widget in the <self.rows>
+        """
+        (line, column) = [int(value) for value in self.text_widget.index(text_index).split(".")]
+        row = self.first_row + line - 1
+        if row >= len(self.rows): # Index after the last row (e.g. 'end')
+            row = len(self.rows) - 1
+            column = len(self.rows[row])
+        return (row, min(column, len(self.rows[row])))
+
+    def update_selection(self):
+        """
+        Method takes the selection made by the user in the text widget (if it differs from the shown part of <self.selection>)
+        """
+        ranges = self.text_widget.tag_ranges("sel")
+        current = None
+        if len(ranges) != 0:
+            current = (str(ranges[0]), str(ranges[-1]))
+        if current == self.shown_selection: # Not changed since the last <render()>
+            return
+        self.selection = None
+        if (current != None) and (len(self.rows) != 0):
+            self.selection = (self.get_position(current[0]), self.get_position(current[1]))
+        self.shown_selection = current
+
+    def show_selection(self):
+        """
+        Method marks the visible part of the <self.selection> with the 'sel' tag
+        """
+        self.shown_selection = None
+        self.text_widget.tag_remove("sel", 1.0, tkinter.END)
+        if self.selection == None:
+            return
+        ((start_row, start_column), (end_row, end_column)) = self.selection
+        last_line = int(self.text_widget.index("end-1c").split(".")[0])
+        if (end_row < self.first_row) or (start_row > self.first_row + last_line - 1):
+            return
+        start = "1.0"
+        if start_row >= self.first_row:
+            start = "%i.%i" % (start_row - self.first_row + 1, start_column)
+        end = "end-1c"
+        if end_row <= self.first_row + last_line - 1:
+            end = "%i.%i" % (end_row - self.first_row + 1, end_column)
+        self.text_widget.tag_add("sel", start, end)
+        ranges = self.text_widget.tag_ranges("sel")
+        if len(ranges) != 0:
+            self.shown_selection = (str(ranges[0]), str(ranges[-1]))
+
+    def select(self, start, end):
+        """
+        Method selects <self.rows> from the <start> to the <end> (tuples (row, column), end is not included)
+        and scrolls the window to the <start>
+        """
+        self.selection = (start, end)
+        self.see_row(start[0])
+        self.render()
+
+    def get_selected_rows(self):
+        """
+        Method returns tuple (first, last) of numbers of the selected rows or None if nothing is selected
+        (the last row is not counted if the selection ends at its start)
+        """
+        self.update_selection()
+        if self.selection == None:
+            return None
+        ((start_row, start_column), (end_row, end_column)) = self.selection
+        if (end_column == 0) and (end_row > start_row):
+            end_row -= 1
+        return (start_row, end_row)
+
+    def get_selected_text(self):
+        self.update_selection()
+        if self.selection == None:
+            return ""
+        ((start_row, start_column), (end_row, end_column)) = self.selection
+        if start_row == end_row:
+            return self.rows[start_row][start_column:end_column]
+        strings = [self.rows[start_row][start_column:]] + self.rows[start_row + 1:end_row] + [self.rows[end_row][:end_column]]
+        return "\n".join(strings)
+
+    def click(self, event):
+        self.text_widget.focus_set() # Read-only widget should get the keys for copy and select all
+        self.selection = None        # Click clears the selection even if it is scrolled out of the window
+        self.shown_selection = None
+        if len(self.rows) != 0:
+            self.anchor = self.get_position("@%i,%i" % (event.x, event.y))
+
+    def shift_click(self, event):
+        """
+        Method selects rows from the last click to this one, even if the first one was scrolled out of the window
+        """
+        if len(self.rows) == 0:
+            return "break"
+        self.update_selection()
+        position = self.get_position("@%i,%i" % (event.x, event.y))
+        anchor = self.anchor
+        if anchor == None:
+            if self.selection == None:
+                anchor = position
+            else:
+                anchor = self.selection[0]
+        self.selection = (min(anchor, position), max(anchor, position))
+        self.show_selection()
+        return "break"
+
+    def copy(self, event = None):
+        text = self.get_selected_text()
+        if len(text) != 0:
+            self.text_widget.clipboard_clear()
+            self.text_widget.clipboard_append(text)
+        return "break"
+
+    def select_all(self, event = None):
+        if len(self.rows) != 0:
+            self.selection = ((0, 0), (len(self.rows) - 1, len(self.rows[-1])))
+            self.show_selection()
+        return "break"
+
+    def yview(self, *args):
+        if len(args) == 0:
+            return
+        if args[0] == "moveto":
+            self.first_row = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= max(1, self.get_visible_row_number() - 1)
+            self.first_row += step
+        self.render()
+        return "break"
+
+    def see_row(self, row):
+        """
+        Method scrolls the window to the <row> (if it is not visible) and returns index of its start in the text widget
+        """
+        visible_num = self.get_visible_row_number()
+        if (row < self.first_row) or (row >= self.first_row + visible_num - 1):
+            self.first_row = row - visible_num // 2
+            self.render()
+        return "%i.0" % (row - self.first_row + 1)
+
+    def add_overlay(self, tag_name, row, start, end):
+        if not tag_name in self.overlays:
+            self.text_widget.tag_configure(tag_name) # Tag is created now to have the priority of this moment
+            self.overlays[tag_name] = dict()
+        if not row in self.overlays[tag_name]:
+            self.overlays[tag_name][row] = list()
+        self.overlays[tag_name][row].append((start, end))
+
+    def set_overlay(self, tag_name, row_to_ranges):
+        """
+        Method replaces all intervals of the <tag_name> with the <row_to_ranges> (row -> list of (start, end));
+        the tag is raised above all others, so overlays set one after another keep this order of priority
+        """
+        self.text_widget.tag_configure(tag_name)
+        self.text_widget.tag_raise(tag_name)
+        self.overlays[tag_name] = row_to_ranges
+
+    def add_column_overlay(self, tag_name, start, end):
+        if not tag_name in self.column_overlays:
+            self.text_widget.tag_configure(tag_name)
+            self.column_overlays[tag_name] = list()
+        self.column_overlays[tag_name].append((start, end))
+
+    def get_overlay_names(self):
+        return list(self.overlays.keys()) + list(self.column_overlays.keys())
+
+    def remove_overlay(self, tag_name, delete_tag = True):
+        """
+        Method removes all intervals of the <tag_name>; the tag itself is deleted from the
+        text widget if <delete_tag> is True (otherwise its configuration is kept)
+        """
+        self.overlays.pop(tag_name, None)
+        self.column_overlays.pop(tag_name, None)
+        if delete_tag:
+            self.text_widget.tag_delete(tag_name)
+        else:
+            self.text_widget.tag_remove(tag_name, 1.0, tkinter.END)
+
+    def render(self):
+        """
+        Method inserts rows visible in the window into the text widget and marks them with the overlays
+        """
+        self.update_selection() # Selection made in the current window is kept before the text is replaced
+        visible_num = self.get_visible_row_number()
+        self.first_row = max(0, min(self.first_row, len(self.rows) - visible_num + 1))
+        last_row = min(len(self.rows), self.first_row + visible_num)
+        x_position = self.text_widget.xview()[0]
+        self.text_widget.configure(state = tkinter.NORMAL)
+        self.text_widget.delete(1.0, tkinter.END)
+        self.text_widget.insert(tkinter.END, "\n".join(self.rows[self.first_row:last_row]))
+        self.text_widget.configure(state = tkinter.DISABLED)
+        for tag_name in self.overlays.keys():
+            indices = list()
+            row_to_ranges = self.overlays[tag_name]
+            for row in range(self.first_row, last_row):
+                if row in row_to_ranges:
+                    for (start, end) in row_to_ranges[row]:
+                        line = row - self.first_row + 1
+                        indices.append("%i.%i" % (line, start))
+                        indices.append("%i.%i" % (line, end))
+            if len(indices) != 0:
+                self.text_widget.tag_add(tag_name, *indices)
+        for tag_name in self.column_overlays.keys():
+            indices = list()
+            for line in range(1, last_row - self.first_row + 1):
+                for (start, end) in self.column_overlays[tag_name]:
+                    indices.append("%i.%i" % (line, start))
+                    indices.append("%i.%i" % (line, end))
+            if len(indices) != 0:
+                self.text_widget.tag_add(tag_name, *indices)
+        self.show_selection()
+        self.text_widget.xview_moveto(x_position)
+        if len(self.rows) == 0:
+            self.y_scrollbar.set(0, 1)
+        else:
+            self.y_scrollbar.set(self.first_row / len(self.rows), last_row / len(self.rows))
+
 def is_negative_float(string, name):
     result = False
     try:
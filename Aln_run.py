@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+This script runs the <Alnalyser> pipeline without GUI (and thus without display)
+for one or several projects:
+    python Aln_run.py run settings.ini project1 [project2 ...] [options]
+Projects are taken from the <work_dir> given in the settings file; both separate
+project files and single-file projects are supported.
+Steps are the same as in the GUI:
+    parse    - alignment (.aln) is parsed into .fixed, .pure, .ngphylogeny, .blocks_regions and .ids;
+    purify   - gappy columns are cut, self-hits are searched and length filters are applied;
+               suggested actions are written into the .purification table (ID, reasons, organism);
+    features - features are obtained from the .fixed alignment, domain table and TMHMM results
+               and written into the .features and .domain_info files
+@ Daria Dibrova aka udavdasha
+"""
+curr_version = "1.2.0"
+import sys, os, argparse
+import Settings, AlnEngine, AlnProject
+
+STEPS = ["parse", "purify", "features"]
+
+parser = argparse.ArgumentParser(description = "Headless runner of the Alnalyser pipeline. Current version is %s" % curr_version)
+parser.add_argument("command", choices = ["run"], help = "Command to execute (only 'run' is currently available)")
+parser.add_argument("settings", help = "Settings file (same as for the Alnalyser GUI)")
+parser.add_argument("projects", nargs = "+", help = "Names of the projects in the working directory")
+parser.add_argument("--steps", help = "Comma-separated steps to run (DEFAULT = %s)" % ",".join(STEPS), default = ",".join(STEPS), dest = "steps")
+parser.add_argument("-p", help = "Presence threshold (in %%) for the gappy columns cut (DEFAULT = 0)", default = 0, type = int, dest = "presence_threshold")
+parser.add_argument("--no_self_hits", help = "Do not search for self-hits while purification", action = "store_false", dest = "self_hits")
+parser.add_argument("-e", help = "E-value threshold for the self-hits (DEFAULT = 1e-5)", default = 1e-5, type = float, dest = "self_evalue")
+parser.add_argument("-s", help = "Number of std. deviations allowed for the self-hit length (DEFAULT = 2)", default = 2, type = float, dest = "sigma_num")
+parser.add_argument("--min_length", help = "Minimal protein length (DEFAULT = 0)", default = 0, type = float, dest = "min_length")
+parser.add_argument("--max_length", help = "Maximal protein length (DEFAULT = 10000)", default = 10000, type = float, dest = "max_length")
+parser.add_argument("--domains", help = "Domain table used for the features (DEFAULT = COG)", choices = ["COG", "Pfam"], default = "COG", dest = "feature_mode")
+parser.add_argument("--domain_evalue", help = "E-value threshold for the domains (DEFAULT = 1e-5)", default = "1e-5", dest = "domain_evalue")
+parser.add_argument("--overlap", help = "Threshold for domain overlap in percent (DEFAULT = 5)", default = "5", dest = "overlap")
+parser.add_argument("--unite", help = "Unite same domains following each other", action = "store_true", dest = "unite")
+parser.add_argument("--max_dist", help = "Maximal distance between united domains (DEFAULT = 50)", default = "50", dest = "max_dist")
+parser.add_argument("--max_hmm_overlap", help = "Maximal overlap between united domains in HMM coordinates (DEFAULT = 30)", default = "30", dest = "max_hmm_overlap")
+parser.add_argument("--single_file", help = "Save results into the single-file project", action = "store_true", dest = "single_file")
+parser.add_argument("-q", help = "Do not print output of the external programs", action = "store_false", dest = "verbose")
+myargs = parser.parse_args()
+
+def get_purification_table(actions):
+    """
+    Method merges reasons for the same protein (as in the actions list of the GUI) and
+    returns text of the table with protein IDs, reasons and organisms
+    """
+    strings = list()
+    for (protein_id, reasons, curr_org) in AlnEngine.merge_purification_actions(actions):
+        strings.append("%s\t%s\t%s" % (protein_id, ", ".join(reasons), curr_org))
+    return "\n".join(strings)
+
+def run_project(project_name, settings, steps, temp_prefix):
+    project_dir = os.path.join(settings.work_dir, project_name)
+    if not os.path.isdir(project_dir):
+        print ("[..ERROR..] Project '%s' does not exist in the '%s'!" % (project_name, settings.work_dir))
+        return False
+    print ("-------- Project %s is now running! --------" % project_name)
+    required = ["aln", "fixed", "TMHMM", "%s_table" % myargs.feature_mode]
+    sections = AlnProject.read_project(project_dir, project_name, required)
+    results = dict()
+
+    if "parse" in steps:
+        if not "aln" in sections:
+            print ("[..ERROR..] Alignment (.aln) is missing from the project '%s'!" % project_name)
+            return False
+        print ("    Parsing the alignment...")
+        results.update(AlnEngine.parse_alignment(sections["aln"], myargs.verbose))
+        if "fixed" in results:
+            sections["fixed"] = results["fixed"]
+
+    if "purify" in steps:
+        if not "fixed" in sections:
+            print ("[..ERROR..] Parsed alignment (.fixed) is missing from the project '%s'!" % project_name)
+            return False
+        print ("    Purification...")
+        data = AlnEngine.Purification_data(AlnEngine.read_alignment_matrix(sections["fixed"]), myargs.presence_threshold)
+        print ("    Alignment region [%i; %i] is used" % (data.valid_start + 1, data.valid_end))
+        if myargs.self_hits:
+            data.id_to_features = AlnEngine.find_self_hits(data.seqs_cut, settings.hmmer_dir, temp_prefix, myargs.verbose)
+        (actions, marked, histogram) = AlnEngine.get_purification_actions(data.id_to_org_and_seq, data.id_to_features, myargs.self_evalue,
+                                                                         myargs.sigma_num, myargs.min_length, myargs.max_length)
+        if histogram != None:
+            print (histogram[1])
+        for tag_name in AlnEngine.PURIFICATION_TAGS:
+            print ("    %s: %i" % (tag_name, len(marked[tag_name])))
+        results["purification"] = get_purification_table(actions)
+
+    if "features" in steps:
+        if not "fixed" in sections:
+            print ("[..ERROR..] Parsed alignment (.fixed) is missing from the project '%s'!" % project_name)
+            return False
+        print ("    Obtaining features...")
+        (features_text, domain_dict) = AlnEngine.obtain_features(sections["fixed"], sections.get("%s_table" % myargs.feature_mode, ""),
+                                                                 sections.get("TMHMM", ""), myargs.domain_evalue, myargs.overlap, myargs.max_dist, myargs.max_hmm_overlap,
+                                                                 myargs.unite, myargs.verbose)
+        results["features"] = features_text
+        if domain_dict != None:
+            strings = list()
+            for domain_id in sorted(domain_dict.keys()):
+                strings.append("%s\t%s\t%s" % (domain_id, domain_dict[domain_id][0], domain_dict[domain_id][1]))
+            results["domain_info"] = "\n".join(strings)
+
+    written = AlnProject.write_project(project_dir, project_name, results, myargs.single_file)
+    print ("    [..DONE..] Sections saved: %s" % ", ".join(written))
+    empty = [section for section in sorted(results.keys()) if not section in written]
+    if len(empty) != 0:
+        print ("    [..WARNING..] Empty sections were not saved (old copies removed): %s" % ", ".join(empty))
+    return True
+
+def clear_temp_files(work_dir, temp_name):
+    for curr_file in os.listdir(work_dir):
+        if curr_file.split(".")[0] == temp_name:
+            os.remove(os.path.join(work_dir, curr_file))
+
+steps = myargs.steps.split(",")
+for step in steps:
+    if not step in STEPS:
+        print ("[FATAL ERROR] Unknown step '%s'; known steps are: %s" % (step, ", ".join(STEPS)))
+        sys.exit(1)
+settings = Settings.read_settings_file(myargs.settings, ["script_dir", "hmmer_dir", "work_dir"])
+sys.path.append(settings.script_dir)
+temp_name = "udav_temp_run_%i" % os.getpid()
+failed = list()
+for project_name in myargs.projects:
+    try:
+        if not run_project(project_name, settings, steps, os.path.join(settings.work_dir, temp_name)):
+            failed.append(project_name)
+    except Exception as error: # One broken project should not stop the whole batch
+        print ("[..ERROR..] Project '%s' failed: %s" % (project_name, error))
+        failed.append(project_name)
+    finally:
+        clear_temp_files(settings.work_dir, temp_name)
+if len(failed) != 0:
+    print ("[..WARNING..] %i project(s) failed: %s" % (len(failed), ", ".join(failed)))
+    sys.exit(1) # Failure should be seen by the calling scripts
@@ -3,13 +3,13 @@
 This is a main script of the <Alnalyser> program
 @ Daria Dibrova aka udavdasha
 """
-curr_version = "1.1.1"
+curr_version = "1.2.0"
 import tkinter
 import tkinter.messagebox as tkMessageBox
 import tkinter.filedialog as tkFileDialog
 import tkinter.ttk as ttk
-import sys, os, platform, re, random
-import Settings, ColorFrame, Aln_basic, AlnInput, AlnParse, AlnPurify, AlnFeatures, AlnLog, AlnConverter
+import sys, os, platform, random
+import Settings, ColorFrame, Aln_basic, AlnInput, AlnParse, AlnPurify, AlnFeatures, AlnLog, AlnConverter, AlnProject, AlnEngine, AlnJobs
 
 LOGO_FILENAME = "alnalyser.gif"
 ICON_FILENAME = "alnalyser.ico"
@@ -47,6 +47,8 @@ class Alnalyser(tkinter.Frame):
         self.parse_button = None         # Button for the parsing
         self.diagnostics_button = None   # Button for self-diagnostics
         self.status_label = None         # Label to show current program status
+        self.cancel_button = None        # Button to cancel running jobs
+        self.load_button = None          # Button for the project loading
         self.project_title_widget = None # Entry for the project title (will be fixed upon input check)  
         self.project_title = None        # Project title
         self.verbose = None              # If information from the scripts which are running should be printed (1 or 0)
@@ -56,7 +58,6 @@ class Alnalyser(tkinter.Frame):
         self.purify_tab = None           # Purification pab
         self.features_tab = None         # Features pab
         self.log_tab = None              # Tab for the project log (both auto- and user-generated)
-        self.pending_filenames = list()  # List of names of files which should be created by other programs
         self.domain_colors = list()      # List of tuples (domain_name, color) used in the program
         self.domain_to_color = dict()    # Dictionary for the <self.domain_colors>
         self.domain_colors.append(("Enter domain/COG ID", "#FFFFFF"))
@@ -65,8 +66,20 @@ class Alnalyser(tkinter.Frame):
         self.domain_info = None          # Treeview with the information about domains currently loaded into the feature tab
         self.gi_to_tax = None            # Dictionary of GIs to taxon
         self.tax_to_color = None         # Dictionary of taxa to colors       
+        self.single_file_project = None  # If project should be saved into a single container file (1 or 0)
+        self.project_container = None    # <AlnProject.ProjectContainer> of the currently loaded project, if any
+        self.pending_sections = dict()   # Sections of the <self.project_container> not yet loaded: extension -> text widget
+        self.saved_hashes = dict()       # Text widget path -> (filename, hash, addition) of the text last saved into (or loaded from) the file
+        self.artifacts = AlnEngine.Artifact_store(self.get_temp_prefix()) # Objects built from the sections and shared between tabs
+        self.jobs = AlnJobs.Job_manager(self, self.show_job_progress) # Long stages run outside of the main loop
+        #FIX: version 1.2.0 (external programs are run by a scheduler instead of the list of pending filenames)
+        self.external_jobs = AlnJobs.External_scheduler(self, self.external_job_finished, os.path.join(self.settings.work_dir, "alnalyser_external_jobs.txt"),
+                                                        int(getattr(self.settings, "max_external_jobs", "2")), int(getattr(self.settings, "external_cpus", "0")) or None)
           
         self.create_UI(logo_filename)
+        self.external_jobs.restore()
+        if self.external_jobs.get_pending_number() != 0:
+            self.enable_check_button()
 
     def create_UI(self, logo_filename):
         self.grid_columnconfigure(1, weight = 1)
@@ -84,7 +97,8 @@ class Alnalyser(tkinter.Frame):
         #self.project_title_widget.insert(tkinter.END, "EnterProjectName")
         self.project_title_widget.grid(row = 0, column = 0, sticky = "NSEW", padx = self.p, pady = self.p)
         tkinter.Button(top_panel, text = "Save project", command = self.save_project).grid(row = 0, column = 1, sticky = "NSEW", padx = self.p, pady = self.p)
-        tkinter.Button(top_panel, text = "Load project", command = self.load_project).grid(row = 0, column = 2, sticky = "NSEW", padx = self.p, pady = self.p)
+        self.load_button = tkinter.Button(top_panel, text = "Load project", command = self.load_project)
+        self.load_button.grid(row = 0, column = 2, sticky = "NSEW", padx = self.p, pady = self.p)
         tkinter.Button(top_panel, text = "Clear all", command = self.clear_all).grid(row = 0, column = 3, sticky = "NSEW", padx = self.p, pady = self.p)
         self.check_button = tkinter.Button(top_panel, text = "Check\npending\nresults", background = self.header, foreground = "#FFFFFF", font = "Arial 12 bold", command = self.check_pending)
         self.disable_check_button()
@@ -120,16 +134,24 @@ class Alnalyser(tkinter.Frame):
         set_colors = tkinter.Button(top_panel, text = "Open\ndomain colors\npanel", command = self.open_color_frame)
         set_colors.grid(row = 1, column = 6, sticky ="NSE", padx = self.p, pady = self.p)
 
+        check_frame = tkinter.Frame(top_panel)
         self.verbose = tkinter.IntVar()
         self.verbose.set(1)
-        c = tkinter.Checkbutton(top_panel, text = "Print external logs", variable = self.verbose)
-        c.grid(row = 0, column = 5, sticky ="NSE", columnspan = 2, padx = self.p, pady = self.p)
+        c = tkinter.Checkbutton(check_frame, text = "Print external logs", variable = self.verbose)
+        c.grid(row = 0, column = 0, sticky ="NSW")
+        self.single_file_project = tkinter.IntVar()
+        self.single_file_project.set(int(getattr(self.settings, "single_file_project", "0") == "1"))
+        c = tkinter.Checkbutton(check_frame, text = "Single-file project", variable = self.single_file_project)
+        c.grid(row = 1, column = 0, sticky ="NSW")
+        check_frame.grid(row = 0, column = 5, sticky ="NSE", columnspan = 2, padx = self.p, pady = self.p)
 
         top_panel.grid(row = 0, column = 1, sticky = "NSEW")
 
         self.status_label = tkinter.Label(self, text = "", foreground = self.header, font = ("Courier New", 14, "bold"))
         self.set_status("Ready")
         self.status_label.grid(row = 1, column = 0, columnspan = 2, sticky = "NW", padx = self.p, pady = self.p)
+        self.cancel_button = tkinter.Button(self, text = "Cancel", state = tkinter.DISABLED, command = self.jobs.cancel)
+        self.cancel_button.grid(row = 1, column = 1, sticky = "NE", padx = self.p, pady = self.p)
 
         self.tabs = ttk.Notebook(self)
         self.tabs.grid(row = 2, column = 0, columnspan = 2, sticky = "NSEW", padx = self.p, pady = self.p)
@@ -151,6 +173,7 @@ class Alnalyser(tkinter.Frame):
 
         self.converter_tab = AlnConverter.AlnConverter(self.tabs, self)
         self.tabs.add(self.converter_tab, text = "Format converter")
+        self.tabs.bind("<<NotebookTabChanged>>", self.tab_changed)
 
     def load_domain_info(self, domain_dict):
         for value in self.domain_info.get_children(""):
@@ -211,111 +234,74 @@ class Alnalyser(tkinter.Frame):
             print ("Please double-click with RMB at the row, not heading, to get domain ID copied into the clipboard!")
        
     def parse(self):      
-        aligned_filename = os.path.join(self.settings.work_dir, "%s.aln" % self.temp_name)
-        Aln_basic.write_widget_into_file(self.input_tab.aln_input_frame.text_widget, aligned_filename)
-        remove_seq_limits_path = os.path.join(self.settings.script_dir, "remove_seq_limits.py")
-
-        self.set_status("Working")
-        if self.verbose.get():
-            os.system("%s -i %s -o %s -d -x" % (remove_seq_limits_path, aligned_filename, os.path.join(self.settings.work_dir, self.temp_name)))
-        else:
-            os.system("%s -i %s -o %s -d -x 1> nul 2> nul" % (remove_seq_limits_path, aligned_filename, os.path.join(self.settings.work_dir, self.temp_name)))
-        self.set_status("Ready")
-
-        try:
-            os.remove(os.path.join(self.settings.work_dir, "%s.aln" % self.temp_name))
-            os.remove(os.path.join(self.settings.work_dir, "%s.blocks" % self.temp_name))
-            os.remove(os.path.join(self.settings.work_dir, "%s.motif" % self.temp_name))
-            os.remove(os.path.join(self.settings.work_dir, "%s.motif_var" % self.temp_name))
-            os.remove(os.path.join(self.settings.work_dir, "%s.orgs" % self.temp_name))
-            os.remove(os.path.join(self.settings.work_dir, "%s.pure.correspond" % self.temp_name))
-        except OSError:
-            pass
-
-        fixed_filename = os.path.join(self.settings.work_dir, "%s.fixed" % self.temp_name)
-        Aln_basic.read_widget_from_file(self.parse_tab.fixed.text_widget, fixed_filename)
-        os.remove(fixed_filename)
-
-        pure_filename = os.path.join(self.settings.work_dir, "%s.pure" % self.temp_name)
-        Aln_basic.read_widget_from_file(self.parse_tab.pure.text_widget, pure_filename)
-        self.parse_tab.enable_pure_analysis()
-        os.remove(pure_filename)
-
-        ngphylogeny_filename = os.path.join(self.settings.work_dir, "%s.ngphylogeny" % self.temp_name)
-        Aln_basic.read_widget_from_file(self.parse_tab.ngphylogeny.text_widget, ngphylogeny_filename)
-        os.remove(ngphylogeny_filename)
-
-        blocks_filename = os.path.join(self.settings.work_dir, "%s.blocks_regions" % self.temp_name)
-        if os.path.isfile(blocks_filename):
-            Aln_basic.read_widget_from_file(self.parse_tab.blocks.text_widget, blocks_filename)
-            os.remove(blocks_filename)
-
-        ids_filename = os.path.join(self.settings.work_dir, "%s.ids" % self.temp_name)
-        Aln_basic.read_widget_from_file(self.parse_tab.IDs.text_widget, ids_filename)
-        os.remove(ids_filename)
+        self.load_pending_sections(self.input_tab)
+        self.load_pending_sections(self.parse_tab)
+        #FIX: version 1.2.0 (parsing is done by the <AlnEngine> in a separate process, widgets only show its results)
+        self.jobs.submit("Parsing", AlnEngine.parse_alignment, (self.input_tab.aln_input_frame.text_widget.get(1.0, tkinter.END), self.verbose.get()),
+                         self.show_parse_results, [self.parse_button], in_process = True)
+
+    def show_parse_results(self, results):
+        extension_to_widget = {"fixed"          : self.parse_tab.fixed.text_widget,
+                               "pure"           : self.parse_tab.pure.text_widget,
+                               "ngphylogeny"    : self.parse_tab.ngphylogeny.text_widget,
+                               "blocks_regions" : self.parse_tab.blocks.text_widget,
+                               "ids"            : self.parse_tab.IDs.text_widget}
+        for extension in AlnEngine.PARSE_SECTIONS:
+            if extension in results:
+                Aln_basic.read_widget_from_string(extension_to_widget[extension], results[extension])
+        if "pure" in results:
+            self.parse_tab.enable_pure_analysis()
 
         self.parse_tab.check_numbers()
 
     def purify(self):
         #seqs = Aln_basic.read_fasta_from_strings(self.input_tab.aln_input_frame.get_strings())
-        seqs = Aln_basic.read_fasta_from_strings(self.parse_tab.fixed.get_strings()) 
+        self.load_pending_sections(self.parse_tab)
+        try: #FIX: version 1.2.0 (alignment is kept as a single matrix shared via <self.artifacts>, so the same alignment is not parsed twice)
+            seqs = self.artifacts.get("fixed_matrix", [self.parse_tab.fixed.text_widget.get(1.0, tkinter.END)], AlnEngine.read_alignment_matrix)
+        except ValueError as error:
+            print ("    [..WARNING..] %s" % error)
+            self.set_status("Alignment in the 'Fixed' tab is corrupted!")
+            return
         if len(seqs) == 0:
             self.set_status("No alignment to purify!")
             return
 
-        for value in self.purify_tab.actions.get_children(""):
-            self.purify_tab.actions.delete(value)
+        self.purify_tab.remove_actions()
 
-        import udav_base
         self.set_status("Working")
         # --------------------------------------- 1) Calculating cut for mainly gappy parts of alignment
-        max_name_length = 50
-        separator = "  :  "
         presence_threshold = 50
         try:
             presence_threshold = int(self.purify_tab.presence_entry.get())
         except:
             print ("Using default presence threshold value = 50!")
             
-        (valid_start, valid_end) = Aln_basic.get_valid_alignment_range(seqs, presence_threshold)
-        self.purify_tab.alignment.add_label_data("showing a region [%i; %i]" % (valid_start + 1, valid_end))
-        self.purify_tab.alignment.text_widget.delete(1.0, tkinter.END)
- 
-        # --------------------------------------- 2) Printing alignment into the text widget tab
+        self.purify_tab.alignment_matrix = seqs
+        data = AlnEngine.Purification_data(seqs, presence_threshold) #FIX: version 1.2.0 (purification data is prepared by the <AlnEngine>)
+        self.purify_tab.alignment.add_label_data("showing a region [%i; %i]" % (data.valid_start + 1, data.valid_end))
+
+        # --------------------------------------- 2) Showing alignment in the windowed view
         self.set_status("Printing alignment", "#FF0000")
-        seqs_cut = list() # List of sequences with the mainly gappy parts of alignment cut
-        id_to_org_and_seq = dict() # Hash of protein ids to a tuple of (0) their organism name and (1) cut sequences
-        id_list = list() # List of protein ids in order of their occurence      
-        for i in range(len(seqs)):            
-            # Printing to the widget
-            fit_name = seqs[i].name[0:max_name_length]
-            if len(fit_name) < max_name_length:
-                fit_name += (max_name_length - len(fit_name)) * " "         
-            seq_part = seqs[i].sequence[valid_start:valid_end]
-            seqs_cut.append(udav_base.Sequence(seqs[i].name, seq_part))
-            string = fit_name + ("%s%s" % (separator, seq_part))
-            self.purify_tab.alignment.text_widget.insert(tkinter.END, "%s\n" % string)            
-            # Saving data
-            if seqs[i].ID in id_to_org_and_seq:
-                print ("    [..WARNING..] Non-unique ID '%s' detected; purification may work unproperly!" % seqs[i].ID)
-
-            curr_org_name = seqs[i].name.replace(seqs[i].ID, "")
-            if re.match("^[^\|]+\|[^\|]+\|[^\|]+$", seqs[i].name):
-                curr_org_name = seqs[i].name.split("|")[2]
-            elif re.match("^[^\|]+\|[^\|]+$", seqs[i].name):
-                curr_org_name = seqs[i].name.split("|")[1]
-                
-            id_to_org_and_seq[seqs[i].ID] = (curr_org_name, seqs[i].sequence)
-            id_list.append(seqs[i].ID)
-
-        self.purify_tab.id_to_org_and_seq = id_to_org_and_seq
-        self.purify_tab.id_list = id_list
-        self.purify_tab.seqs_cut = seqs_cut
+        self.purify_tab.alignment.set_rows(data.strings) #FIX: version 1.2.0 (only visible rows are inserted into the widget)
+
+        self.purify_tab.id_to_org_and_seq = data.id_to_org_and_seq
+        self.purify_tab.id_list = data.id_list
+        self.purify_tab.org_to_remaining = AlnEngine.get_organism_counts(data.id_to_org_and_seq) #FIX: version 1.2.0 (organisms are counted once)
+        self.purify_tab.lost_orgs = set()
+        self.purify_tab.show_organism_report()
+        #FIX: version 1.2.0 (rows of each protein ID are known and not searched in the text)
+        self.purify_tab.id_to_rows = dict()
+        for i in range(len(data.id_list)):
+            id_end = min(len(data.id_list[i]), data.max_name_length) # Protein ID is a start of the name shown
+            self.purify_tab.id_to_rows.setdefault(data.id_list[i], list()).append((i, id_end))
+        self.purify_tab.seqs_cut = data.seqs_cut
         self.purify_tab.id_to_features = None
         self.purify_tab.featured_sequences = None
-        self.purify_tab.valid_start = valid_start
-        self.purify_tab.valid_end = valid_end
-        self.purify_tab.name_length = max_name_length + len(separator)
+        self.purify_tab.valid_start = data.valid_start
+        self.purify_tab.valid_end = data.valid_end
+        self.purify_tab.name_length = data.name_length
+        self.purify_tab.draw_occupancy()
         self.purify_tab.activate_buttons()
         #FIX: version 0.2.8 (self-hits data is set to default)
         self.purify_tab.evalue_threshold.delete(0, tkinter.END)
@@ -323,7 +309,6 @@ class Alnalyser(tkinter.Frame):
         self.purify_tab.sigma_num_self.delete(0, tkinter.END)
         self.purify_tab.sigma_num_self.configure(state = tkinter.DISABLED)
 
-        del udav_base
         self.set_status("Ready")
 
     def check_settings(self):
@@ -360,7 +345,18 @@ class Alnalyser(tkinter.Frame):
             curr_color = self.known_status[curr_status][1]
             curr_status = self.known_status[curr_status][0]
         self.status_label.configure(text = "[..%s..]" % curr_status, foreground = curr_color)
-        self.update()
+        self.update_idletasks() #FIX: version 1.2.0 (only the label is redrawn; events are handled by the main loop while the jobs are running)
+
+    def show_job_progress(self, job, stage):
+        """
+        Method shows <stage> of the running <job> in the status label (called by the <self.jobs>)
+        """
+        if job == None: # No jobs are running
+            self.cancel_button.configure(state = tkinter.DISABLED)
+            self.set_status("Ready")
+            return
+        self.cancel_button.configure(state = tkinter.NORMAL)
+        self.set_status("%s: %s, PLEASE WAIT" % (job.name, stage), "#FF0000")
 
     def enable_check_button(self):
         self.check_button.configure(state = tkinter.NORMAL, background = self.header)
@@ -369,27 +365,34 @@ class Alnalyser(tkinter.Frame):
         self.check_button.configure(state = tkinter.DISABLED, background = "light grey")
 
     def check_pending(self):                 
-        files_ready = list()
-        i = 0
-        while i < len(self.pending_filenames):
-            filename = self.pending_filenames[i]
-            if os.path.isfile(filename):
-                file_to_check = open(filename)
-                strings = file_to_check.readlines()
-                file_to_check.close()
-                try:
-                    if strings[-1].strip() == "# [ok]":
-                        files_ready.append(filename)
-                        self.pending_filenames.pop(i)
-                        i -= 1
-                except IndexError:
-                    print ("File '%s' is not yet ready..." % filename) 
-            i += 1
-        if len(self.pending_filenames) == 0:
-            self.disable_check_button()
+        #FIX: version 1.2.0 (jobs are checked by the <self.external_jobs> by their exit codes or output tails)
+        ready_and_required = self.load_external_results(self.external_jobs.check())
+        if len(ready_and_required) == 0: # No files are ready
+            self.set_status("Sorry, no file delivered!")
+            pending_number = self.external_jobs.get_pending_number()
+            if pending_number != 0 and tkMessageBox.askyesno("Cancel external jobs?", "%i external job(s) are still pending. Do you want to cancel them?" % pending_number):
+                self.external_jobs.cancel()
+                self.disable_check_button()
 
+    def external_job_finished(self, job, succeeded):
+        """
+        Method is called by the <self.external_jobs> when the <job> is finished
+        """
+        self.load_external_results([(job, succeeded)])
+
+    def load_external_results(self, finished):
+        """
+        Method loads outputs of the <finished> external jobs (list of tuples (job, succeeded))
+        if they belong to the current project; returns list of loaded extensions
+        """
+        if self.external_jobs.get_pending_number() == 0:
+            self.disable_check_button()
         ready_and_required = list()
-        for curr_file in files_ready:
+        for (job, succeeded) in finished:
+            if not succeeded:
+                print ("    [..ERROR..] External job '%s' failed, file '%s' was not delivered!" % (job.name, job.output_filename))
+                continue
+            curr_file = job.output_filename
             base_name = os.path.basename(curr_file)
             name_parts = base_name.split(".")
             if len(name_parts) != 2: # Files without extension or with multiple dots are not considered
@@ -397,17 +400,20 @@ class Alnalyser(tkinter.Frame):
             project_name = name_parts[0]
             extension = name_parts[1]
             if project_name == self.get_project_name():
+                if extension in ("Pfam_table", "COG_table"): # New results should not be overwritten by the saved ones
+                    self.pending_sections.pop(extension, None)
                 if extension == "Pfam_table":
-                    Aln_basic.read_widget_from_file(self.features_tab.hmmresults_Pfam.text_widget, curr_file)
+                    self.load_section_from_file(self.features_tab.hmmresults_Pfam.text_widget, curr_file, extension)
                     ready_and_required.append(extension)
                 if extension == "COG_table":
-                    Aln_basic.read_widget_from_file(self.features_tab.hmmresults_COG.text_widget, curr_file)
+                    self.load_section_from_file(self.features_tab.hmmresults_COG.text_widget, curr_file, extension)
                     ready_and_required.append(extension)
+            else:
+                print ("    File '%s' of the project '%s' is ready" % (curr_file, project_name))
           
-        if len(ready_and_required) == 0: # No files are ready
-            self.set_status("Sorry, no file delivered!")
-        else:
+        if len(ready_and_required) != 0:
             self.set_status("These files were ready and loaded: %s" % ",".join(ready_and_required))
+        return ready_and_required
         
     def save_project(self):
         #answer = tkMessageBox.askyesno("Please confirm saving", "Are you sure you want to save %s project? Existing files, if any, will be re-writed!" % self.get_project_name())
@@ -423,7 +429,11 @@ class Alnalyser(tkinter.Frame):
         if not os.path.isdir(curr_project_dir): # Directory for the project was not yet created
             print ("    Creating project directory de novo: '%s'" % curr_project_dir)
             os.mkdir(curr_project_dir)
+        if self.single_file_project.get(): #FIX: version 1.2.0 (project could be saved into a single container file)
+            self.save_project_container(curr_project_dir)
+            return
 
+        self.load_pending_sections()
         self.save_colors()
         self.input_tab.save_alignment()
         self.input_tab.save_sequence_sample()
@@ -437,8 +447,216 @@ class Alnalyser(tkinter.Frame):
         #self.features_tab.save_features(False) #FIX: version 0.2.8 (features should not be saved)
         self.log_tab.save_logs(False)
 
+    def save_project_container(self, project_dir):
+        """
+        Method saves all sections of the project into a single <AlnProject.ProjectContainer> file.
+        Sections which were loaded from the previous container but never shown are copied from it
+        without decoding
+        """
+        self.set_status("Working")
+        Aln_basic.finish_chunked_loading() # Half-loaded sections should not be saved
+        project_name = self.get_project_name()
+        container = AlnProject.ProjectContainer(AlnProject.get_container_filename(project_dir, project_name))
+        old_container = None # Previous version of the same file, unchanged sections are copied from it
+        if self.project_container != None and self.project_container.filename == container.filename and container.exists():
+            old_container = self.project_container
+        sections = list()
+        saved = list()
+        colors_text = self.get_colors_text()
+        if len(colors_text) != 0:
+            if old_container != None and "colors" in old_container.manifest and old_container.get_hash("colors") == AlnProject.get_hash(colors_text.encode("utf_8")):
+                sections.append(("colors", old_container))
+            else:
+                sections.append(("colors", colors_text))
+        for (extension, text_widget) in self.get_section_widgets():
+            if extension in self.pending_sections:
+                sections.append((extension, self.project_container))
+                continue
+            addition = self.get_section_addition(extension)
+            if old_container != None and extension in old_container.manifest:
+                if self.is_saved(text_widget, container.filename, addition):
+                    sections.append((extension, old_container))
+                    continue
+            curr_text = text_widget.get(1.0, tkinter.END).strip()
+            if len(curr_text) == 0:
+                continue
+            text_hash = self.get_text_hash(curr_text, addition)
+            if old_container != None and extension in old_container.manifest:
+                if self.saved_hashes.get(str(text_widget)) == (container.filename, text_hash, addition):
+                    text_widget.edit_modified(False)
+                    sections.append((extension, old_container))
+                    continue
+            if extension == "ids":
+                curr_text = self.parse_tab.get_converted_IDs()
+            sections.append((extension, curr_text))
+            saved.append((text_widget, text_hash, addition))
+
+        changed = [section for (section, data) in sections if data is not old_container]
+        if old_container != None and len(changed) == 0 and len(sections) == len(old_container.sections):
+            print ("    Project file '%s' is up to date, nothing to save" % container.filename)
+            self.set_status("Ready")
+            return
+        print ("    Saving project into a single file '%s' (changed sections: %s)..." % (container.filename, ", ".join(changed)))
+        container.write(project_name, sections)
+        self.project_container = container
+        for (text_widget, text_hash, addition) in saved:
+            self.mark_saved(text_widget, container.filename, addition, text_hash)
+        print ("    [..DONE..]")
+        self.set_status("Ready")
+
+    def get_section_addition(self, extension):
+        """
+        Method returns a string describing how the section text is converted before saving
+        (only IDs are converted); it is hashed together with the text
+        """
+        if extension == "ids" and self.parse_tab.ID_save_mode.get() != "No change":
+            return self.parse_tab.ID_save_mode.get()
+        return ""
+
+    def get_text_hash(self, text, addition = ""):
+        return AlnProject.get_hash((text.strip() + addition).encode("utf_8"))
+
+    def is_saved(self, text_widget, filename, addition = ""):
+        """
+        Method returns True if <text_widget> was not modified since it was last saved into
+        (or loaded from) the <filename>. Only the modified flag of the widget is checked,
+        so the text itself is not read
+        """
+        record = self.saved_hashes.get(str(text_widget))
+        if record == None or record[0] != filename or record[2] != addition:
+            return False
+        if not os.path.isfile(filename):
+            return False
+        return not text_widget.edit_modified()
+
+    def mark_saved(self, text_widget, filename, addition = "", text_hash = None):
+        """
+        Method remembers that text of the <text_widget> is now the same as in the <filename>
+        and resets the modified flag of the widget
+        """
+        if text_hash == None:
+            text_hash = self.get_text_hash(text_widget.get(1.0, tkinter.END), addition)
+        self.saved_hashes[str(text_widget)] = (filename, text_hash, addition)
+        text_widget.edit_modified(False)
+
+    def get_chunked_mode(self, extension):
+        """
+        Method returns <chunked> argument for the <Aln_basic.read_widget_from_string()>: only
+        HMMer tables (which could be really large and are not used right after loading) are
+        loaded by chunks when they are large enough
+        """
+        if extension in ("COG_table", "Pfam_table"):
+            return None
+        return False
+
+    def load_section_from_file(self, text_widget, filename, extension):
+        """
+        Method loads the <filename> into the <text_widget> (at once or by chunks, see <self.get_chunked_mode()>)
+        and remembers it as saved; text hash is calculated from the loaded text, not read from the widget
+        """
+        text = AlnEngine.read_text_file(filename, AlnProject.is_log_section(extension)) # Logs are saved in utf-8
+        self.show_section_text(text_widget, filename, extension, text)
+
+    def show_section_text(self, text_widget, filename, extension, text):
+        """
+        Method shows <text> read from the <filename> in the <text_widget> (see <self.load_section_from_file()>)
+        """
+        addition = self.get_section_addition(extension)
+        text_hash = self.get_text_hash(text, addition)
+        on_done = lambda: self.mark_saved(text_widget, filename, addition, text_hash)
+        Aln_basic.read_widget_from_string(text_widget, text, self.get_chunked_mode(extension), on_done)
+
+    def save_section(self, text_widget, filename, use_codecs = False, get_text = None, addition = ""):
+        """
+        Method writes text of the <text_widget> into the <filename> only if it was changed
+        since the last save and returns True if the file was written. If the widget was modified,
+        its text hash is compared with the saved one, so edits which restored the text are not saved either.
+        <get_text> (if given) returns the text to be written instead of the widget content;
+        <addition> should then describe this conversion
+        """
+        Aln_basic.finish_chunked_loading(text_widget) # Half-loaded text should not be written over the full file
+        if self.is_saved(text_widget, filename, addition):
+            return False
+        curr_text = text_widget.get(1.0, tkinter.END)
+        text_hash = self.get_text_hash(curr_text, addition)
+        if self.saved_hashes.get(str(text_widget)) == (filename, text_hash, addition) and os.path.isfile(filename):
+            text_widget.edit_modified(False)
+            return False
+        if get_text != None:
+            curr_text = get_text()
+        written = Aln_basic.write_text_into_file(curr_text, filename, False, use_codecs)
+        if written:
+            print ("    File '%s' was saved" % filename)
+            self.mark_saved(text_widget, filename, addition, text_hash)
+        return written
+
+    def get_section_widgets(self):
+        """
+        Method returns list of tuples (extension, text widget) for all sections of the project
+        """
+        return [("aln"            , self.input_tab.aln_input_frame.text_widget),
+                ("sample"         , self.input_tab.seq_input_frame.text_widget),
+                ("tax"            , self.input_tab.tax_input_frame.text_widget),
+                ("fixed"          , self.parse_tab.fixed.text_widget),
+                ("pure"           , self.parse_tab.pure.text_widget),
+                ("ngphylogeny"    , self.parse_tab.ngphylogeny.text_widget),
+                ("blocks_regions" , self.parse_tab.blocks.text_widget),
+                ("ids"            , self.parse_tab.IDs.text_widget),
+                ("COG_table"      , self.features_tab.hmmresults_COG.text_widget),
+                ("Pfam_table"     , self.features_tab.hmmresults_Pfam.text_widget),
+                ("TMHMM"          , self.features_tab.TMHMM_results.text_widget),
+               #("features"       , self.features_tab.features.text_widget), #FIX: version 0.2.8 (features should not be loaded)
+                ("auto_log"       , self.log_tab.auto_log.text_widget),
+                ("rem_log"        , self.log_tab.remove_log.text_widget),
+                ("man_log"        , self.log_tab.manual_log.text_widget)]
+
+    def load_pending_sections(self, tab = None):
+        """
+        Method loads sections of the <self.project_container> which were not yet shown.
+        If <tab> (widget or its path name) is given, only sections shown in this tab are loaded
+        """
+        if len(self.pending_sections) == 0:
+            return
+        loaded = list()
+        for extension in list(self.pending_sections.keys()):
+            text_widget = self.pending_sections[extension]
+            if tab != None and not str(text_widget).startswith(str(tab) + "."):
+                continue
+            if len(loaded) == 0:
+                self.set_status("Working")
+            print ("    Loading '%s' section from the project file..." % extension)
+            addition = self.get_section_addition(extension)
+            text_hash = None
+            if addition == "": # Hash from the manifest is the same as the hash of the widget text
+                text_hash = self.project_container.get_hash(extension)
+            on_done = lambda curr_widget = text_widget, curr_addition = addition, curr_hash = text_hash: self.mark_saved(curr_widget,
+                                                                          self.project_container.filename, curr_addition, curr_hash)
+            Aln_basic.read_widget_from_string(text_widget, self.project_container.read_section(extension), self.get_chunked_mode(extension), on_done)
+            del self.pending_sections[extension]
+            loaded.append(str(text_widget))
+        if len(loaded) == 0:
+            return
+        for path in loaded:
+            if path.startswith(str(self.parse_tab) + "."):
+                self.parse_tab.check_numbers()
+                break
+        for path in loaded:
+            if path.startswith(str(self.log_tab) + "."):
+                self.log_tab.color_important()
+                break
+        self.set_status("Ready")
+
+    def tab_changed(self, event):
+        self.load_pending_sections(self.tabs.select())
+
     def clear_all(self):
         print ("------------- Erasing all data -------------")   
+        self.project_container = None
+        self.pending_sections = dict()
+        self.saved_hashes = dict()
+        self.artifacts.discard()
+        self.jobs.cancel()
+        Aln_basic.cancel_chunked_loading()
         self.input_tab.clear()
         self.parse_tab.clear()
         self.purify_tab.clear()
@@ -476,26 +694,31 @@ class Alnalyser(tkinter.Frame):
         self.clear_all()
         self.project_title_widget.insert(tkinter.END, os.path.basename(project_dir))
  
-        self.set_status("Working")
         print ("-------- Project %s is now loading! --------" % self.get_project_name())
 
         project_files = os.listdir(project_dir)
-        extension_to_widget = {"aln"            : self.input_tab.aln_input_frame.text_widget,
-                               "sample"         : self.input_tab.seq_input_frame.text_widget,
-                               "tax"            : self.input_tab.tax_input_frame.text_widget,
-                               "fixed"          : self.parse_tab.fixed.text_widget,
-                               "pure"           : self.parse_tab.pure.text_widget,
-                               "ngphylogeny"    : self.parse_tab.ngphylogeny.text_widget,
-                               "blocks_regions" : self.parse_tab.blocks.text_widget,
-                               "ids"            : self.parse_tab.IDs.text_widget,
-                               "COG_table"      : self.features_tab.hmmresults_COG.text_widget,
-                               "Pfam_table"     : self.features_tab.hmmresults_Pfam.text_widget,
-                               "TMHMM"          : self.features_tab.TMHMM_results.text_widget,
-                              #"features"       : self.features_tab.features.text_widget, #FIX: version 0.2.8 (features should not be loaded)
-                               "auto_log"       : self.log_tab.auto_log.text_widget,
-                               "rem_log"       : self.log_tab.remove_log.text_widget,
-                               "man_log"        : self.log_tab.manual_log.text_widget}
+        extension_to_widget = dict(self.get_section_widgets())
+
+        #FIX: version 1.2.0 (sections of the single-file project are loaded only when their tab is shown)
+        container = AlnProject.ProjectContainer(AlnProject.get_container_filename(project_dir, self.get_project_name()))
+        container_sections = list()
+        if container.exists():
+            container_mtime = os.path.getmtime(container.filename)
+            for section in container.read_manifest():
+                section_filename = os.path.join(project_dir, "%s.%s" % (self.get_project_name(), section))
+                if os.path.isfile(section_filename) and os.path.getmtime(section_filename) > container_mtime:
+                    continue # Separate file was saved after the container
+                container_sections.append(section)
+            self.project_container = container
+            for section in container_sections:
+                if section in extension_to_widget:
+                    self.pending_sections[section] = extension_to_widget[section]
+                if section == "pure":
+                    self.parse_tab.enable_pure_analysis()
+                if section == "colors":
+                    self.load_colors_from_strings(container.read_section(section).split("\n"))
 
+        section_files = list()
         for curr_file in project_files:
             name_parts = curr_file.split(".")
             if len(name_parts) != 2: # Files without extension or with multiple dots are not considered
@@ -504,8 +727,10 @@ class Alnalyser(tkinter.Frame):
             extension = name_parts[1]
             full_filename = os.path.join(project_dir, curr_file)
             if project_name == self.get_project_name():
-                if extension in extension_to_widget:                    
-                    Aln_basic.read_widget_from_file(extension_to_widget[extension], full_filename)
+                if extension in container_sections:
+                    continue
+                if extension in extension_to_widget: #FIX: version 1.2.0 (files are read by a job, see <self.read_section_files()>)
+                    section_files.append((extension, full_filename))
                 if extension == "pure":
                     self.parse_tab.enable_pure_analysis()
                 #if extension == "actions":
@@ -513,16 +738,41 @@ class Alnalyser(tkinter.Frame):
                 if extension == "colors":
                     self.load_colors_from_file(full_filename)
 
+        self.jobs.submit("Loading project", self.read_section_files, (section_files, ), self.show_loaded_sections, [self.load_button])
+
+    def read_section_files(self, job, section_files):
+        """
+        Method is run by the <self.jobs>: it reads files from the list of (extension, filename) tuples
+        and returns list of (extension, filename, text); widgets are not touched here
+        """
+        texts = list()
+        for (extension, filename) in section_files:
+            job.check_cancelled()
+            job.report("reading '%s'" % os.path.basename(filename))
+            texts.append((extension, filename, AlnEngine.read_text_file(filename, AlnProject.is_log_section(extension)))) # Logs are saved in utf-8
+        return texts
+
+    def show_loaded_sections(self, texts):
+        extension_to_widget = dict(self.get_section_widgets())
+        for (extension, filename, text) in texts:
+            self.show_section_text(extension_to_widget[extension], filename, extension, text)
         self.parse_tab.check_numbers()
         self.log_tab.color_important()
-        self.set_status("Ready")   
+        self.load_pending_sections(self.tabs.select())
 
     def get_project_name(self):
         return self.project_title_widget.get().strip()
 
+    def get_temp_prefix(self):
+        return os.path.join(self.settings.work_dir, self.temp_name)
+
     def load_colors_from_file(self, filename):
         color_file = open(filename)
-        for string in color_file:
+        self.load_colors_from_strings(color_file)
+        color_file.close()
+
+    def load_colors_from_strings(self, strings):
+        for string in strings:
             string = string.strip()
             if len(string) == 0:
                 continue
@@ -531,15 +781,24 @@ class Alnalyser(tkinter.Frame):
                 if not fields[1] in self.domain_to_color:                   
                     self.domain_colors.append((fields[1], fields[0]))
                     self.domain_to_color[fields[1]] = fields[0]
-        color_file.close()
+
+    def get_colors_text(self):
+        strings = list()
+        for pair in self.domain_colors:
+            if pair[0] != "Enter domain/COG ID":
+                strings.append("%s\t%s\n" % (pair[1], pair[0]))
+        return "".join(strings)
 
     def save_colors(self):
         domain_color_file = os.path.join(self.settings.work_dir, self.get_project_name(), "%s.colors" % self.get_project_name())
+        colors_text = self.get_colors_text()
+        colors_hash = self.get_text_hash(colors_text)
+        if self.saved_hashes.get("colors") == (domain_color_file, colors_hash, "") and os.path.isfile(domain_color_file):
+            return
         color_file = open(domain_color_file, "w")
-        for pair in self.domain_colors:
-            if pair[0] != "Enter domain/COG ID":
-                color_file.write("%s\t%s\n" % (pair[1], pair[0]))
+        color_file.write(colors_text)
         color_file.close()
+        self.saved_hashes["colors"] = (domain_color_file, colors_hash, "")
 
     def palette_is_saved(self, colors, data_type, names):
         """
@@ -600,6 +859,7 @@ class Alnalyser(tkinter.Frame):
                 os.remove(os.path.join(self.settings.work_dir, curr_file))
 
     def on_close(self):
+        self.jobs.shutdown()
         self.clear_temp_files()
         tkinter.Tk.destroy(self.parent)
 
@@ -646,30 +906,31 @@ def set_proper_size (main_window):
     screen_h = main_window.parent.winfo_screenheight()
     main_window.parent.geometry("%dx%d+%d+%d" % (w, screen_h - 100, (screen_w - w)/2, 0))
 
-root = tkinter.Tk()
-root.title("Alnalyser (version %s)" % curr_version)
-root.iconbitmap(ICON_FILENAME)
-
-root.grid_rowconfigure(0, weight = 1)
-root.grid_columnconfigure(0, weight = 1)
-
-main_window = Alnalyser(root, INI_FILENAME, LOGO_FILENAME, ICON_FILENAME)
-main_window.grid(row = 0, column = 0, sticky = "NSEW")
-commands = WindowCommands(main_window)
-root.bind("<Control-ntilde>", commands.rus_copy)
-root.bind("<Control-igrave>", commands.rus_paste)
-root.bind("<Control-division>", commands.rus_cut)
-root.bind("<Control-ocircumflex>", commands.select_all)
-root.bind("<Control-a>", commands.select_all)
-
-actions_menu = AlnPurify.ActionMenu(root, main_window)
-text_menu = AlnPurify.TextMenu(root, main_window)
-def post_menu(event):
-    actions_menu.show_menu(event)
-    text_menu.show_menu(event)
-root.bind("<Button-3>", post_menu) 
-
-set_proper_size(main_window)
-if platform.system() == "Windows":
-    root.wm_state("zoomed")
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__": #FIX: version 1.2.0 (workers of the process pool import this module without starting the GUI)
+    root = tkinter.Tk()
+    root.title("Alnalyser (version %s)" % curr_version)
+    root.iconbitmap(ICON_FILENAME)
+
+    root.grid_rowconfigure(0, weight = 1)
+    root.grid_columnconfigure(0, weight = 1)
+
+    main_window = Alnalyser(root, INI_FILENAME, LOGO_FILENAME, ICON_FILENAME)
+    main_window.grid(row = 0, column = 0, sticky = "NSEW")
+    commands = WindowCommands(main_window)
+    root.bind("<Control-ntilde>", commands.rus_copy)
+    root.bind("<Control-igrave>", commands.rus_paste)
+    root.bind("<Control-division>", commands.rus_cut)
+    root.bind("<Control-ocircumflex>", commands.select_all)
+    root.bind("<Control-a>", commands.select_all)
+
+    actions_menu = AlnPurify.ActionMenu(root, main_window)
+    text_menu = AlnPurify.TextMenu(root, main_window)
+    def post_menu(event):
+        actions_menu.show_menu(event)
+        text_menu.show_menu(event)
+    root.bind("<Button-3>", post_menu) 
+
+    set_proper_size(main_window)
+    if platform.system() == "Windows":
+        root.wm_state("zoomed")
+    root.mainloop()
\ No newline at end of file
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+import sys, os, argparse
+import udav_soft
+
+#========================================================================================
+curr_version = 1.0
+#========================================================================================
+def main():
+    parser = argparse.ArgumentParser(description =
+    "This script will merge HMMer outputs obtained for the parts of the same query file (e.g. by several hmmscan runs) \
+    Current version is %s" % curr_version
+    )
+    parser.add_argument("-t", help = "Name of the merged table (--tblout or --domtblout output)", required = True, dest = "table")
+    parser.add_argument("-o", help = "Name of the merged main output (-o option), if required", required = False, dest = "report")
+    parser.add_argument("--tables", help = "Tables to merge (in order of the query parts)", nargs = "+", required = True, dest = "tables")
+    parser.add_argument("--reports", help = "Main outputs to merge (in order of the query parts)", nargs = "+", required = False, dest = "reports")
+    parser.add_argument("--cleanup", help = "Files to remove after successful merge (e.g. parts of the query and their outputs)", nargs = "+", required = False, default = [], dest = "cleanup")
+    myargs = parser.parse_args()
+
+    for filename in myargs.tables + (myargs.reports or []):
+        if not os.path.isfile(filename):
+            print ("[FATAL ERROR] File '%s' to merge does not exist!" % filename)
+            sys.exit(1)
+    if (myargs.report != None) and (myargs.reports != None):
+        udav_soft.merge_HMMer_reports(myargs.reports, myargs.report)
+    udav_soft.merge_HMMer_tables(myargs.tables, myargs.table) # Table is the last, so its '# [ok]' line means that all is done
+    for filename in myargs.cleanup:
+        if os.path.isfile(filename):
+            os.remove(filename)
+
+if __name__ == "__main__":
+    main()
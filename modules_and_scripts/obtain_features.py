@@ -3,38 +3,9 @@ import sys, os, argparse
 import udav_align, udav_base, udav_soft
 
 #========================================================================================
-curr_version = 1.8
-parser = argparse.ArgumentParser(description = 
-"This script will obtain features file for given alignment (Pfam + TMHMM in this version) \
-Current version is %s" % curr_version 
-)
-parser.add_argument("-i", help = "Name of the alignment (name = ID is expected)", required = True, dest = "input_file")
-parser.add_argument("-o", help = "Name of the output feature file", required = True, dest ="output_file")
-parser.add_argument("-t", help = "Name of TMHMM result for given file (one line per protein)", required = False, dest = "TMHMM")
-parser.add_argument("-l", help = "Letters of amino acids which should be added as features (string)", required = False, dest = "letters")
-parser.add_argument("-p", help = "Name of HMMer output for Pfam database (result of --domtblout option)", required = False, dest = "Pfam")
-parser.add_argument("-e", help = "Give here global domain e-value threshold (DEFAULT = 1.0)", required = False, dest = "evalue")
-parser.add_argument("-f", help = "If domain filtering required, give here threshold for overlap in percent", required = False, dest = "filter_thresh")
-parser.add_argument("--unite", help = "Unite same domains following each other (use carefully)", action = "store_true", dest = "unite")
-parser.add_argument("--max_dist", help = "If same domains are united, this is a maximum distance between them in a protein", required = False, default = 50, dest = "max_dist")
-parser.add_argument("--max_hmm_overlap", help = "If same domains are united, this is a maximal overlap between them in HMM coordinates (in % of length of longer HMM hit)", required = False, default = 30, dest = "max_hmm_overlap")
-parser.add_argument("-c", help = "Give here file with name correspondence to replace and sort input file", required = False, dest = "correspond")
-parser.add_argument("-s", help = "File with color scheme (required if -c is used)", required = False, dest = "scheme")
-parser.add_argument("-r", help = "If names in the input should not be changed, enter this option", required = False, action = "store_false", dest = "replace")
-parser.add_argument("-d", help = "Name of output file with information about the domains found (if required)", required = False, dest = "domain_filename")
-myargs = parser.parse_args()
-
-if myargs.evalue == None:
-    myargs.evalue = 1.0
-myargs.evalue = float(myargs.evalue)
-filter_on = False
-if myargs.filter_thresh != None:
-    myargs.filter_thresh = float(myargs.filter_thresh)
-    filter_on = True
-if myargs.max_dist != None:
-    myargs.max_dist = int(myargs.max_dist)
-if myargs.max_hmm_overlap != None:
-    myargs.max_hmm_overlap = float(myargs.max_hmm_overlap)
+curr_version = 1.9
+# FIX: version 1.9 (features are obtained by the importable <get_features_text()> method working
+#                   with in-memory alignment; the script itself is a thin command line wrapper)
 #========================================================================================
 def get_letter_features(sequence, letters):
     no_gaps = sequence.replace("-", "")
@@ -46,53 +17,107 @@ def get_letter_features(sequence, letters):
                 addition += "%s," % (i + 1)
         addition = addition.strip(",")
         if addition != "":
-            letter_features += "[%s] " % l        
+            letter_features += "[%s] " % l
             letter_features += addition
             letter_features += "\t"
     letter_features = letter_features.strip("\t")
     return letter_features
-    
-alignment = udav_base.read_alignment(myargs.input_file)
 
-TMHMM_result = None
-if myargs.TMHMM != None:
-    #TMHMM_result = udav_soft.read_TMHMM_output(myargs.TMHMM)
-    (TMHMM_result, ids_to_strings) = udav_soft.read_DeepTMHMM_output(myargs.TMHMM) #FIX: version 1.7
+def get_features_text(alignment, TMHMM = None, Pfam = None, evalue = 1.0, filter_thresh = None, unite = False,
+                      max_dist = 50, max_hmm_overlap = 30, letters = None, replace = True):
+    """
+    Method returns tuple of (0) text of the features for each sequence of the <alignment> (list of
+    <Alignment_sequence> objects) and (1) dictionary of domain names to <udav_soft.Pfam_domain>
+    objects (None if <Pfam> was not given). <TMHMM> (DeepTMHMM output) and <Pfam> (HMMer --domtblout
+    output) could be file names or file-like objects; domains are filtered by overlap only if
+    <filter_thresh> is given
+    """
+    TMHMM_result = None
+    if TMHMM != None:
+        (TMHMM_result, ids_to_strings) = udav_soft.read_DeepTMHMM_output(TMHMM) #FIX: version 1.7
+
+    Pfam_result = None
+    domains = None
+    if Pfam != None:
+        filter_on = filter_thresh != None
+        (Pfam_result, domains) = udav_soft.read_Pfam_output(Pfam, evalue, filter_on, filter_thresh, unite_same = unite, max_distance = max_dist, max_hmm_overlap = max_hmm_overlap)
+
+    strings = list()
+    for s in alignment:
+        s.remove_limits(False, replace)
+        curr_string = s.ID
+        if TMHMM_result != None:
+            if s.ID in TMHMM_result:
+                curr_string += "\t%s" % TMHMM_result[s.ID]
+        if Pfam_result != None:
+            if s.ID in Pfam_result:
+                curr_string += "\t%s" % Pfam_result[s.ID]
+        if letters != None:
+            letters_result = get_letter_features(s.sequence, letters)
+            curr_string += "\t%s" % letters_result
+        strings.append(curr_string + "\n")
+    return ("".join(strings), domains)
+
+def get_domain_info_text(domains):
+    strings = list()
+    for domain in domains.keys():
+        curr_domain = domains[domain]
+        strings.append("%s\t%s\t%s\n" % (curr_domain.name, curr_domain.ac, curr_domain.description))
+    return "".join(strings)
 
-Pfam_result = None
-if myargs.Pfam != None:
-    (Pfam_result, domains) = udav_soft.read_Pfam_output(myargs.Pfam, myargs.evalue, filter_on, myargs.filter_thresh, unite_same = myargs.unite, max_distance = myargs.max_dist, max_hmm_overlap = myargs.max_hmm_overlap)
+def main():
+    parser = argparse.ArgumentParser(description =
+    "This script will obtain features file for given alignment (Pfam + TMHMM in this version) \
+    Current version is %s" % curr_version
+    )
+    parser.add_argument("-i", help = "Name of the alignment (name = ID is expected)", required = True, dest = "input_file")
+    parser.add_argument("-o", help = "Name of the output feature file", required = True, dest ="output_file")
+    parser.add_argument("-t", help = "Name of TMHMM result for given file (one line per protein)", required = False, dest = "TMHMM")
+    parser.add_argument("-l", help = "Letters of amino acids which should be added as features (string)", required = False, dest = "letters")
+    parser.add_argument("-p", help = "Name of HMMer output for Pfam database (result of --domtblout option)", required = False, dest = "Pfam")
+    parser.add_argument("-e", help = "Give here global domain e-value threshold (DEFAULT = 1.0)", required = False, dest = "evalue")
+    parser.add_argument("-f", help = "If domain filtering required, give here threshold for overlap in percent", required = False, dest = "filter_thresh")
+    parser.add_argument("--unite", help = "Unite same domains following each other (use carefully)", action = "store_true", dest = "unite")
+    parser.add_argument("--max_dist", help = "If same domains are united, this is a maximum distance between them in a protein", required = False, default = 50, dest = "max_dist")
+    parser.add_argument("--max_hmm_overlap", help = "If same domains are united, this is a maximal overlap between them in HMM coordinates (in % of length of longer HMM hit)", required = False, default = 30, dest = "max_hmm_overlap")
+    parser.add_argument("-c", help = "Give here file with name correspondence to replace and sort input file", required = False, dest = "correspond")
+    parser.add_argument("-s", help = "File with color scheme (required if -c is used)", required = False, dest = "scheme")
+    parser.add_argument("-r", help = "If names in the input should not be changed, enter this option", required = False, action = "store_false", dest = "replace")
+    parser.add_argument("-d", help = "Name of output file with information about the domains found (if required)", required = False, dest = "domain_filename")
+    myargs = parser.parse_args()
 
-    if myargs.domain_filename != None:
+    if myargs.evalue == None:
+        myargs.evalue = 1.0
+    myargs.evalue = float(myargs.evalue)
+    if myargs.filter_thresh != None:
+        myargs.filter_thresh = float(myargs.filter_thresh)
+    if myargs.max_dist != None:
+        myargs.max_dist = int(myargs.max_dist)
+    if myargs.max_hmm_overlap != None:
+        myargs.max_hmm_overlap = float(myargs.max_hmm_overlap)
+
+    alignment = udav_base.read_alignment(myargs.input_file)
+    (features_text, domains) = get_features_text(alignment, myargs.TMHMM, myargs.Pfam, myargs.evalue, myargs.filter_thresh, myargs.unite,
+                                                 myargs.max_dist, myargs.max_hmm_overlap, myargs.letters, myargs.replace)
+    if (domains != None) and (myargs.domain_filename != None):
         domain_file = open(myargs.domain_filename, "w")
-        for domain in domains.keys():
-            curr_domain = domains[domain]
-            domain_file.write("%s\t%s\t%s\n" % (curr_domain.name, curr_domain.ac, curr_domain.description))
+        domain_file.write(get_domain_info_text(domains))
         domain_file.close()
 
-output = open(myargs.output_file, "w")
-for s in alignment:  
-    s.remove_limits(False, myargs.replace)
-    output.write("%s" % s.ID)
-    if TMHMM_result != None:
-        if s.ID in TMHMM_result:
-            output.write("\t%s" % TMHMM_result[s.ID])
-    if Pfam_result != None:
-        if s.ID in Pfam_result:
-            output.write("\t%s" % Pfam_result[s.ID])
-    if myargs.letters != None:
-        letters_result = get_letter_features(s.sequence, myargs.letters)
-        output.write("\t%s" % letters_result)
-    output.write("\n")
-output.close()
-    
-if myargs.correspond != None:  
-    color_scheme = udav_soft.read_color_file(myargs.scheme)
-    complete_alignment = udav_base.get_featured (myargs.input_file, myargs.correspond, myargs.output_file, dict(), color_scheme, True)
-    sorted_alignment = udav_base.sort_by_features(complete_alignment)
-    debug = open("_SORT_DEBUG.txt", "w")
-    for s in sorted_alignment:
-        curr_domains = s.get_features_order()
-        debug.write(curr_domains + "\n")
-    debug.close()
-    udav_base.print_pure_sequences(sorted_alignment, myargs.input_file, False, False)
+    output = open(myargs.output_file, "w")
+    output.write(features_text)
+    output.close()
+
+    if myargs.correspond != None:
+        color_scheme = udav_soft.read_color_file(myargs.scheme)
+        complete_alignment = udav_base.get_featured (myargs.input_file, myargs.correspond, myargs.output_file, dict(), color_scheme, True)
+        sorted_alignment = udav_base.sort_by_features(complete_alignment)
+        debug = open("_SORT_DEBUG.txt", "w")
+        for s in sorted_alignment:
+            curr_domains = s.get_features_order()
+            debug.write(curr_domains + "\n")
+        debug.close()
+        udav_base.print_pure_sequences(sorted_alignment, myargs.input_file, False, False)
+
+if __name__ == "__main__":
+    main()
@@ -3,140 +3,119 @@ import udav_align, udav_base
 import re
 
 #========================================================================================
-curr_version = 2.95
-parser = argparse.ArgumentParser(description = 
-"This script will remove additional info on sequence range (added by Jalview) and obtain blocks. \
-Blocks should be in one of the sequences with the name 'BLOCKS' and marked with B letter. \
-Also can filter sequences by their identity and use sequences with the name 'SITE' for this. \
-Classes related to alignments are separated to 'udav_align' module. \
-Current version is %s" % curr_version 
-)
-parser.add_argument("-i", help = "Alignment file", required=True, dest = "input_file")
-parser.add_argument("-o", help = "Prefix for the output files", required = True, dest = "output")
-parser.add_argument("-s", help = "Threshold to do sampling by sequence identity", required = False, dest = "sample_value")
-parser.add_argument("-b", help = "Calculate identity in the blocks regions only", action = "store_true", default = False, dest = "blocks_only")
-parser.add_argument("-f", help = "Name of file with correct organism names", required = False, dest = "org_file")
-parser.add_argument("-l", help = "If names were long, do it other way", action = "store_true", default = False, dest = "long_names")
-parser.add_argument("-d", help = "Delete BLOCKS and SITE sequences", action = "store_true", default = False, dest = "delete")
-parser.add_argument("-e", help = "Give here the name of file with taxonomy correspondence (Uniprot only!)", required = False, dest="expand")
-parser.add_argument("-x", help = "Use this if ids only should be printed to the fixed file", action = "store_true", default = False, dest = "id_only")
-parser.add_argument("-r", help = "Motif in the sequences marked by the additional FILTER which will be taken", required = False, dest = "seq_filter")
-parser.add_argument("-m", help = "Motifs in the sequence will be colored as separate letters, enter threshold percentage here", required = False, dest = "motif_std")
-myargs = parser.parse_args()
+curr_version = 2.99
+# FIX: version 2.96 (all steps are importable methods working with in-memory alignments;
+#                    the script itself is a thin command line wrapper around them)
+# FIX: version 2.97 (identity matrix for the -s option is calculated by several processes, see -p)
+# FIX: version 2.98 (.id_matrix file is binary and is rebuilt if the alignment or -b option has changed)
+# FIX: version 2.99 (greedy clustering with k-mer prefilter could be used for -s instead of the matrix, see -g)
 #========================================================================================
+class Special_sequences:
+    """
+    Class keeps data of the BLOCKS, SITE and FILTER sequences cut from the alignment
+    (see <cut_special_sequences()>)
+    """
+    def __init__(self):
+        self.blocks_seq = None
+        self.blocks_string = None
+        self.filter_positions = list() # FIX: version 2.7 (list of the position in FILTER sequence)
+        self.site_seq = None
+        self.site_positions = list()
+        self.mult_site_positions = dict()
+        self.fixed_num = 0               # Number of JalView bugs fixed
+        self.initial_seq_number = 0
+        self.duplicate_search = dict()   # FIX: version 2.6
 
-motif_is_std = False
-if myargs.motif_std != None:
-    motif_is_std = True
-else:
-    myargs.motif_std = 0
-####
-# 1) Reading input file
-####
-print ("Script <remove_seq_limits.py> is working with %s file" % myargs.input_file)
-seq_list = udav_base.read_alignment(myargs.input_file)
-####
-# 2) Cutting SITE and BLOCKS sequences
-####
-blocks_seq = None
-blocks_string = None
-filter_positions = list() # FIX: version 2.7 (list of the position in FILTER sequence)
-prev_sym = "-"
-site_seq = None
-site_positions = list()
-mult_site_positions = dict()
-output_blocks = open (myargs.output + ".blocks", "w")
-a = 0
-n = 0
-initial_seq_number = len(seq_list)
-duplicate_search = dict() # FIX: version 2.6
-while a < len(seq_list):
-    s = seq_list[a]
-    prev_name = s.name
-    if not s.ID in duplicate_search:
-        duplicate_search[s.ID] = False
-    else:
-        duplicate_search[s.ID] = True   
-    s.remove_limits(myargs.long_names)
-    if s.name != prev_name:
-        n += 1
-    if myargs.org_file == None:
-        s.prepare_organism()
-
-    if s.name == "BLOCKS":
-        print ("BLOCKS string found!")
-        blocks_string = ""
-        for i in range(len(s.sequence)): #FIX 2.9: Not only 'B' and 'C' are considered
-            if (s.sequence[i] != "-") and (prev_sym == "-"):
-               blocks_string += str(i + 1)
-               prev_sym = s.sequence[i]
-            if (s.sequence[i] == "-") and (prev_sym != "-"):
-               blocks_string += ".." + str(i) + ","
-               prev_sym = "-"
-        blocks_string = blocks_string.strip(",")
-        output_blocks.write(blocks_string + "\n")
-        blocks_seq = seq_list.pop(a)        
-        blocks_seq.name = s.name
-        a -= 1  
-    if s.name == "SITE":
-        print ("SITE string found!")
-        site_positions = udav_align.get_positions(s) #-- Difference in these create immunity to fitler
-        mult_site_positions = udav_align.get_multiple_positions(s, motif_is_std)
-        site_seq = seq_list.pop(a)
-        site_seq.name = s.name
-        a -= 1
-    if s.name == "FILTER":
-        print ("FILTER string found!")
-        for i in range(len(s.sequence)):
-            if s.sequence[i] != "-": # Non-gap symbol found
-                filter_positions.append(i)
-        seq_list.pop(a) 
-        a -= 1
-    a += 1
-output_blocks.close()
-
-if myargs.seq_filter != None:
-    filter_file = open("%s.%s.filter" % (myargs.input_file, myargs.seq_filter), "w")
-    myargs.seq_filter = myargs.seq_filter.replace("x", ".")
-    print ("Inputed filter: %s" % myargs.seq_filter)
+    def get_duplicates(self):
+        """
+        Method returns list of protein IDs which were found more than once
+        """
+        return [protein_ID for protein_ID in self.duplicate_search.keys() if self.duplicate_search[protein_ID] == True]
+
+def cut_special_sequences(seq_list, long_names = False, prepare_organisms = True, motif_is_std = False):
+    """
+    Method removes JalView limits from the names of sequences in <seq_list> and cuts
+    BLOCKS, SITE and FILTER sequences from it. Returns <Special_sequences> object
+    """
+    specials = Special_sequences()
+    specials.initial_seq_number = len(seq_list)
+    prev_sym = "-"
+    a = 0
+    while a < len(seq_list):
+        s = seq_list[a]
+        prev_name = s.name
+        if not s.ID in specials.duplicate_search:
+            specials.duplicate_search[s.ID] = False
+        else:
+            specials.duplicate_search[s.ID] = True
+        s.remove_limits(long_names)
+        if s.name != prev_name:
+            specials.fixed_num += 1
+        if prepare_organisms:
+            s.prepare_organism()
+
+        if s.name == "BLOCKS":
+            print ("BLOCKS string found!")
+            blocks_string = ""
+            for i in range(len(s.sequence)): #FIX 2.9: Not only 'B' and 'C' are considered
+                if (s.sequence[i] != "-") and (prev_sym == "-"):
+                   blocks_string += str(i + 1)
+                   prev_sym = s.sequence[i]
+                if (s.sequence[i] == "-") and (prev_sym != "-"):
+                   blocks_string += ".." + str(i) + ","
+                   prev_sym = "-"
+            specials.blocks_string = blocks_string.strip(",")
+            specials.blocks_seq = seq_list.pop(a)
+            specials.blocks_seq.name = s.name
+            a -= 1
+        if s.name == "SITE":
+            print ("SITE string found!")
+            specials.site_positions = udav_align.get_positions(s) #-- Difference in these create immunity to fitler
+            specials.mult_site_positions = udav_align.get_multiple_positions(s, motif_is_std)
+            specials.site_seq = seq_list.pop(a)
+            specials.site_seq.name = s.name
+            a -= 1
+        if s.name == "FILTER":
+            print ("FILTER string found!")
+            for i in range(len(s.sequence)):
+                if s.sequence[i] != "-": # Non-gap symbol found
+                    specials.filter_positions.append(i)
+            seq_list.pop(a)
+            a -= 1
+        a += 1
+    return specials
+
+def filter_by_motif(seq_list, seq_filter, filter_positions):
+    """
+    Method removes sequences with the motif <seq_filter> ('x' is any residue) in the positions
+    of FILTER sequence from the <seq_list>. Returns list of removed sequences or None
+    if the filter does not match the FILTER sequence
+    """
+    seq_filter = seq_filter.replace("x", ".")
+    print ("Inputed filter: %s" % seq_filter)
     print ("Found positions: %s" % filter_positions)
-    if len(myargs.seq_filter) < len(filter_positions):
+    if len(seq_filter) < len(filter_positions):
         print ("FATAL ERROR: sequence filter inputed does not match FILTER string data!")
-        sys.exit()
+        return None
+    filtered = list()
     a = 0
-    while a < len(seq_list):    
+    while a < len(seq_list):
         curr_motif = ""
         for p in filter_positions:
             curr_motif += seq_list[a].sequence[p]
-        find_matches = re.findall(myargs.seq_filter, curr_motif)
-        #print seq_list[a].ID + " " + str(find_matches) + " " + curr_motif
+        find_matches = re.findall(seq_filter, curr_motif)
         if len(find_matches) != 0:
-            curr_seq = seq_list.pop(a)
-            filter_file.write(">%s\n%s\n\n" % (curr_seq.name, curr_seq.sequence))
+            filtered.append(seq_list.pop(a))
             a -= 1
         a += 1
-    filter_file.close()
-        
-####
-# 3) Filtering sequences by their identity (under -s option)
-####
-if myargs.sample_value != None:
-    matrix_filename = myargs.output + ".id_matrix"
-    if myargs.blocks_only == True:
-        vertex_list = udav_align.Identity_graph (seq_list, float(myargs.sample_value), blocks_string, matrix_filename)
-    else:
-        vertex_list = udav_align.Identity_graph (seq_list, float(myargs.sample_value), None, matrix_filename)
-
-    vertex_list.print_graph(myargs.output + ".graph")
-    vertex_list.proceed_graph(seq_list, myargs.output + ".report", site_positions)
-                                           
-####
-# 4) Creating organism list (under -f option)
-####
-correct_orgs = None
-if myargs.org_file != None:
+    return filtered
+
+def read_correct_orgs(org_filename):
+    """
+    Method reads file with correct organism names (strings like 'short/long name')
+    """
     correct_orgs = dict()
-    org_file = open (myargs.org_file)
+    org_file = open (org_filename)
     print ("The following organism name replacements will take place:")
     for string in org_file:
         string = string.strip()
@@ -145,14 +124,14 @@ if myargs.org_file != None:
            correct_orgs[string.split("/", 1)[0]] = string
            print ("%s\t=>\t%s" % (string.split("/", 1)[0], string))
     org_file.close()
+    return correct_orgs
 
-####
-# 5) Reading organism expansion file (under -e option)
-####
-expanded_orgs = None
-if myargs.expand != None:
+def read_expanded_orgs(expand_filename):
+    """
+    Method reads tab-separated file with taxonomy correspondence (Uniprot only!)
+    """
     expanded_orgs = dict()
-    expansion = open (myargs.expand, "r")
+    expansion = open (expand_filename, "r")
     for string in expansion:
          string = string.strip()
          if len(string) == 0:
@@ -166,61 +145,170 @@ if myargs.expand != None:
              fields[1] = fields[1].strip()
              expanded_orgs[fields[0]] = fields[1]
     expansion.close()
+    return expanded_orgs
 
-####
-# 6) Printing output
-####
-output_file = open (myargs.output + ".fixed", "w")
-if myargs.delete == False:
-    if blocks_seq != None:
-        output_file.write(">%s\n%s\n\n" % (blocks_seq.name, blocks_seq.sequence))   
-    if site_seq != None:
-        output_file.write(">%s\n%s\n\n" % (site_seq.name, site_seq.sequence))   
-
-o = 0
-output_ids = open(myargs.output + ".ids", "w")
-output_ngphylogeny = open(myargs.output + ".ngphylogeny", "w")
-output_orgs = open(myargs.output + ".orgs", "w")
-for s in seq_list:
-    req_name = s.correct_organism (correct_orgs, expanded_orgs)
-    output_ids.write ("%s\n" % s.ID)
-    if len (req_name.split("|", 1)) != 1:
-        org_name = req_name.split("|", 1)[1]
-        org_name = org_name.replace("_", " ")
-        output_orgs.write("%s\n" % org_name)
-    #if myargs.id_only == True:
-    #    req_name = s.ID
-    output_file.write(">%s\n%s\n\n" % (req_name, s.sequence))
-    id_part = req_name.split("|", 1)[0] # FIX: version 2.95 (NGPhylogeny stupid replacement tracked)
-    ngphylogeny_name = re.sub("[^A-Za-z0-9\-_]", "-", req_name)
-    output_ngphylogeny.write("%s\t%s\t%s\n" % (id_part, req_name, ngphylogeny_name))
-    if s.name != req_name:
-        o += 1
-output_file.close()
-output_ids.close()
-output_ngphylogeny.close()
-output_orgs.close()
-
-udav_base.print_pure_sequences(seq_list, myargs.output + ".pure", myargs.id_only, True)
-udav_align.print_multiple_positions(mult_site_positions, myargs.output + ".motif")
-udav_align.print_motif_variants(seq_list, mult_site_positions, myargs.output + ".motif_var", motif_is_std, float(myargs.motif_std))
-if blocks_seq != None:
-    udav_align.print_blocks_regions(seq_list, blocks_string, myargs.output + ".blocks_regions")
-
-print ("DONE! %i cases of JalView bugs fixed (out of total %i sequences)" % (n, initial_seq_number))
-print ("Also %i cases of organism names fixed (out of resulting %i sequences)" % (o, len(seq_list)))
-
-####
-# 7) Warining about names duplicates - FIX: version 2.6
-####
-n = 0
-for protein_ID in duplicate_search.keys():
-    if duplicate_search[protein_ID] == True:
-        n += 1
-if n != 0:
-    print ("\nIMPORTANT WARNING: your alignment contains %i protein_ids which are duplicated.\n\
+def get_output_texts(seq_list, specials, delete = False, id_only = False, correct_orgs = None, expanded_orgs = None):
+    """
+    Method returns tuple of (0) dictionary of the output file extensions ('fixed', 'ids', 'ngphylogeny',
+    'orgs', 'pure', 'pure.correspond' if <id_only> is True and 'blocks_regions' if there was
+    BLOCKS sequence) to their texts and (1) number of organism names fixed
+    """
+    fixed_strings = list()
+    if delete == False:
+        if specials.blocks_seq != None:
+            fixed_strings.append(">%s\n%s\n\n" % (specials.blocks_seq.name, specials.blocks_seq.sequence))
+        if specials.site_seq != None:
+            fixed_strings.append(">%s\n%s\n\n" % (specials.site_seq.name, specials.site_seq.sequence))
+
+    o = 0
+    id_strings = list()
+    ngphylogeny_strings = list()
+    org_strings = list()
+    for s in seq_list:
+        req_name = s.correct_organism (correct_orgs, expanded_orgs)
+        id_strings.append("%s\n" % s.ID)
+        if len (req_name.split("|", 1)) != 1:
+            org_name = req_name.split("|", 1)[1]
+            org_name = org_name.replace("_", " ")
+            org_strings.append("%s\n" % org_name)
+        fixed_strings.append(">%s\n%s\n\n" % (req_name, s.sequence))
+        id_part = req_name.split("|", 1)[0] # FIX: version 2.95 (NGPhylogeny stupid replacement tracked)
+        ngphylogeny_name = re.sub("[^A-Za-z0-9\-_]", "-", req_name)
+        ngphylogeny_strings.append("%s\t%s\t%s\n" % (id_part, req_name, ngphylogeny_name))
+        if s.name != req_name:
+            o += 1
+
+    texts = dict()
+    texts["fixed"] = "".join(fixed_strings)
+    texts["ids"] = "".join(id_strings)
+    texts["ngphylogeny"] = "".join(ngphylogeny_strings)
+    texts["orgs"] = "".join(org_strings)
+    (texts["pure"], correspond_text) = udav_base.get_pure_text(seq_list, id_only, True)
+    if correspond_text != None:
+        texts["pure.correspond"] = correspond_text
+    if specials.blocks_seq != None:
+        texts["blocks_regions"] = udav_align.get_blocks_regions_text(seq_list, specials.blocks_string)
+    return (texts, o)
+
+def print_summary(specials, o, seq_number):
+    print ("DONE! %i cases of JalView bugs fixed (out of total %i sequences)" % (specials.fixed_num, specials.initial_seq_number))
+    print ("Also %i cases of organism names fixed (out of resulting %i sequences)" % (o, seq_number))
+
+    duplicates = specials.get_duplicates() # Warining about names duplicates - FIX: version 2.6
+    if len(duplicates) != 0:
+        print ("\nIMPORTANT WARNING: your alignment contains %i protein_ids which are duplicated.\n\
                                  This will likely cause problems afterwards, please remove them\n\
-                                 prior to further analysis and re-run this script!" % n)
-    for protein_ID in duplicate_search.keys():
-        if duplicate_search[protein_ID] == True:
+                                 prior to further analysis and re-run this script!" % len(duplicates))
+        for protein_ID in duplicates:
             print (protein_ID)
+
+def parse_alignment(seq_list, long_names = False, delete = False, id_only = False, correct_orgs = None, expanded_orgs = None):
+    """
+    Method does all steps of the script except for sampling on the list of <Alignment_sequence>
+    objects <seq_list> (it is changed in place) and returns dictionary of the output texts
+    (see <get_output_texts()>)
+    """
+    specials = cut_special_sequences(seq_list, long_names, correct_orgs == None)
+    (texts, o) = get_output_texts(seq_list, specials, delete, id_only, correct_orgs, expanded_orgs)
+    print_summary(specials, o, len(seq_list))
+    return texts
+
+def main():
+    parser = argparse.ArgumentParser(description =
+    "This script will remove additional info on sequence range (added by Jalview) and obtain blocks. \
+    Blocks should be in one of the sequences with the name 'BLOCKS' and marked with B letter. \
+    Also can filter sequences by their identity and use sequences with the name 'SITE' for this. \
+    Classes related to alignments are separated to 'udav_align' module. \
+    Current version is %s" % curr_version
+    )
+    parser.add_argument("-i", help = "Alignment file", required=True, dest = "input_file")
+    parser.add_argument("-o", help = "Prefix for the output files", required = True, dest = "output")
+    parser.add_argument("-s", help = "Threshold to do sampling by sequence identity", required = False, dest = "sample_value")
+    parser.add_argument("-b", help = "Calculate identity in the blocks regions only", action = "store_true", default = False, dest = "blocks_only")
+    parser.add_argument("-p", help = "Number of processes to calculate identity matrix (DEFAULT = number of CPUs)", required = False, type = int, dest = "processes")
+    parser.add_argument("-g", help = "Sample by greedy clustering (only the longest sequence of each cluster is kept) instead of identity matrix; use for large sets", action = "store_true", default = False, dest = "greedy")
+    parser.add_argument("-w", help = "Size of k-mers used to find similar clusters with -g (DEFAULT = 5)", required = False, default = 5, type = int, dest = "word_size")
+    parser.add_argument("-f", help = "Name of file with correct organism names", required = False, dest = "org_file")
+    parser.add_argument("-l", help = "If names were long, do it other way", action = "store_true", default = False, dest = "long_names")
+    parser.add_argument("-d", help = "Delete BLOCKS and SITE sequences", action = "store_true", default = False, dest = "delete")
+    parser.add_argument("-e", help = "Give here the name of file with taxonomy correspondence (Uniprot only!)", required = False, dest="expand")
+    parser.add_argument("-x", help = "Use this if ids only should be printed to the fixed file", action = "store_true", default = False, dest = "id_only")
+    parser.add_argument("-r", help = "Motif in the sequences marked by the additional FILTER which will be taken", required = False, dest = "seq_filter")
+    parser.add_argument("-m", help = "Motifs in the sequence will be colored as separate letters, enter threshold percentage here", required = False, dest = "motif_std")
+    myargs = parser.parse_args()
+
+    motif_is_std = False
+    if myargs.motif_std != None:
+        motif_is_std = True
+    else:
+        myargs.motif_std = 0
+    ####
+    # 1) Reading input file
+    ####
+    print ("Script <remove_seq_limits.py> is working with %s file" % myargs.input_file)
+    seq_list = udav_base.read_alignment(myargs.input_file)
+    ####
+    # 2) Cutting SITE and BLOCKS sequences
+    ####
+    specials = cut_special_sequences(seq_list, myargs.long_names, myargs.org_file == None, motif_is_std)
+    output_blocks = open (myargs.output + ".blocks", "w")
+    if specials.blocks_string != None:
+        output_blocks.write(specials.blocks_string + "\n")
+    output_blocks.close()
+
+    if myargs.seq_filter != None:
+        filtered = filter_by_motif(seq_list, myargs.seq_filter, specials.filter_positions)
+        if filtered == None:
+            sys.exit()
+        filter_file = open("%s.%s.filter" % (myargs.input_file, myargs.seq_filter), "w")
+        for curr_seq in filtered:
+            filter_file.write(">%s\n%s\n\n" % (curr_seq.name, curr_seq.sequence))
+        filter_file.close()
+    ####
+    # 3) Filtering sequences by their identity (under -s option)
+    ####
+    if (myargs.sample_value != None) and myargs.greedy:
+        blocks_string = None
+        if myargs.blocks_only == True:
+            blocks_string = specials.blocks_string
+        clusters = udav_align.Greedy_clustering(seq_list, float(myargs.sample_value), blocks_string, myargs.word_size)
+        clusters.proceed_clusters(seq_list, myargs.output + ".report", specials.site_positions)
+    elif myargs.sample_value != None:
+        matrix_filename = myargs.output + ".id_matrix"
+        if myargs.blocks_only == True:
+            vertex_list = udav_align.Identity_graph (seq_list, float(myargs.sample_value), specials.blocks_string, matrix_filename, myargs.processes)
+        else:
+            vertex_list = udav_align.Identity_graph (seq_list, float(myargs.sample_value), None, matrix_filename, myargs.processes)
+
+        vertex_list.print_graph(myargs.output + ".graph")
+        vertex_list.proceed_graph(seq_list, myargs.output + ".report", specials.site_positions)
+    ####
+    # 4) Creating organism list (under -f option)
+    ####
+    correct_orgs = None
+    if myargs.org_file != None:
+        correct_orgs = read_correct_orgs(myargs.org_file)
+    ####
+    # 5) Reading organism expansion file (under -e option)
+    ####
+    expanded_orgs = None
+    if myargs.expand != None:
+        expanded_orgs = read_expanded_orgs(myargs.expand)
+    ####
+    # 6) Printing output
+    ####
+    (texts, o) = get_output_texts(seq_list, specials, myargs.delete, myargs.id_only, correct_orgs, expanded_orgs)
+    for extension in ["fixed", "ids", "ngphylogeny", "orgs", "pure", "pure.correspond", "blocks_regions"]:
+        if extension in texts:
+            output_file = open("%s.%s" % (myargs.output, extension), "w")
+            output_file.write(texts[extension])
+            output_file.close()
+    udav_align.print_multiple_positions(specials.mult_site_positions, myargs.output + ".motif")
+    udav_align.print_motif_variants(seq_list, specials.mult_site_positions, myargs.output + ".motif_var", motif_is_std, float(myargs.motif_std))
+    ####
+    # 7) Summary and warining about names duplicates
+    ####
+    print_summary(specials, o, len(seq_list))
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ import sys, os, argparse, re
 import udav_fasta, udav_base, udav_tree_svg, udav_soft
 
 #========================================================================================
-curr_version = 4.6
+curr_version = 4.7
 parser = argparse.ArgumentParser(description = 
 "This script will kill two rabbits: it (1) color tree according to the coloring rules and \
 (2) sorts input alignment file by the order of the given tree. Can also identify and mark isoforms. \
@@ -29,6 +29,7 @@ parser.add_argument("-r", help = "To remove bootstraps give 'remove'; to replace
 parser.add_argument("-x", help = "Mark proteins with given mark (e.g., 'COG0001') with bold", required = False, dest = "mark_bold")
 parser.add_argument("-p", help = "Print plain id list as found on the tree", action = "store_true", required = False, dest = "plain_list")
 parser.add_argument("-z", help = "If tree contains gi, give here file with the assignment gi->id (.table format)", required = False, dest = "gi_to_id_filename")
+parser.add_argument("--no_index", help = "Read fasta banks (-a with -f, --add_assign, -b) completely instead of using their offset index (.udx)", action = "store_false", dest = "use_index")
 myargs = parser.parse_args()
 color_file_path = "D:\\UdavBackup\\_Complete_genomes\\_scripts\\udav_color_taxonomy.txt"
 if myargs.colors != None:
@@ -100,9 +101,17 @@ if myargs.assign != None: #----------- 1a) Changing text tags (coloring)
     print ("\tDONE!")
     id_to_taxonomy = dict()
     short_id_to_taxonomy = dict() #FIX 3.3: considering case of non-complete IDs: not W9Y1V1_9EURO, but W9Y1V1 (Uniprot only)
+    tree_ids = dict() #FIX 4.7: all variants of IDs on the tree which could be searched in the banks
+    for key in text_tags.keys():
+        curr_id = text_tags[key].get_seq_id(False)
+        for variant in (curr_id, curr_id.split(".", 1)[0], curr_id.split("-", 1)[0]):
+            tree_ids[variant] = True
     if myargs.format != None:
         print ("Reading fasta file with long names...")
-        (long_names, l_not_found) = udav_fasta.read_fasta(myargs.assign, None, None, dict(),
+        if myargs.use_index: #FIX 4.7: only records with IDs from the tree are read
+            (long_names, l_not_found) = udav_fasta.read_fasta_indexed(myargs.assign, tree_ids, myargs.format, None, False)
+        else:
+            (long_names, l_not_found) = udav_fasta.read_fasta(myargs.assign, None, None, dict(),
                                            100, False, None, None, None, None, myargs.format)
         print ("\tDONE; %i sequences found!" % len(long_names))
         for s in long_names:
@@ -132,7 +141,10 @@ if myargs.assign != None: #----------- 1a) Changing text tags (coloring)
             print ("FATAL ERROR: '%s' is not a file or directory!" % myargs.assign)
             sys.exit()
     if myargs.add_assign != None: # FIX: version 4.5
-        (add_long_names, add_l_not_found) = udav_fasta.read_fasta(myargs.add_assign, None, None, dict(),
+        if myargs.use_index: #FIX 4.7
+            (add_long_names, add_l_not_found) = udav_fasta.read_fasta_indexed(myargs.add_assign, tree_ids, "URef", None, False)
+        else:
+            (add_long_names, add_l_not_found) = udav_fasta.read_fasta(myargs.add_assign, None, None, dict(),
                                            100, False, None, None, None, None, "URef")
         for s in add_long_names:
             prot_id = s.get_proper_protein_id()
@@ -152,7 +164,7 @@ if myargs.assign != None: #----------- 1a) Changing text tags (coloring)
                 protein_id = text_tags[text_id].get_seq_id(False)
                 req_proteins[protein_id] = True
         print ("Obtaining isoform data...")
-        isoforms = udav_fasta.get_isoform_data(myargs.bank_isoform, req_proteins, "GI", "%s.isoforms" % myargs.output)
+        isoforms = udav_fasta.get_isoform_data(myargs.bank_isoform, req_proteins, "GI", "%s.isoforms" % myargs.output, myargs.use_index)
         print ("DONE; %i proteins assigned to isoform groups" % len(isoforms.keys()))
 
     print ("Changing colors in .svg...")
@@ -1,7 +1,7 @@
 """
 Module for working with alignments
 
-------- Version: 1.9
+------- Version: 2.6
         1.5  * Exact equals of medians in <Identity_graph.proceed_graph()> method is
                now properly proceeded
         1.6  * While building graph by <Identity_graph.build_graph()> method only full cliques
@@ -9,6 +9,19 @@ Module for working with alignments
         1.7  * Motif calculation now consideres amino acid residue simillarity
         1.8  * Motifs can now be standart
         1.9  * Fixed all print calls without ()
+        2.0  * <print_blocks_regions()> and <Identity_graph.get_id_matrix()> work with the
+               columnar <udav_base.Alignment_matrix> instead of per-letter loops
+        2.1  * <Seq_vertex> and <Vertex_data> have no per-instance dictionary (__slots__)
+        2.2  * Texts of the blocks regions and motif positions could be obtained without
+               printing them (<get_blocks_regions_text()>, <get_multiple_positions_text()>)
+        2.3  * Identity matrix keeps only the upper triangle; its rows are calculated in blocks
+               by a pool of processes (<get_identity_block()>) comparing whole encoded rows
+        2.4  * Identity matrix keeps numbers of equal columns; it is cached in a binary file which is
+               memory-mapped when read and rebuilt if the alignment or the column range has changed
+        2.5  * Graph of the <Identity_graph> is a sparse <Identity_adjacency> (CSR arrays) built from the
+               upper triangle; neighbor sets are compared by their hashes, medians are found by partial sort
+        2.6  * <Greedy_clustering> samples large sets without identity matrix: sequences are compared
+               only with the cluster representatives sharing enough k-mers
 
 
 Methods included in this module:
@@ -18,9 +31,19 @@ Methods included in this module:
         2) list get_feature_positions(feature_string)
            Transforms Gblocks-formatted string <feature_string> (e.g 3..6,8..10) to the
            list of positions described in it (here it would be [2, 3, 4, 5, 7, 8, 9])
+        2a) str get_feature_string(positions)
+           Reverse of the <get_feature_positions()>
+        2b) list get_construction_range(matrix, blocks_string)
+           Returns columns used for the identity: blocks or the columns with less than 80% of gaps
+        2c) int get_min_equal_count(max_identity, length)
+           Returns minimal number of equal columns (of <length>) giving identity not less than <max_identity>
+        2d) bool check_immunity(seq1, seq2, site_positions)
+           Checks if <seq1> and <seq2> have differences in <site_positions>
         3) void print_blocks_regions(seqs, blocks_string, output_filename)
            Prints to the file <output_filename> only described in <blocks_string>
            positions for each sequence in seqs
+        3a) str get_blocks_regions_text(seqs, blocks_string)
+           Same as <print_blocks_regions> but returns the text
 
 Classes included in this module:
         1) Seq_vertex (<- Alignment_sequence)
@@ -46,27 +69,61 @@ Classes included in this module:
            str   ID
            float identity
 
+        2a) Identity_adjacency
+           ~ Variables: ~
+           array offsets          - edges of the i-th vertex are in positions offsets[i]..offsets[i + 1]-1
+           array neighbors        - vertex of each edge (ascending for each vertex)
+           array identities       - identity of each edge
+           array reverse          - position of the backward edge
+           bytearray alive        - 0 for the removed edges
+           array degrees          - number of alive edges of each vertex
+           list  set_hashes       - XOR of the random <keys> of the neighbors of each vertex
+
+           ~ Methods: ~
+           list get_edges(v)              - positions of the alive edges of the vertex <v>
+           void remove_edge(v, p)         - removes edge in position <p> of the vertex <v> and its backward edge
+           bool has_edge(v, u)            - checks if vertices <v> and <u> are connected
+           bool same_neighbors(v, u)      - checks if <v> and <u> have the same neighbors (except of each other)
+
         3) Identity_graph
            ~ Variables: ~
            float max_identity     
-           list  id_matrix     
-           dict  graph 
+           array id_matrix        - upper triangle (row by row) of the numbers of equal columns
+           int   id_length        - number of compared columns
+           int   id_matrix_size   - number of sequences
+           Identity_adjacency graph
+           list  vertex_seqs      - sequences of the graph vertices
+           dict  id_to_vertex     - sequence ID to its vertex
 
            ~ Methods: ~
 
            bool check_immunity(seq1, seq2, site_positions)  - checks if <seq1> and <seq2> have differences in <site_positions>
-           list get_id_matrix(seq_list)                     - calculates identity matrix for <seq_list> de novo
-           list read_id_matrix(matrix_filename, seq_number) - reads identity matrix from given file
-           void print_id_matrix(filename)                   - prints identity matrix to file with given name
-           dict build_graph(seq_list)                       - builds graph
+           float get_identity(i, j)                         - returns identity of the <i>-th and <j>-th sequences
+           array get_id_matrix(matrix, construction_range, processes) - calculates identity matrix de novo
+           array read_id_matrix(matrix_filename, header)    - maps identity matrix from the file (None if the <header> differs)
+           void print_id_matrix(filename, header)           - writes identity matrix to the binary file
+           Identity_adjacency build_graph(seq_list)         - builds graph
            void proceed_graph(seq_list, report_filename, site_positions)
                 Method will remove sequences from the <seq_list> if they are identical more
                 than <self.max_identity> value. They should also differ in the given
                 <site_position> list of positions. Report about removing will be printed to
                 the file with given name
            void print_graph(filename)                       - prints graph to file with given name
+
+        4) Greedy_clustering
+           ~ Variables: ~
+           float max_identity
+           int   word_size
+           Alignment_matrix columns - compared columns of the alignment
+
+           ~ Methods: ~
+           void proceed_clusters(seq_list, report_filename, site_positions)
+                Same as <Identity_graph.proceed_graph()>, but the longest sequence of each cluster is kept
 """
 import sys, os
+import array, mmap, hashlib
+import bisect, heapq, random
+import concurrent.futures
 import udav_base
 
 def get_positions(site_seq):
@@ -90,16 +147,28 @@ def get_feature_positions(feature_string):
         feature_range.extend(list(block_range))
     return feature_range
 
+def get_feature_string(positions):
+    blocks = list()
+    for p in positions:
+        if (len(blocks) != 0) and (blocks[-1][1] == p - 1):
+            blocks[-1][1] = p
+        else:
+            blocks.append([p, p])
+    return ",".join(["%i..%i" % (start + 1, end + 1) for (start, end) in blocks])
+
+def get_blocks_regions_text(seqs, blocks_string):
+    blocks_range = get_feature_positions(blocks_string)
+    blocks_matrix = udav_base.get_alignment_matrix(seqs).select_columns(blocks_range)
+    strings = list()
+    for i in range(len(blocks_matrix)):
+        strings.append(">%s\n%s\n\n" % (blocks_matrix.names[i], blocks_matrix.get_sequence(i)))
+    return "".join(strings)
+
 def print_blocks_regions(seqs, blocks_string, output_filename):
     output_file = open(output_filename, "w")
-    blocks_range = get_feature_positions(blocks_string)
-    for s in seqs:
-        output_file.write(">%s\n" % s.name)
-        for i in blocks_range:
-            output_file.write(s.sequence[i])
-        output_file.write("\n\n")
+    output_file.write(get_blocks_regions_text(seqs, blocks_string))
     output_file.close()
-#----------------------------------------------------------------------------------------------
+
 def get_multiple_positions(site_seq, motif_std = False): # In contrast with <get_positions> method created dictionary
     positions = dict()
     letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ123456789"
@@ -121,16 +190,21 @@ def get_multiple_positions(site_seq, motif_std = False): # In contrast with <get
                 positions[curr_letter].append(i)
     return positions
 
-def print_multiple_positions(positions, output_filename): # Prints in motif format
+def get_multiple_positions_text(positions): # Text in motif format
     #{X}	4,28,45
     #{Y}	1,196,423,592	
-    output_file = open(output_filename, "w")
+    strings = list()
     for letter in positions.keys():      
          curr_string = "{%s}\t" % letter
          for i in positions[letter]:
              curr_string += "%i," % (i + 1)
          curr_string = curr_string.strip(",") + "\t"            
-         output_file.write(curr_string + "\n")
+         strings.append(curr_string + "\n")
+    return "".join(strings)
+
+def print_multiple_positions(positions, output_filename): # Prints in motif format
+    output_file = open(output_filename, "w")
+    output_file.write(get_multiple_positions_text(positions))
     output_file.close()
 
 def get_similarity_hash():
@@ -250,8 +324,104 @@ def read_motif_variants(filename):
         positions[fields[0]] = curr_pos
     input_file.close()
     return positions
+def get_construction_range(matrix, blocks_string):
+    if blocks_string != None:
+        print ("\tRange for identity calculation = blocks")
+        construction_range = get_feature_positions(blocks_string)
+        print ("\tTotal positions in blocks: %i" % len(construction_range))
+    else: # Default range reduced: max 80% gaps in the column are allowed
+        construction_range = [a for (a, gaps) in enumerate(matrix.get_gap_counts()) if 100 * float(gaps)/len(matrix) < 80]
+    return construction_range
+
+def get_min_equal_count(max_identity, length):
+    min_count = max(0, int(max_identity * length / 100) - 1)
+    while (min_count <= length) and (100 * (float(min_count) / length) < max_identity):
+        min_count += 1
+    return min_count
+
+def check_immunity(seq1, seq2, site_positions):
+    result = False
+    for p in site_positions:
+        if seq1.sequence[p] != seq2.sequence[p]:
+            result = True
+            break
+    return result
+#----------------------------------------------------------------------------------------------
+def get_median(values):
+    """
+    Method returns median of the <values>; only the lower half of them is sorted
+    """
+    half = len(values) // 2
+    lower = heapq.nsmallest(half + 1, values)
+    if (len(values) % 2) == 0: #Even number of values
+        return (lower[half] + lower[half - 1]) / 2.0
+    return lower[half]
+
+identity_rows = None   # Encoded rows of the alignment in the current process (see <set_identity_rows()>)
+identity_length = None # Number of compared columns
+
+def set_identity_rows(rows, length):
+    """
+    Method keeps encoded <rows> (see <encode_identity_rows()>) in the current process; it is
+    called once in each worker of the pool, so the rows are not sent with every block
+    """
+    global identity_rows, identity_length
+    identity_rows = rows
+    identity_length = length
+
+def encode_identity_rows(matrix):
+    """
+    Method returns each row of the <udav_base.Alignment_matrix> as a single integer: bytes of two
+    rows are compared at once by XOR, equal residues give zero bytes which are counted in C
+    """
+    return [int.from_bytes(matrix.get_row(i), "big") for i in range(len(matrix))]
+
+def get_count_typecode(length):
+    """
+    Method returns <array> typecode which could keep numbers of equal columns up to <length>
+    """
+    if length < 256:
+        return "B"
+    if length < 65536:
+        return "H"
+    return "I"
+
+def get_identity_block(first, last):
+    """
+    Method returns rows <first>..<last>-1 of the upper triangle of the identity matrix: <array.array>
+    with numbers of equal columns of the i-th row and the rows i+1..N-1 for each i
+    """
+    rows = identity_rows
+    length = identity_length
+    block = array.array(get_count_typecode(length))
+    for i in range(first, last):
+        seq_i = rows[i]
+        block.extend([(seq_i ^ rows[j]).to_bytes(length, "big").count(0) for j in range(i + 1, len(rows))])
+    return block
+
+def get_identity_blocks(seq_number, block_number):
+    """
+    Method splits rows of the upper triangle of <seq_number> x <seq_number> matrix into at most
+    <block_number> consecutive blocks with close number of pairs; returns list of (first, last) tuples
+    """
+    total_pairs = seq_number * (seq_number - 1) // 2
+    block_pairs = max(1, total_pairs // max(1, block_number))
+    blocks = list()
+    first = 0
+    curr_pairs = 0
+    for i in range(seq_number):
+        curr_pairs += seq_number - 1 - i
+        if curr_pairs >= block_pairs:
+            blocks.append((first, i + 1))
+            first = i + 1
+            curr_pairs = 0
+    if first < seq_number:
+        blocks.append((first, seq_number))
+    return blocks
 #----------------------------------------------------------------------------------------------  
 class Seq_vertex (udav_base.Alignment_sequence):
+    __slots__ = ("edges", "median", "better_median", "better_id")
+
     def __init__(self, name, sequence):
         udav_base.Alignment_sequence.__init__(self, name, sequence)
         self.edges = list()
@@ -260,16 +430,7 @@ class Seq_vertex (udav_base.Alignment_sequence):
         self.better_id = None
 
     def get_median(self):
-        median = 0
-        id_list = list()
-        for v in self.edges:
-            id_list.append(v.identity)
-        id_list = sorted(id_list)
-        if (len(id_list) % 2) == 0: #Even number of edges
-            median = (id_list[len(id_list)/2] + id_list[len(id_list)/2 - 1]) / 2.0
-        else:
-            median = id_list[len(id_list)/2]
-        self.median = median            
+        self.median = get_median([v.identity for v in self.edges])
 
     def print_edges(self, graph, graph_file, indent, already_printed):
         for curr_edge in self.edges:
@@ -288,172 +449,260 @@ class Seq_vertex (udav_base.Alignment_sequence):
                 graph[curr_edge.ID].print_edges(graph, graph_file, indent + 1, already_printed)        
 
 class Vertex_data:
+    __slots__ = ("ID", "identity")
+
     def __init__(self, ID, identity):
         self.ID = ID
         self.identity = identity
 
+class Identity_adjacency:
+    """
+    Sparse symmetric graph in CSR form built from the pairs of vertices (<first> < <second>, in the order
+    of the rows of the upper triangle). Edge and its backward edge are always removed together
+    """
+    def __init__(self, vertex_number, first, second, identities):
+        self.vertex_number = vertex_number
+        self.degrees = array.array("l", [0]) * vertex_number
+        for v in first:
+            self.degrees[v] += 1
+        for v in second:
+            self.degrees[v] += 1
+        self.offsets = array.array("q", [0]) * (vertex_number + 1)
+        for v in range(vertex_number):
+            self.offsets[v + 1] = self.offsets[v] + self.degrees[v]
+        edge_number = self.offsets[vertex_number]
+        self.neighbors = array.array("l", [0]) * edge_number
+        self.identities = array.array("d", [0.0]) * edge_number
+        self.reverse = array.array("q", [0]) * edge_number
+        self.alive = bytearray(b"\x01") * edge_number
+        free = self.offsets[:-1] # Next free position of each vertex; neighbors come in ascending order
+        for k in range(len(first)):
+            (v, u) = (first[k], second[k])
+            (p, q) = (free[v], free[u])
+            free[v] += 1
+            free[u] += 1
+            self.neighbors[p] = u
+            self.neighbors[q] = v
+            self.identities[p] = identities[k]
+            self.identities[q] = identities[k]
+            self.reverse[p] = q
+            self.reverse[q] = p
+        generator = random.Random(vertex_number) # Keys should only be different, not secret
+        self.keys = [generator.getrandbits(64) for v in range(vertex_number)]
+        self.set_hashes = [0] * vertex_number
+        for v in range(vertex_number):
+            for p in range(self.offsets[v], self.offsets[v + 1]):
+                self.set_hashes[v] ^= self.keys[self.neighbors[p]]
+
+    def get_edges(self, v):
+        return [p for p in range(self.offsets[v], self.offsets[v + 1]) if self.alive[p]]
+
+    def remove_edge(self, v, p):
+        u = self.neighbors[p]
+        self.alive[p] = 0
+        self.alive[self.reverse[p]] = 0
+        self.degrees[v] -= 1
+        self.degrees[u] -= 1
+        self.set_hashes[v] ^= self.keys[u]
+        self.set_hashes[u] ^= self.keys[v]
+
+    def has_edge(self, v, u):
+        p = bisect.bisect_left(self.neighbors, u, self.offsets[v], self.offsets[v + 1])
+        return (p < self.offsets[v + 1]) and (self.neighbors[p] == u) and (self.alive[p] == 1)
+
+    def same_neighbors(self, v, u):
+        """
+        Method returns True if <v> and <u> have the same neighbors (not counting each other)
+        """
+        if self.degrees[v] != self.degrees[u]:
+            return False
+        (hash_v, hash_u) = (self.set_hashes[v], self.set_hashes[u])
+        if self.has_edge(v, u):
+            hash_v ^= self.keys[u]
+            hash_u ^= self.keys[v]
+        return hash_v == hash_u
+
 class Identity_graph:
-    def __init__(self, seq_list, max_identity, blocks_string, matrix_filename):
+    header_start = "UDAV_ID_MATRIX 1" # First field of the binary matrix file header (with the format version)
+
+    def __init__(self, seq_list, max_identity, blocks_string, matrix_filename, processes = None):
         self.max_identity = max_identity
+        matrix = udav_base.get_alignment_matrix(seq_list)
+        self.id_matrix_size = len(matrix)
+        construction_range = get_construction_range(matrix, blocks_string)
+        self.id_length = len(construction_range)
+        #FIX: version 2.4 (matrix from the file is used only if it was built for the same alignment and columns)
+        header = self.get_matrix_header(matrix, construction_range)
+        self.id_matrix = None
         if os.path.isfile(matrix_filename): # Matrix will be obtained from the file
-            self.id_matrix = self.read_id_matrix(matrix_filename, len(seq_list))
-        else:                               # Matrix will be built de novo
-            self.id_matrix = self.get_id_matrix(seq_list, blocks_string)
-            self.print_id_matrix(matrix_filename)                
+            self.id_matrix = self.read_id_matrix(matrix_filename, header)
+        if self.id_matrix == None:          # Matrix will be built de novo
+            self.id_matrix = self.get_id_matrix(matrix, construction_range, processes)
+            self.print_id_matrix(matrix_filename, header)                
         self.graph = self.build_graph(seq_list) 
 
     def check_immunity(self, seq1, seq2, site_positions):
-        result = False
-        for p in site_positions:
-            if seq1.sequence[p] != seq2.sequence[p]:
-                result = True
-                break
-        return result
-
-    def get_id_matrix(self, seq_list, blocks_string):
+        return check_immunity(seq1, seq2, site_positions)
+
+    def get_identity(self, i, j):
+        """
+        Method returns identity (in percent) of the <i>-th and <j>-th sequences
+        """
+        if i == j:
+            return 100.0
+        if i > j:
+            (i, j) = (j, i)
+        seq_number = self.id_matrix_size
+        index = i * (2 * seq_number - i - 1) // 2 + (j - i - 1)
+        return 100 * (float(self.id_matrix[index]) / self.id_length)
+
+    def get_matrix_header(self, matrix, construction_range):
+        """
+        Method returns header of the binary matrix file: hash of the alignment content, its size,
+        number of compared columns, typecode and byte order of the values and the columns themselves
+        """
+        alignment_hash = hashlib.sha1(bytes(matrix.data)).hexdigest()
+        column_string = get_feature_string(construction_range)
+        if column_string == "":
+            column_string = "-"
+        return "%s %s %i %i %s %s %s" % (self.header_start, alignment_hash, len(matrix), len(construction_range),
+                                         get_count_typecode(len(construction_range)), sys.byteorder, column_string)
+
+    def get_id_matrix(self, matrix, construction_range, processes = None):
+        """
+        Method returns upper triangle of the identity matrix: numbers of equal symbols (including gaps)
+        of each pair of sequences in the <construction_range> columns of the <matrix>.
+        Blocks of rows are calculated by <processes> workers (all CPUs if None)
+        """
         print ("Identity matrix construction started...")
-        alignment_length = len(seq_list[0].sequence)
-        construction_range = list() # Default: all length
-        if blocks_string != None:
-            print ("\tRange for identity calculation = blocks")
-            construction_range = get_feature_positions(blocks_string)
-            print ("\tTotal positions in blocks: %i" % len(construction_range))
-        else:	
-            for a in range(alignment_length): # Default range reduced
-                column_gaps = 0
-                for i in range(len(seq_list)):
-                    if seq_list[i].sequence[a] == "-":
-                        column_gaps += 1
-                if 100 * float(column_gaps)/len(seq_list) < 80: # max 80% gaps in the column are allowed
-                    construction_range.append(a)
-        id_percentage = list()
-        for i in range(len(seq_list)):
-            new_line = list()
-            id_percentage.append(new_line)
-            seq_i = seq_list[i].sequence
-            for j in range (len(seq_list)):
-                seq_j = seq_list[j].sequence
-                curr_percent = 0
-                for a in construction_range:
-                    if seq_i[a] == seq_j[a]:
-                        curr_percent += 1
-                curr_percent = 100 * (float(curr_percent) / len(construction_range))
-                id_percentage[i].append(curr_percent)
-            if len(id_percentage[i]) != len(seq_list):
-                print ("FATAL ERROR: Matrix constructed by 'get_id_matrix()' method is corrupted")
-                print ("             Abnormal length %i is detected (%i expected)" % (len(id_percentage[i]), len(seq_list)))
-                sys.exit()
+        #FIX: version 2.3 (rows are encoded once and only the upper triangle is calculated)
+        rows = encode_identity_rows(matrix.select_columns(construction_range))
+        if processes == None:
+            processes = os.cpu_count() or 1
+        blocks = get_identity_blocks(len(rows), processes * 8) # More blocks than workers: the last ones are smaller
+        print ("\t%i blocks of rows are calculated by %i processes" % (len(blocks), processes))
+        counts = array.array(get_count_typecode(len(construction_range)))
+        if (processes == 1) or (len(blocks) == 1):
+            set_identity_rows(rows, len(construction_range))
+            for (first, last) in blocks:
+                counts.extend(get_identity_block(first, last))
+            set_identity_rows(None, None)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(processes, initializer = set_identity_rows, initargs = (rows, len(construction_range))) as pool:
+                for block in pool.map(get_identity_block, [b[0] for b in blocks], [b[1] for b in blocks]):
+                    counts.extend(block)
+        if len(counts) != len(rows) * (len(rows) - 1) // 2:
+            print ("FATAL ERROR: Matrix constructed by 'get_id_matrix()' method is corrupted")
+            print ("             Abnormal number of values %i is detected (%i expected)" % (len(counts), len(rows) * (len(rows) - 1) // 2))
+            sys.exit()
         print ("\t...matrix is done!")
-        return id_percentage
+        return counts
 
-    def read_id_matrix(self, matrix_filename, seq_number):
+    def read_id_matrix(self, matrix_filename, header):
+        """
+        Method maps the values of the binary matrix file into memory (they are read on demand);
+        returns None if the file was built for another alignment or columns (see <get_matrix_header()>)
+        """
         print ("Identity matrix reading from the file %s started..." % matrix_filename)
-        matrix = list()
-        matrix_file = open (matrix_filename)
-        for string in matrix_file:
-            if len(string.strip()) == 0:
-                continue
-            values = string.strip().split("\t")
-            matrix.append(list())
-            for value in values:
-                matrix[-1].append(float(value))
-            if len(matrix[-1]) != seq_number:
-                print ("FATAL ERROR: Matrix red by 'read_id_matrix()' method is corrupted")
-                print ("             Abnormal length %i is detected (%i expected)" % (len(matrix[-1]), seq_number))
-                sys.exit()              
+        matrix_file = open(matrix_filename, "rb")
+        file_header = matrix_file.readline(len(header) + 16).decode("latin-1").rstrip()
+        header_size = matrix_file.tell()
+        matrix_file.seek(0, 2)
+        file_size = matrix_file.tell()
+        typecode = get_count_typecode(self.id_length)
+        value_number = self.id_matrix_size * (self.id_matrix_size - 1) // 2
+        if (file_header != header) or (file_size != header_size + value_number * array.array(typecode).itemsize):
+            matrix_file.close()
+            print ("\t...matrix was built for another alignment or columns, it will be built again")
+            return None
+        matrix = memoryview(b"")
+        if value_number != 0:
+            matrix = memoryview(mmap.mmap(matrix_file.fileno(), 0, access = mmap.ACCESS_READ))[header_size:].cast(typecode)
         matrix_file.close()
         print ("\t...matrix is done!")
         return matrix
     
-    def print_id_matrix(self, filename):
+    def print_id_matrix(self, filename, header):
+        """
+        Method writes the <header> line (padded to 8 bytes with spaces) and raw values of the matrix
+        """
         print ("Printing matrix to the file %s..." % filename)
-        matrix_file = open (filename, "w")
-        for i in range(len(self.id_matrix)):
-            string = ""
-            for j in range(len(self.id_matrix[i])):
-                string += "%.2f\t" % self.id_matrix[i][j]
-            string = string.strip()
-            matrix_file.write(string + "\n")
+        header = header.ljust(((len(header) + 1 + 7) // 8) * 8 - 1)
+        matrix_file = open (filename, "wb")
+        matrix_file.write((header + "\n").encode("latin-1"))
+        matrix_file.write(self.id_matrix.tobytes())
         matrix_file.close()
         print ("\t...done!")
    
     def build_graph(self, seq_list):
         print ("Graph construction began...")
-        vertex = dict()
-        for i in range(len(self.id_matrix)):
-            curr_ID = seq_list[i].ID
-            vertex[curr_ID] = Seq_vertex(seq_list[i].name, seq_list[i].sequence)
-            for j in range(len(self.id_matrix)):
-                if i == j:
-                    continue   
-                if self.id_matrix[i][j] >= self.max_identity:
-                    found_ID = seq_list[j].ID
-                    vertex[curr_ID].edges.append(Vertex_data(found_ID, self.id_matrix[i][j]))
-            if len(vertex[curr_ID].edges) == 0: # Vertex remained without edges
-                vertex.pop(curr_ID)           
+        self.vertex_seqs = list(seq_list)
+        self.id_to_vertex = dict()
+        for v in range(len(seq_list)):
+            self.id_to_vertex[seq_list[v].ID] = v
+        #FIX: version 2.5 (pairs are taken from the upper triangle by the number of equal columns)
+        min_count = get_min_equal_count(self.max_identity, self.id_length)
+        first = array.array("l")
+        second = array.array("l")
+        identities = array.array("d")
+        seq_number = self.id_matrix_size
+        start = 0
+        for i in range(seq_number):
+            row = self.id_matrix[start:start + seq_number - 1 - i]
+            for k in [k for (k, count) in enumerate(row) if count >= min_count]:
+                first.append(i)
+                second.append(i + 1 + k)
+                identities.append(100 * (float(row[k]) / self.id_length))
+            start += seq_number - 1 - i
+        graph = Identity_adjacency(seq_number, first, second, identities)
         # FIX (version 1.6): for removal could be marked only edges with the same
         # FIX                neighbor set!
         print ("\t...graph changing began...")
-        for ID in vertex.keys():
-            i = 0
-            while i < len(vertex[ID].edges):
-                edge = vertex[ID].edges[i]
-                same_sets = self.compare_edge_set(vertex, edge.ID, ID)
-                if not same_sets:
-                    vertex[ID].edges.pop(i) # Remove this edge from the graph
-                    i -= 1
-                    j = 0                                        
-                    while j < len(vertex[edge.ID].edges):
-                        curr_edge = vertex[edge.ID].edges[j]
-                        if curr_edge.ID == ID:
-                            vertex[edge.ID].edges.pop(j) # Remove backward edge from the graph
-                            break
-                        j += 1
-                i += 1
-        for ID in vertex.keys():           
-            if len(vertex[ID].edges) == 0: # Vertex remained without edges
-                vertex.pop(ID)           
-                           
+        for v in range(seq_number):
+            for p in range(graph.offsets[v], graph.offsets[v + 1]):
+                if graph.alive[p] and (not graph.same_neighbors(graph.neighbors[p], v)):
+                    graph.remove_edge(v, p) # Backward edge is removed too
         print ("\t\t...graph is done!")
-        return vertex
+        return graph
 
     def proceed_graph(self, seq_list, report_filename, site_positions):
         print ("Graph proceeding began...")
+        graph = self.graph
+        seqs = self.vertex_seqs
         id_for_removal = dict()
         redundant_pairs = dict()
-        for ID in self.graph.keys(): # ------------------ Median calculation
-            self.graph[ID].get_median()
-    
-        largest_median = 0
-        largest_id = None
-        for ID in self.graph.keys(): # ------------------ Best ID detection
-            largest_median = self.graph[ID].median
-            largest_id = ID
-            for e in self.graph[ID].edges:
-                edge_ID = e.ID
-                if self.graph[edge_ID].median > largest_median:
-                    largest_median = self.graph[edge_ID].median
-                    largest_id = edge_ID       
-            for e in self.graph[ID].edges:
-                immunity = self.check_immunity(self.graph[e.ID], self.graph[largest_id], site_positions)
+        better = dict() # Vertex to the tuple of better median and better vertex
+        medians = [None] * graph.vertex_number
+        vertices = [v for v in range(graph.vertex_number) if graph.degrees[v] != 0]
+        for v in vertices: # ------------------ Median calculation
+            medians[v] = get_median([graph.identities[p] for p in graph.get_edges(v)])
+
+        for v in vertices: # ------------------ Best ID detection
+            largest_median = medians[v]
+            largest = v
+            edges = [graph.neighbors[p] for p in graph.get_edges(v)]
+            for u in edges:
+                if medians[u] > largest_median:
+                    largest_median = medians[u]
+                    largest = u
+            for u in edges:
+                immunity = self.check_immunity(seqs[u], seqs[largest], site_positions)
                 if immunity == True:
                     continue
 
-                if (e.ID != largest_id):
-                    if self.graph[e.ID].median != largest_median:
-                        id_for_removal[e.ID] = True
-                        self.graph[e.ID].better_median = largest_median
-                        self.graph[e.ID].better_id = largest_id
+                if (u != largest):
+                    if medians[u] != largest_median:
+                        id_for_removal[u] = True
+                        better[u] = (largest_median, largest)
                     else:
                         # FIX (version 1.5): not sequence will not be marked for removal if it has
                         # FIX                exactly the same median as one of the edges; both sequences are stored
-                        redundant_pairs[e.ID] = largest_id
+                        redundant_pairs[u] = largest
 
-            curr_immunity = self.check_immunity(self.graph[ID], self.graph[largest_id], site_positions)
-            if (ID != largest_id) and (not curr_immunity) and (self.graph[ID].median != largest_median):
-                id_for_removal[ID] = True
-                self.graph[ID].better_median = largest_median
-                self.graph[ID].better_id = largest_id              
+            curr_immunity = self.check_immunity(seqs[v], seqs[largest], site_positions)
+            if (v != largest) and (not curr_immunity) and (medians[v] != largest_median):
+                id_for_removal[v] = True
+                better[v] = (largest_median, largest)
 
         total_removes = 0
         report = open (report_filename, "w")
@@ -461,68 +710,130 @@ class Identity_graph:
         report.write("# Sequences with identity more or equlas to this are removed: %s\n" % self.max_identity)
         report.write("# Initial number of sequences: %i\n" % len(seq_list))
         report.write("# Removed_id\tMedian_identity\tBetter_identity\tBetter_id\n")
-        list_length = len(seq_list)
-        i = 0
         r = 0
-        while i < list_length:
-            curr_id = seq_list[i].ID
-            if curr_id in redundant_pairs:
+        remaining = list()
+        for s in seq_list:
+            v = self.id_to_vertex.get(s.ID)
+            if v in redundant_pairs:
                 # FIX (version 1.5): now one of redundant proteins will be removed
-                second_id = redundant_pairs[curr_id]
-                same_sets = self.compare_edge_set(self.graph, curr_id, second_id)
-                if same_sets:
-                     if second_id in redundant_pairs:
-                         redundant_pairs.pop(second_id)
-                     id_for_removal[curr_id] = True
-                     self.graph[curr_id].better_median = 101
-                     self.graph[curr_id].better_id = second_id
+                second = redundant_pairs[v]
+                if graph.same_neighbors(v, second):
+                     redundant_pairs.pop(second, None)
+                     id_for_removal[v] = True
+                     better[v] = (101, second)
                      r += 1
                                      
-            if curr_id in id_for_removal:  
-               report.write("%s\t%.2f\t%.2f\t%s\n" % (curr_id, self.graph[curr_id].median,
-                                                      self.graph[curr_id].better_median, 
-                                                      self.graph[curr_id].better_id))
-               seq_list.pop(i)
+            if v in id_for_removal:  
+               report.write("%s\t%.2f\t%.2f\t%s\n" % (s.ID, medians[v], better[v][0], seqs[better[v][1]].ID))
                total_removes += 1
-               list_length -= 1
-               i -= 1
-                
-            i += 1
+            else:
+               remaining.append(s)
+        seq_list[:] = remaining
         report.close()
         print ("\t...graph prodeced, total %i sequences removed (%i expected), and %i of them as redundant" % (total_removes, len(id_for_removal.keys()), r))
 
     def print_graph(self, filename):
         print ("Printing graph to the file %s..." % filename)
+        graph = self.graph
         graph_file = open (filename, "w")
-        vertex_list = self.graph.keys()
         already_printed = dict()
-        for i in range(len(vertex_list)):
-            curr_ID = vertex_list[i]
-            graph_file.write("Vertex #%i ID=%s\n" % (i, self.graph[curr_ID].ID))
-            self.graph[curr_ID].print_edges(self.graph, graph_file, 1, already_printed) 
-            
+        number = 0
+        for v in range(graph.vertex_number):
+            if graph.degrees[v] == 0:
+                continue
+            vertex_id = udav_base.Alignment_sequence(self.vertex_seqs[v].name, "").ID # ID is taken from the name (without JalView limits), as for the <Seq_vertex>
+            graph_file.write("Vertex #%i ID=%s\n" % (number, vertex_id))
+            number += 1
+            stack = [(1, iter(graph.get_edges(v)))] # Edges are printed in depth without recursion
+            while len(stack) != 0:
+                (indent, edges) = stack[-1]
+                p = next(edges, None)
+                if p == None:
+                    stack.pop()
+                    continue
+                u = graph.neighbors[p]
+                graph_file.write("-" * indent)
+                if u in already_printed: # Checking if this edge returns to already printed vertex
+                    graph_file.write("Edge '%s' (%.2f) (already printed)\n" % (self.vertex_seqs[u].ID, graph.identities[p]))
+                else:
+                    graph_file.write("Edge '%s' (%.2f)\n" % (self.vertex_seqs[u].ID, graph.identities[p]))
+                    already_printed[u] = True
+                    stack.append((indent + 1, iter(graph.get_edges(u))))
         graph_file.close()
         print ("\t...done!")
 
-    def compare_edge_set(self, graph, id1, id2):
-        identical = False
-        edges1 = sorted(graph[id1].edges)
-        edges2 = sorted(graph[id2].edges)
-        if len(edges1) == len(edges2):
-            identical = True
-            for i in range(len(edges1)): # Popping edge #2 from list of edges #1
-                if edges1[i].ID == id2:
-                   edges1.pop(i)
-                   break
-            for i in range(len(edges2)): # Popping edge #1 from list of edges #2
-                if edges2[i].ID == id1:
-                   edges2.pop(i)
-                   break
-
-            if len(edges1) != len(edges2):
-                identical = False
+class Greedy_clustering:
+    """
+    Sampling by identity for the sets too large for the identity matrix (as in CD-HIT): sequences
+    are taken from the longest one and each is compared only with the representatives of the clusters
+    which share enough k-mers (<word_size> symbols in the same columns) with it. Sequence which is not
+    identical to any of them (or has immunity) becomes representative of a new cluster
+    """
+    def __init__(self, seq_list, max_identity, blocks_string, word_size = 5):
+        self.max_identity = max_identity
+        self.word_size = word_size
+        matrix = udav_base.get_alignment_matrix(seq_list)
+        self.columns = matrix.select_columns(get_construction_range(matrix, blocks_string))
+
+    def get_words(self, row):
+        """
+        Method returns list of the k-mers of the <row> (tuples of the column and bytes) without gaps
+        """
+        gap = b"-"
+        k = self.word_size
+        words = list()
+        for p in range(len(row) - k + 1):
+            word = row[p:p + k]
+            if not gap in word:
+                words.append((p, word))
+        return words
+
+    def proceed_clusters(self, seq_list, report_filename, site_positions):
+        print ("Greedy clustering began...")
+        length = self.columns.length
+        min_count = get_min_equal_count(self.max_identity, length)
+        max_mismatches = length - min_count # Each of them changes at most <word_size> k-mers
+        rows = [self.columns.get_row(i) for i in range(len(seq_list))]
+        encoded = [int.from_bytes(row, "big") for row in rows]
+        order = sorted(range(len(seq_list)), key = lambda i: seq_list[i].sequence.count("-")) # Longest first
+        word_index = dict()    # K-mer to the list of representatives which have it
+        representatives = list()
+        better = dict()        # Sequence to the tuple of identity and its representative
+        for i in order:
+            words = self.get_words(rows[i])
+            required = len(words) - self.word_size * max_mismatches
+            if required > 0:
+                shared = dict()
+                for word in words:
+                    for r in word_index.get(word, ()):
+                        shared[r] = shared.get(r, 0) + 1
+                candidates = sorted([r for r in shared.keys() if shared[r] >= required])
+            else: # K-mers cannot exclude anything
+                candidates = range(len(representatives))
+            for r in candidates: # Representatives of the longer sequences are checked first
+                curr_rep = representatives[r]
+                count = (encoded[i] ^ encoded[curr_rep]).to_bytes(length, "big").count(0)
+                if (count >= min_count) and (not check_immunity(seq_list[i], seq_list[curr_rep], site_positions)):
+                    better[i] = (100 * (float(count) / length), curr_rep)
+                    break
             else:
-                for i in range(len(edges1)):
-                    if edges1[i].ID != edges2[i].ID:
-                        identical = False
-        return identical
\ No newline at end of file
+                for word in words:
+                    if not word in word_index:
+                        word_index[word] = list()
+                    word_index[word].append(len(representatives))
+                representatives.append(i)
+
+        report = open (report_filename, "w")
+        report.write("# File created by the script 'remove_seq_limits.py'\n")
+        report.write("# Sequences with identity more or equlas to this are removed: %s\n" % self.max_identity)
+        report.write("# Initial number of sequences: %i\n" % len(seq_list))
+        report.write("# Removed_id\tMedian_identity\tBetter_identity\tBetter_id\n")
+        remaining = list()
+        for i in range(len(seq_list)):
+            if i in better: # Identity to the representative is given in both columns
+                report.write("%s\t%.2f\t%.2f\t%s\n" % (seq_list[i].ID, better[i][0], better[i][0], seq_list[better[i][1]].ID))
+            else:
+                remaining.append(seq_list[i])
+        report.close()
+        print ("\t...clustering done, %i clusters found, total %i sequences removed" % (len(representatives), len(better)))
+        seq_list[:] = remaining
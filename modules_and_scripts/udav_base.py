@@ -1,6 +1,6 @@
 """
 Module for the very base classes used in all scripts
-------- Version: 1.7.0
+------- Version: 1.12.0
 
 Methods included in this module:
         1) dict read_feature_file (feature_file, feature_type)
@@ -12,12 +12,25 @@ Methods included in this module:
            If <id_only> parameter is True, name of each sequence will be shorteded to its ID.
            If <remove_gaps> is True, gaps will be removed
 
-        3) list read_alignment (input_filename)
+        2a) tuple get_pure_text (seqs, id_only, remove_gaps)
+           Same as <print_pure_sequences> but returns (text, correspond_text) instead of
+           printing them (<correspond_text> is None if <id_only> is False)
+
+        3) list read_alignment (input_filename, define_proper_id, as_matrix)
            Reads alignment into a list of <Sequence> objects from file <input_filename>
+           (or into the <Alignment_matrix> object if <as_matrix> is True)
 
         4) void correspond_back(seqs, correspond_filename)
 
+        4a) list get_featured (sequence_source, correspond_filename, feature_source, feature_type, color_scheme, scheme_only)
+           Returns list of <Featured_sequence> objects for the alignment and features which could be
+           given as file names, Tk Text widgets or lists of strings (see <get_source_lines()>)
+
         5) list proceed_params (parameters)
+
+        6) generator iterate_fasta (source, comment_symbol, chunk_size)
+           Yields (name, sequence) for each record of FASTA-formatted <source> which could be
+           a file name, a Tk Text widget or any iterable of strings
       
 Classes included in this module:
 	1) Sequence (-> Alignment_sequence, -> Annotated_sequence, -> Featured_sequence)
@@ -33,11 +46,12 @@ Classes included in this module:
 	2) Feature
            ~ Variables: ~
            str  name          - name of the feature (e.g., 'TMHMM', 'COG0001' or 'HELIX')
-           list regions       - list of regions (like '1..5')
+           list regions       - list of regions as (begin, end) tuples (like (1, 5))
 
            ~ Methods: ~
-           int get_begin(region)   - returns begin value of given region (e.g. for '1..5' returns 1)
-           int get_end(region)     - returns end value of given region (e.g. for '1..5' returns 5)
+           int get_begin(region)   - returns begin value of given region (e.g. for (1, 5) or '1..5' returns 1)
+           int get_end(region)     - returns end value of given region (e.g. for (1, 5) or '1..5' returns 5)
+           list get_region_strings() - returns regions in the '1..5' form
 
 	3) Featured_sequence (<- Sequence)
            ~ Variables: ~
@@ -59,9 +73,34 @@ Classes included in this module:
            ~ Methods: ~
            void remove_limits (long_names)                      - removes nasty symbols added by JalView
            str correct_organism (correct_orgs, expanded_orgs): - corrects organism name or expands it
+
+	5) Alignment_matrix
+           ~ Variables: ~
+           int       length   - alignment length (L)
+           list      names    - names of the sequences
+           list      ids      - IDs of the sequences
+           bytearray data     - N x L residue codes, row by row
+
+           ~ Methods: ~
+           void add_sequence(name, sequence)  - appends a row (ValueError if the length is wrong)
+           str  get_sequence(i, start, end)   - returns <i>-th sequence (or its part) as a string
+           bytes get_column(j)                - returns all residues of the <j>-th column
+           list get_gap_counts(gap_symbol)    - returns number of gaps in each column
+           Alignment_matrix select_columns(positions) - returns matrix with given columns only
+           list to_sequences(sequence_class)  - returns list of <Alignment_sequence> objects
+           Occupancy_profile get_occupancy(gap_symbol) - returns cached occupancy of the columns
+
+	6) Occupancy_profile
+           ~ Variables: ~
+           list counts        - number of non-gap residues in each column
+           list presence      - the same in % of all sequences
+
+           ~ Methods: ~
+           tuple get_range(presence_threshold) - returns (start, end) of the valid region
 """
 import os, sys
 import re
+import bisect
 
 def print_hash(the_hash, hash_name):
     print ("Printing hash with name '%s'" % hash_name)
@@ -94,8 +133,12 @@ def bubble_sort_keys(dictionary, direct, values = True):
         i += 1
     return keys
               
-def print_pure_sequences(seqs, output_filename, id_only, remove_gaps):
-    output_file = open(output_filename, "w")
+def get_pure_text(seqs, id_only, remove_gaps):
+    """
+    Method returns tuple of (0) fasta text of the sequences from <seqs> and (1) text of the
+    ID to name correspondence if <id_only> is True (None otherwise)
+    """
+    strings = list()
     for s in seqs:
         name = s.name
         sequence = s.sequence
@@ -103,13 +146,21 @@ def print_pure_sequences(seqs, output_filename, id_only, remove_gaps):
             sequence = sequence.replace("-", "")
         if id_only == True:
             name = s.ID
-        output_file.write(">%s\n%s\n\n" %(name, sequence))         
+        strings.append(">%s\n%s\n\n" %(name, sequence))
+    correspond_text = None
+    if id_only == True:
+        correspond_text = "".join(["%s\t%s\n" % (s.ID, s.name) for s in seqs])
+    return ("".join(strings), correspond_text)
+
+def print_pure_sequences(seqs, output_filename, id_only, remove_gaps):
+    (pure_text, correspond_text) = get_pure_text(seqs, id_only, remove_gaps) # FIX: version 1.11.0
+    output_file = open(output_filename, "w")
+    output_file.write(pure_text)
     output_file.close()    
 
-    if id_only == True:
+    if correspond_text != None:
         output_correspond = open(output_filename + ".correspond", "w")
-        for s in seqs:
-            output_correspond.write("%s\t%s\n" % (s.ID, s.name))
+        output_correspond.write(correspond_text)
         output_correspond.close()
 
 def correspond_back(seqs, correspond_filename):
@@ -141,9 +192,11 @@ def proceed_params (parameters):
     return parameters
 
 class Sequence:
+    __slots__ = ("name", "ID", "sequence", "organism") # FIX: version 1.10.0 (no per-instance dictionary)
+
     def __init__(self, name, sequence, define_proper_id = True):
         self.name = name
-        self.ID = name.split(" ", 1)[0]
+        self.ID = sys.intern(name.split(" ", 1)[0])
         self.sequence = sequence
         if (self.ID == self.name) and define_proper_id:
             self.define_id()
@@ -168,43 +221,72 @@ class Sequence:
         return result
 
     def define_id(self):
-        self.ID = self.name.split("|", 1)[0]
+        self.ID = sys.intern(self.name.split("|", 1)[0])
         #id_parts = self.ID.split("_") # In case ID contains cut data (e.g YP_000001_5-45)
         #if len(id_parts) > 2:
         #    self.ID = id_parts[0] + id_parts[1]
-        self.organism = self.name.split("|")[-1]
+        self.organism = sys.intern(self.name.split("|")[-1])
 
 class Feature:
+    """
+    Regions are stored as (begin, end) tuples of integers; FIX: version 1.10.0 (before they
+    were strings like '1..5' parsed on each call of <get_begin()> and <get_end()>)
+    """
+    __slots__ = ("name", "regions")
+
     def __init__(self, single_feature, not_exact = False):
         #[TMHMM] 1..5,9..11,17..25        
-        self.name = single_feature.split(" ")[0].strip("[]")
+        name = single_feature.split(" ")[0].strip("[]")
         if not_exact:
-            self.name = self.name.split("/", 1)[0]
-        self.regions = single_feature.split(" ")[1].split(",")
+            name = name.split("/", 1)[0]
+        self.name = sys.intern(name)
+        self.regions = [parse_region(r) for r in single_feature.split(" ")[1].split(",")]
 
     def get_begin(self, region):
-        fields = region.split("..")
-        if fields[0].isdigit():
-            return int(fields[0])
-        else:
-            print ("WARNING: feature region '%s'" % region)
-            return -1             
+        if isinstance(region, str): # Compatibility with '1..5' regions
+            region = parse_region(region)
+        return region[0]
             
     def get_end(self, region):
-        fields = region.split("..")
-        if len(fields) == 1:
-            return int(fields[0])
-        else:
-            return int(fields[1])      
+        if isinstance(region, str): # Compatibility with '1..5' regions
+            region = parse_region(region)
+        return region[1]
+
+    def get_region_strings(self):
+        """
+        Method returns list of regions in the '1..5' form
+        """
+        return ["%i..%i" % r for r in self.regions]
 
     def get_length(self):
         length = 0
-        for r in self.regions:
-            fields = r.split("..")
-            length += int(fields[1]) - int(fields[0]) + 1
+        for (begin, end) in self.regions:
+            length += end - begin + 1
         return length
+
+def parse_region(region):
+    """
+    Method returns (begin, end) tuple of integers for the <region> string like '1..5'
+    (or '5' for a single position); non-digit begin is reported and returned as -1
+    """
+    fields = region.split("..")
+    begin = -1
+    if fields[0].isdigit():
+        begin = int(fields[0])
+    else:
+        print ("WARNING: feature region '%s'" % region)
+    if len(fields) == 1:
+        return (begin, begin)
+    end = -1
+    if fields[1].isdigit():
+        end = int(fields[1])
+    else:
+        print ("WARNING: feature region '%s'" % region)
+    return (begin, end)
                                 
 class Featured_sequence(Sequence):
+    __slots__ = ("features",)
+
     def __init__(self, name, sequence, features):
         Sequence.__init__(self, name, sequence)
         self.features = features
@@ -258,7 +340,7 @@ class Featured_sequence(Sequence):
                             start = start + 1
                         if end >= i + 1:
                             end = end + 1
-                        self.features[f].regions[r] = "%i..%i" % (start, end)
+                        self.features[f].regions[r] = (start, end)
         #print ("Correcting features in sequence %s DONE" % self.ID)
 
     def get_feature_string(self):
@@ -331,10 +413,12 @@ class Featured_sequence(Sequence):
 
                 if (start < best_start) or (end > best_end):
                     n += 1
-                    self.features[0].regions[r] = "%i..%i" % (best_start, best_end)
+                    self.features[0].regions[r] = (best_start, best_end)
             #print ("Total %i cases fixed for sequence %s" % (n, self.ID))
 
 class Alignment_sequence(Sequence):
+    __slots__ = ()
+
     def __init__(self, name, sequence, define_proper_id = True):
         Sequence.__init__(self, name, sequence, define_proper_id)
                 
@@ -389,11 +473,192 @@ class Alignment_sequence(Sequence):
             
             self.name = new_name
 
+class Alignment_matrix:
+    """
+    Columnar model of a multiple alignment: residues of all N sequences are kept in a single
+    contiguous <bytearray> of N x L one-byte codes (row-major), while names and IDs are kept
+    in separate lists. Column <j> is obtained as a strided slice <data[j::length]>, so all
+    per-column counts are done in C instead of a Python loop over <Sequence> objects.
+    Indexing and iteration return <Alignment_sequence> objects built on the fly, so code
+    written for the list of sequences can read the matrix as well (but not modify it)
+    """
+    encoding = "latin-1"                     # One byte per residue for symbols up to U+00FF
+    encoding_errors = "replace"              # Symbols above U+00FF are stored as '?' (row length is kept)
+
+    def __init__(self, length = None, define_proper_id = True):
+        self.length = length                 # Alignment length L (defined by the first sequence if None)
+        self.names = list()                  # Full names of the sequences (without '>')
+        self.ids = list()                    # IDs of the sequences (as in <Sequence> class)
+        self.data = bytearray()              # N x L residue codes
+        self.define_proper_id = define_proper_id
+        self.occupancy = None                # Cached <Occupancy_profile> (reset when rows are added)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        seq = Alignment_sequence(self.names[i], self.get_sequence(i), self.define_proper_id)
+        seq.ID = self.ids[i]
+        return seq
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def add_sequence(self, name, sequence):
+        """
+        Method appends a row with <name> and <sequence> to the matrix; ValueError is raised
+        if length of the <sequence> differs from the alignment length
+        """
+        if self.length == None:
+            self.length = len(sequence)
+        if len(sequence) != self.length:
+            raise ValueError("FATAL ERROR at sequence %s: wrong length %i, expected: %i" % (get_sequence_id(name, self.define_proper_id), len(sequence), self.length))
+        self.names.append(name)
+        self.ids.append(sys.intern(get_sequence_id(name, self.define_proper_id)))
+        self.data.extend(sequence.encode(self.encoding, self.encoding_errors))
+        self.occupancy = None
+
+    def get_row(self, i, start = 0, end = None):
+        """
+        Method returns <bytes> of the <i>-th sequence between <start> and <end>
+        """
+        if end == None:
+            end = self.length
+        offset = i * self.length
+        return bytes(self.data[offset + start:offset + end])
+
+    def get_sequence(self, i, start = 0, end = None):
+        return self.get_row(i, start, end).decode(self.encoding)
+
+    def get_column(self, j):
+        """
+        Method returns <bytes> with all residues of the <j>-th column
+        """
+        return bytes(self.data[j::self.length])
+
+    def get_gap_counts(self, gap_symbol = "-"):
+        """
+        Method returns list with the number of <gap_symbol> in each column
+        """
+        gap_code = gap_symbol.encode(self.encoding)
+        length = self.length
+        data = self.data
+        return [data[j::length].count(gap_code) for j in range(length)]
+
+    def get_occupancy(self, gap_symbol = "-"):
+        """
+        Method returns <Occupancy_profile> of this matrix; it is calculated once and cached
+        """
+        if (self.occupancy == None) or (self.occupancy.gap_symbol != gap_symbol):
+            gap_counts = self.get_gap_counts(gap_symbol)
+            counts = [len(self) - g for g in gap_counts]
+            self.occupancy = Occupancy_profile(counts, len(self), gap_symbol)
+        return self.occupancy
+
+    def select_columns(self, positions):
+        """
+        Method returns new <Alignment_matrix> with only given <positions> (0-based) of
+        this one; each column is moved with a single strided assignment
+        """
+        result = Alignment_matrix(len(positions), self.define_proper_id)
+        result.names = list(self.names)
+        result.ids = list(self.ids)
+        result.data = bytearray(len(self) * len(positions))
+        new_length = len(positions)
+        for k in range(new_length):
+            result.data[k::new_length] = self.data[positions[k]::self.length]
+        return result
+
+    def to_sequences(self, sequence_class = None):
+        """
+        Method returns list of <sequence_class> objects (<Alignment_sequence> by default)
+        for the code which has to modify sequences
+        """
+        if sequence_class == None:
+            sequence_class = Alignment_sequence
+        seqs = list()
+        for i in range(len(self)):
+            seqs.append(sequence_class(self.names[i], self.get_sequence(i)))
+            seqs[-1].ID = self.ids[i]
+        return seqs
+
+class Occupancy_profile:
+    """
+    Number of non-gap residues in each column of an alignment. Running maxima of the
+    presence (in %) from both sides are kept, so the valid range for any presence
+    threshold is found by a binary search instead of the scan of the alignment
+    """
+    def __init__(self, counts, seq_number, gap_symbol = "-"):
+        self.counts = counts                 # Number of non-gap residues in each column
+        self.seq_number = seq_number         # Number of sequences in the alignment
+        self.gap_symbol = gap_symbol
+        self.presence = [100*float(c)/float(seq_number) for c in counts] # Presence (%) in each column
+        self.left_max = list()               # left_max[i] = max(presence[:i + 1]), non-decreasing
+        self.right_max = list()              # right_max[k] = max(presence[L - 1 - k:]), non-decreasing
+        curr_max = -1.0
+        for value in self.presence:
+            curr_max = max(curr_max, value)
+            self.left_max.append(curr_max)
+        curr_max = -1.0
+        for value in reversed(self.presence):
+            curr_max = max(curr_max, value)
+            self.right_max.append(curr_max)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def get_range(self, presence_threshold):
+        """
+        Method returns (<start>, <end>) of the region where first and last columns have more
+        than <presence_threshold> % of residues; if there is no such column, (0, L - 1) is returned
+        """
+        length = len(self.counts)
+        start = 0
+        i = bisect.bisect_right(self.left_max, presence_threshold)
+        if i < length:
+            start = i
+        end = length - 1
+        k = bisect.bisect_right(self.right_max, presence_threshold)
+        if k < length:
+            end = length - k
+        return (start, end)
+
+def get_sequence_id(name, define_proper_id = True):
+    """
+    Method returns ID for the sequence <name> the same way as <Sequence> class does
+    """
+    ID = name.split(" ", 1)[0]
+    if (ID == name) and define_proper_id:
+        ID = name.split("|", 1)[0]
+    return ID
+
+def get_alignment_matrix(seqs, define_proper_id = True):
+    """
+    Method returns <Alignment_matrix> built from the list of <Sequence> objects <seqs>;
+    if <seqs> is already a matrix, it is returned as is
+    """
+    if isinstance(seqs, Alignment_matrix):
+        return seqs
+    matrix = Alignment_matrix(None, define_proper_id)
+    for s in seqs:
+        matrix.names.append(s.name)
+        matrix.ids.append(s.ID)
+        if matrix.length == None:
+            matrix.length = len(s.sequence)
+        if len(s.sequence) != matrix.length:
+            raise ValueError("FATAL ERROR at sequence %s: wrong length %i, expected: %i" % (s.ID, len(s.sequence), matrix.length))
+        matrix.data.extend(s.sequence.encode(Alignment_matrix.encoding, Alignment_matrix.encoding_errors))
+    return matrix
+
 def read_feature_file(feature_filename, feature_type, color_scheme, scheme_only, not_exact = False):
     #YP_00001	[TMHMM] 1..5,9..11,17..25	[PF000001] 5..67
     id_to_features = dict()
-    feature_file = open(feature_filename, "r")
-    for string in feature_file:
+    for string in get_source_lines(feature_filename): # FIX: version 1.12.0 (file name, Tk Text widget or strings)
         string = string.strip()
         if len(string) == 0:
             continue
@@ -410,22 +675,66 @@ def read_feature_file(feature_filename, feature_type, color_scheme, scheme_only,
                 if not curr_features[-1].name in feature_type:
                     feature_type[curr_features[-1].name] = True
         id_to_features[curr_id] = curr_features
-    feature_file.close()
     return id_to_features
 
-def read_alignment(input_filename, define_proper_id = True):
-    seq_list = list()
-
-    input_file = open (input_filename, "r")      #------------------------ Reading alignment
-    for string in input_file:
+def get_source_lines(source, chunk_size = 10000):
+    """
+    Method yields lines of the <source> which could be a name of the file, a Tk Text
+    widget (read by <chunk_size> lines at once) or any iterable of strings
+    """
+    if isinstance(source, str):
+        with open(source, "r") as source_file:
+            for string in source_file:
+                yield string
+    elif hasattr(source, "get") and hasattr(source, "index"): # Tk Text widget
+        last_line = int(source.index("end").split(".")[0])
+        for first in range(1, last_line + 1, chunk_size):
+            for string in source.get("%i.0" % first, "%i.0" % (first + chunk_size)).split("\n"):
+                yield string
+    else:
+        for string in source:
+            yield string
+
+def iterate_fasta(source, comment_symbol = None, chunk_size = 10000):
+    """
+    Method yields (<name>, <sequence>) tuples for each record of the FASTA-formatted <source>
+    (see <get_source_lines()> for possible sources); <name> is the description line without
+    leading '>'. Lines of a record are collected into a list and joined once, so
+    long wrapped sequences are read in linear time. Lines starting with <comment_symbol>
+    (if given) and strings before the first description line are ignored
+    """
+    name = None
+    parts = list()
+    for string in get_source_lines(source, chunk_size):
         string = string.strip()
-        if len(string) > 0:
-            if string[0] == ">":
-                string = string.strip(">")
-                seq_list.append(Alignment_sequence(string, "", define_proper_id))
-            else:
-                seq_list[-1].sequence += string
-    input_file.close()
+        if len(string) == 0:
+            continue
+        if (comment_symbol != None) and string.startswith(comment_symbol):
+            continue
+        if string[0] == ">":
+            if name != None:
+                yield (name, "".join(parts))
+            name = string[1:]
+            parts = list()
+        elif name != None:
+            parts.append(string)
+    if name != None:
+        yield (name, "".join(parts))
+
+def read_alignment(input_filename, define_proper_id = True, as_matrix = False):
+    if as_matrix: # FIX: version 1.9.0 (matrix is filled while reading, sequences are not stored)
+        matrix = Alignment_matrix(None, define_proper_id)
+        try:
+            for (name, sequence) in iterate_fasta(input_filename):
+                matrix.add_sequence(name.strip(">"), sequence)
+        except ValueError as error:
+            print (error)
+            return str(error)
+        return matrix
+
+    seq_list = list()
+    for (name, sequence) in iterate_fasta(input_filename): #------------- Reading alignment
+        seq_list.append(Alignment_sequence(name.strip(">"), sequence, define_proper_id))
 
     alignment_length = len(seq_list[0].sequence) #------------------------ Checking alignment
     for p in seq_list:
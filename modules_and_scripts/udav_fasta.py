@@ -5,7 +5,7 @@ Currently the following formats are accepted: My_Ref, My (v1.3), Uniprot (v1.4),
                                               NCBI (v.2.4), Olesya (v.2.10), COGcollator (v.2.11),
                                               German (v.2.12)
 Now exceptions are considered: FIX: version 2.12
-------- Version: 2.25
+------- Version: 2.28
 Methods included in this module:
         1) dict unredun_org (input_filename, output_filename)
            a)  Reads <input_filename> which is expected to be *.org file produces with the 
@@ -26,6 +26,10 @@ Methods included in this module:
         4) list read_fasta (filename, sample_filename, occurrence_filename, protein_occur, 
                             verbose_limit, big_file, required_id, required_org, min_len, max_len,
                             format = URef):
+        5) list read_fasta_indexed (bank_filename, required_id, format, index, exact)
+           Same as <read_fasta> with <required_id>, but only required records are read
+           with the help of the <Fasta_index>
+        6) dict get_isoform_data (bank_filename, req_proteins, id_type, group_log_filename, use_index)
 
 Classes included in this module:
 	1) Annotated_sequence (<- Sequence)
@@ -58,10 +62,21 @@ Classes included in this module:
            int  protein_num
            int  records_num
            str  full_data
+
+        3) Fasta_index
+           ~ Variables: ~
+           str  bank_filename
+           str  index_filename
+           dict offsets       - ID variant to the list of (offset, length) of records in the bank
+
+           ~ Methods: ~
+           list get_offsets(ids) - returns sorted (offset, length) of records found by <ids>
+           generator fetch(ids)  - yields <Annotated_sequence> objects for records found by <ids>
 """
 import re, sys, os
 import copy
-from udav_base import Sequence
+import mmap
+from udav_base import Sequence, iterate_fasta
 
 class FastaException(BaseException):   
     def __init__(self):
@@ -83,14 +98,18 @@ def get_id (seq, id_type):
     return result
     
 class Annotated_sequence(Sequence):
+    #FIX: version 2.27 (no per-instance dictionary; IDs and organism names are interned)
+    __slots__ = ("gi", "protein_id", "locus", "product", "gene_begin", "gene_end", "gene_direction",
+                 "source_record", "source_name", "taxonomy", "operon", "position", "COG")
+
     def __init__(self, gi, protein_id, locus, product, organism, gene_begin, gene_end,
                        gene_direction, taxonomy, source_record, full_fasta, source_name = None):
         Sequence.__init__(self, full_fasta, "")
-        self.gi = gi
-        self.protein_id = protein_id
-        self.locus = locus
+        self.gi = sys.intern(gi)
+        self.protein_id = sys.intern(protein_id)
+        self.locus = sys.intern(locus)
         self.product = product
-        self.organism = organism
+        self.organism = sys.intern(organism)
         self.gene_begin = int(gene_begin)
         self.gene_end = int(gene_end)
         self.gene_direction = int(gene_direction)
@@ -567,7 +586,6 @@ def read_fasta (filename, sample_filename, occurrence_filename, protein_occur, v
     else:
         if not (verbose_limit == 100500): print ("No sample (or rejection) file will be created!")
 
-    fasta_file = open(filename, "r")
     seqs = list()
     big_file_seqs = list()
     take_seq = False
@@ -575,101 +593,97 @@ def read_fasta (filename, sample_filename, occurrence_filename, protein_occur, v
     duplicate = dict()
     v = 0
     n = 0 
-    for string in fasta_file:
-        string = string.strip()
-        if len(string) == 0:
-            continue
-        if string[0] == ">": # Description string
-            v += 1
-            n += 1
-            if v > verbose_limit:
-                if not (verbose_limit == 100500): print ("Proceeding %i sequence..." % n)
-                v = 0                
-            take_seq = True
-            curr_seq = get_sequence_data(string, format)            
-            #-------------------------------------- Requirement check ---------------------              
-            if required_id != None:
-                #FIX (version 1.1): also GI is checked
-                #FIX (version 1.6): part of standart fasta-format name (before space) is checked
-                #FIX (version 2.3): now values in <required_id> list are changed to "False" if found                 
-                #FIX (version 2.15): locus is checked
-                if (not curr_seq.protein_id in required_id) and (not curr_seq.gi in required_id) and (not curr_seq.ID in required_id) and (not curr_seq.locus in required_id):
-                    take_seq = False
-                if take_seq == True: # This protein is found in the required list by one of its IDs                   
-                    unique_attributes = ["protein_id", "gi", "locus"]
-                    for attr in unique_attributes:
-                        attr_value = getattr(curr_seq, attr)
-                        if attr_value in required_id: #FIX (version 2.15): now protein_id and locus could work together with COGs as well as gi\
-                            if type(required_id[attr_value]) != type(True): # COG data is available here
-                                curr_seq.COG = required_id[attr_value]
-                            found[attr_value] = True                            
-                    if curr_seq.ID in required_id:
-                        found[curr_seq.ID] = True
-
-                    if curr_seq.protein_id != "Unk": #-------------------- DUPLICATES
-                        if curr_seq.COG == None: #FIX (version 2.15): not in the COG mode
-                            if not curr_seq.protein_id in duplicate:
-                                duplicate[curr_seq.protein_id] = list()
-                            duplicate[curr_seq.protein_id].append(curr_seq)
-            else:
-                #FIX (version 2.20): record data is added to organism name, if present (... @ XXX)
-                found_data = curr_seq.organism
-                if curr_seq.source_record.count("@") == 1:
-                    assembly_data = curr_seq.source_record.split(" @ ", 1)[1]
-                    found_data += ("@" + assembly_data)
-                found[curr_seq.ID] = found_data
-                found[curr_seq.gi] = found_data
-                found[curr_seq.protein_id] = found_data
+    for (header, sequence) in iterate_fasta(filename): #FIX: version 2.26 (record strings are joined once)
+        string = ">" + header
+        v += 1
+        n += 1
+        if v > verbose_limit:
+            if not (verbose_limit == 100500): print ("Proceeding %i sequence..." % n)
+            v = 0                
+        take_seq = True
+        curr_seq = get_sequence_data(string, format)            
+        #-------------------------------------- Requirement check ---------------------              
+        if required_id != None:
+            #FIX (version 1.1): also GI is checked
+            #FIX (version 1.6): part of standart fasta-format name (before space) is checked
+            #FIX (version 2.3): now values in <required_id> list are changed to "False" if found                 
+            #FIX (version 2.15): locus is checked
+            if (not curr_seq.protein_id in required_id) and (not curr_seq.gi in required_id) and (not curr_seq.ID in required_id) and (not curr_seq.locus in required_id):
+                take_seq = False
+            if take_seq == True: # This protein is found in the required list by one of its IDs                   
+                unique_attributes = ["protein_id", "gi", "locus"]
+                for attr in unique_attributes:
+                    attr_value = getattr(curr_seq, attr)
+                    if attr_value in required_id: #FIX (version 2.15): now protein_id and locus could work together with COGs as well as gi\
+                        if type(required_id[attr_value]) != type(True): # COG data is available here
+                            curr_seq.COG = required_id[attr_value]
+                        found[attr_value] = True                            
+                if curr_seq.ID in required_id:
+                    found[curr_seq.ID] = True
+
+                if curr_seq.protein_id != "Unk": #-------------------- DUPLICATES
+                    if curr_seq.COG == None: #FIX (version 2.15): not in the COG mode
+                        if not curr_seq.protein_id in duplicate:
+                            duplicate[curr_seq.protein_id] = list()
+                        duplicate[curr_seq.protein_id].append(curr_seq)
+        else:
+            #FIX (version 2.20): record data is added to organism name, if present (... @ XXX)
+            found_data = curr_seq.organism
+            if curr_seq.source_record.count("@") == 1:
+                assembly_data = curr_seq.source_record.split(" @ ", 1)[1]
+                found_data += ("@" + assembly_data)
+            found[curr_seq.ID] = found_data
+            found[curr_seq.gi] = found_data
+            found[curr_seq.protein_id] = found_data
           
-            if required_org != None:
-                if not curr_seq.organism in required_org:
-                    take_seq = False
-                    print (" Sequence is rejected: '%s'; org is wrong: '%s'" % (curr_seq.protein_id, curr_seq.organism))
-            #if curr_seq.source_record == "na" and format == "PDB": # This is not a protein!
-            #    take_seq = False 
-            #------------------------------------------------------------------------------  
-            if take_seq:                
-                if directions != None:
-                    #curr_interest = curr_seq.source_record
-                    curr_interest = curr_seq.organism
-                    if not curr_interest in directions:
-                        directions[curr_interest] = [curr_seq.organism, 0, 0]
+        if required_org != None:
+            if not curr_seq.organism in required_org:
+                take_seq = False
+                print (" Sequence is rejected: '%s'; org is wrong: '%s'" % (curr_seq.protein_id, curr_seq.organism))
+        #if curr_seq.source_record == "na" and format == "PDB": # This is not a protein!
+        #    take_seq = False 
+        #------------------------------------------------------------------------------  
+        if take_seq:                
+            if directions != None:
+                #curr_interest = curr_seq.source_record
+                curr_interest = curr_seq.organism
+                if not curr_interest in directions:
+                    directions[curr_interest] = [curr_seq.organism, 0, 0]
             
-                    directions[curr_interest][0] = curr_seq.organism
-                    if curr_seq.gene_direction == 1:
-                        directions[curr_interest][1] += 1
-                    else:
-                        directions[curr_interest][2] += 1
-
-                if len(seqs) != 0:
-                    if seqs[-1].length_in_range(min_len, max_len):                    
-                        if sample_filename != None:
-                            table_data_file.write("%s\t%s\t%s\t%s\t%s\t%s\n" % (seqs[-1].protein_id, seqs[-1].gi, seqs[-1].organism, len(seqs[-1].sequence), seqs[-1].source_name, seqs[-1].locus))
-                            curr_mode = "normal"
-                            if seqs[-1].COG != None: # COG data is available here
-                                curr_mode = "cog"
-                            seqs[-1].print_fasta(sample_file)
-                            seqs[-1].print_short(type_of_id, short_file, None, curr_mode)
-                            id_file.write("%s\n" % get_id(seqs[-1], type_of_id)) #FIX: version 2.15 (locus, GI or ID depending on <type_of_id>)
-                        #-------------------------------------- Occurence -----------------------------
-                        curr_value = getattr(seqs[-1], attr_for_protein_occur)
-                        if curr_value in protein_occur.keys():
-                            protein_occur[curr_value] += 1
-                        else:
-                            protein_occur[curr_value] = 1
-                        #------------------------------------------------------------------------------
-                        if big_file: # This should be operated without usage of memory
-                            if required_id != None: #FIX (version 2.19): required sequences are stored
-                                big_file_seqs.append(seqs[-1])
-                            seqs.pop()
+                directions[curr_interest][0] = curr_seq.organism
+                if curr_seq.gene_direction == 1:
+                    directions[curr_interest][1] += 1
+                else:
+                    directions[curr_interest][2] += 1
+
+            if len(seqs) != 0:
+                if seqs[-1].length_in_range(min_len, max_len):                    
+                    if sample_filename != None:
+                        table_data_file.write("%s\t%s\t%s\t%s\t%s\t%s\n" % (seqs[-1].protein_id, seqs[-1].gi, seqs[-1].organism, len(seqs[-1].sequence), seqs[-1].source_name, seqs[-1].locus))
+                        curr_mode = "normal"
+                        if seqs[-1].COG != None: # COG data is available here
+                            curr_mode = "cog"
+                        seqs[-1].print_fasta(sample_file)
+                        seqs[-1].print_short(type_of_id, short_file, None, curr_mode)
+                        id_file.write("%s\n" % get_id(seqs[-1], type_of_id)) #FIX: version 2.15 (locus, GI or ID depending on <type_of_id>)
+                    #-------------------------------------- Occurence -----------------------------
+                    curr_value = getattr(seqs[-1], attr_for_protein_occur)
+                    if curr_value in protein_occur.keys():
+                        protein_occur[curr_value] += 1
                     else:
-                        if sample_filename != None: reject_file.write("%s\t%i\t%s\n" % (seqs[-1].protein_id, len(seqs[-1].sequence), seqs[-1].product))
-                        seqs.pop()                    
-                seqs.append(curr_seq)
-
-        else: # Sequence string
-            if take_seq:                
-                seqs[-1].sequence += string                
+                        protein_occur[curr_value] = 1
+                    #------------------------------------------------------------------------------
+                    if big_file: # This should be operated without usage of memory
+                        if required_id != None: #FIX (version 2.19): required sequences are stored
+                            big_file_seqs.append(seqs[-1])
+                        seqs.pop()
+                else:
+                    if sample_filename != None: reject_file.write("%s\t%i\t%s\n" % (seqs[-1].protein_id, len(seqs[-1].sequence), seqs[-1].product))
+                    seqs.pop()                    
+            seqs.append(curr_seq)
+
+        if take_seq:
+            seqs[-1].sequence = sequence
     if len(seqs) != 0: # Printing the last sequence into the sample
         if seqs[-1].length_in_range(min_len, max_len):                    
             if sample_filename != None:                
@@ -696,7 +710,6 @@ def read_fasta (filename, sample_filename, occurrence_filename, protein_occur, v
             seqs.pop()
     if not (verbose_limit == 100500): print ("Total records in bank found: %i" % n)
         
-    fasta_file.close()
     if sample_filename != None:
         sample_file.close() 
         reject_file.close()
@@ -738,17 +751,172 @@ def read_fasta (filename, sample_filename, occurrence_filename, protein_occur, v
 
     return (seqs, found)
 
-def get_isoform_data(bank_filename, req_proteins = None, id_type = "GI", group_log_filename = None):
+class Fasta_index:
+    """
+    On-disk offset index of the FASTA bank (like 'samtools faidx'). For each record
+    every ID variant understood by <read_fasta()> (protein_id with and without version,
+    gi, locus and ID) is linked with the byte offset and length of the record, so
+    required records are read through <mmap> without the scan of the whole bank.
+    The index is saved to <bank_filename>.udx and rebuilt if the bank was changed
+    (size or modification time differ) or the other <format> is requested
+    FIX: version 2.28
+    """
+    header_tag = "#udav_fasta_index"
+
+    def __init__(self, bank_filename, format = "URef", index_filename = None, rebuild = False):
+        self.bank_filename = os.path.abspath(bank_filename)
+        self.format = format
+        self.index_filename = index_filename  # File with the index (<bank_filename>.udx by default)
+        if self.index_filename == None:
+            self.index_filename = self.bank_filename + ".udx"
+        self.offsets = dict()                 # Hash of ID variant to the list of (offset, length) tuples
+        if rebuild or not self.load():
+            self.build()
+
+    def get_signature(self):
+        bank_stat = os.stat(self.bank_filename)
+        return "%s\t%s\t%i\t%i" % (self.header_tag, self.format, bank_stat.st_size, bank_stat.st_mtime_ns)
+
+    def add_record(self, record):
+        for curr_key in record[2:]:
+            if not curr_key in self.offsets:
+                self.offsets[curr_key] = list()
+            self.offsets[curr_key].append((record[0], record[1]))
+
+    def load(self):
+        """
+        Method reads the index file; returns False if it is missing or outdated
+        """
+        if not os.path.isfile(self.index_filename):
+            return False
+        index_file = open(self.index_filename, "r")
+        if index_file.readline().rstrip("\n") != self.get_signature():
+            index_file.close()
+            print ("Index %s is outdated and will be rebuilt" % self.index_filename)
+            return False
+        for string in index_file:
+            fields = string.rstrip("\n").split("\t")
+            self.add_record([int(fields[0]), int(fields[1])] + fields[2:])
+        index_file.close()
+        return True
+
+    def build(self):
+        print ("Building index of the fasta bank %s..." % self.bank_filename)
+        records = list() # List of [offset, length, ID variant 1, ...]
+        offset = 0
+        bank_file = open(self.bank_filename, "rb")
+        for string in bank_file:
+            if string.startswith(b">"):
+                if len(records) != 0:
+                    records[-1][1] = offset - records[-1][0]
+                curr_seq = get_sequence_data(string.decode("utf-8", "replace").strip(), self.format)
+                records.append([offset, None] + get_id_variants(curr_seq))
+            offset += len(string)
+        bank_file.close()
+        if len(records) != 0:
+            records[-1][1] = offset - records[-1][0]
+
+        for record in records:
+            self.add_record(record)
+        try:
+            index_file = open(self.index_filename, "w")
+            index_file.write(self.get_signature() + "\n")
+            for record in records:
+                index_file.write("%i\t%i\t%s\n" % (record[0], record[1], "\t".join(record[2:])))
+            index_file.close()
+            print ("\t...%i records indexed into %s" % (len(records), self.index_filename))
+        except OSError:
+            print ("WARNING: index could not be saved to %s, it will be kept in memory only" % self.index_filename)
+
+    def get_offsets(self, ids):
+        """
+        Method returns sorted list of unique (offset, length) of the records which have any
+        of the <ids> as one of their ID variants
+        """
+        found = set()
+        for curr_id in ids:
+            if curr_id in self.offsets:
+                found.update(self.offsets[curr_id])
+        return sorted(found)
+
+    def fetch(self, ids):
+        """
+        Method yields <Annotated_sequence> objects for all records found by <ids> (in the
+        order of the bank file)
+        """
+        offsets = self.get_offsets(ids)
+        if len(offsets) == 0:
+            return
+        bank_file = open(self.bank_filename, "rb")
+        bank_map = mmap.mmap(bank_file.fileno(), 0, access = mmap.ACCESS_READ)
+        try:
+            for (offset, length) in offsets:
+                record_text = bank_map[offset:offset + length].decode("utf-8", "replace")
+                for (header, sequence) in iterate_fasta(record_text.split("\n")):
+                    curr_seq = get_sequence_data(">" + header, self.format)
+                    curr_seq.sequence = sequence
+                    yield curr_seq
+        finally:
+            bank_map.close()
+            bank_file.close()
+
+def get_id_variants(seq):
+    """
+    Method returns list of unique IDs by which <seq> could be requested (see <Fasta_index>)
+    """
+    variants = [seq.protein_id, seq.gi, seq.locus, seq.ID, seq.protein_id.split(".", 1)[0]]
+    proper_id = re.search("\w+_*\d+\.\d+", seq.protein_id)
+    if proper_id != None:
+        variants.append(proper_id.group(0).split(".", 1)[0])
+    result = list()
+    for v in variants:
+        if (v != "Unk") and (len(v) != 0) and (not "\t" in v) and (not v in result):
+            result.append(v)
+    return result
+
+def read_fasta_indexed(bank_filename, required_id, format = "URef", index = None, exact = True):
+    """
+    Method returns (<seqs>, <found>) for the records of <bank_filename> required by their
+    protein_id, gi, ID or locus in <required_id> dictionary, as <read_fasta()> does, but only
+    required records are read using the <Fasta_index> (given or obtained for the bank).
+    If <exact> is False, records found by other ID variants (e.g. protein_id without
+    version) are also returned
+    FIX: version 2.28
+    """
+    if index == None:
+        index = Fasta_index(bank_filename, format)
+    seqs = list()
+    found = dict()
+    for curr_seq in index.fetch(required_id.keys()):
+        if exact and (not curr_seq.protein_id in required_id) and (not curr_seq.gi in required_id) and (not curr_seq.ID in required_id) and (not curr_seq.locus in required_id):
+            continue # Found by other ID variant only
+        for attr in ["protein_id", "gi", "locus"]:
+            attr_value = getattr(curr_seq, attr)
+            if attr_value in required_id:
+                if type(required_id[attr_value]) != type(True): # COG data is available here
+                    curr_seq.COG = required_id[attr_value]
+                found[attr_value] = True
+        if curr_seq.ID in required_id:
+            found[curr_seq.ID] = True
+        seqs.append(curr_seq)
+    print ("Total %i required records read from the bank %s" % (len(seqs), bank_filename))
+    return (seqs, found)
+
+def get_isoform_data(bank_filename, req_proteins = None, id_type = "GI", group_log_filename = None, use_index = True):
     """
     Method reads file at <bank_filename> and creates a dictionary with protein IDs
     (as specified by the <id_type>: 'GI' for gi, 'ID' for protein_id and 'Basic' for
     standart sequence ID (e.g. for NCBI format sequences it would be something like
     gi|123456789|ref|YP_0000000.1)
-    Only proteins specified in the <req_proteins> dictionary will be obtained from file.
+    Only proteins specified in the <req_proteins> dictionary will be obtained from file
+    (using the <Fasta_index> of the bank if <use_index> is True).
     If <group_log_filename> is given, it will be created and filled with the log information.
     """
     isoform = dict()
-    (proteins, found) = read_fasta (bank_filename, None, None, dict(), 10000, False, req_proteins, None, None, None, "URef", None, None)
+    if (req_proteins != None) and use_index: #FIX: version 2.28 (only required records are read)
+        (proteins, found) = read_fasta_indexed(bank_filename, req_proteins, "URef")
+    else:
+        (proteins, found) = read_fasta (bank_filename, None, None, dict(), 10000, False, req_proteins, None, None, None, "URef", None, None)
 
     groups = list() # List of [int begin, int end, str source, str org, list protein_IDs, int num]
     for p in proteins:
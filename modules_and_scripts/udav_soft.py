@@ -8,7 +8,7 @@ software blocks:
     (5) COG database
     (6) Genbank assembly and Prodigal
     (7) BLAST (from <get_operon.py>)
-------- Version: 3.3
+------- Version: 3.7
 """
 import os, sys, re
 import math
@@ -16,6 +16,16 @@ import math
 #------------------------------------------------------------------------------
 #                            (1) Misc methods
 #------------------------------------------------------------------------------
+def open_input(source):
+    """
+    Method returns opened file if <source> is a file name; otherwise <source> is expected
+    to be a file-like object already (e.g. io.StringIO with the text of the file) and is
+    returned as is
+    """
+    if isinstance(source, str):
+        return open(source, "r")
+    return source
+
 def read_plain_list(list_filename):
     """
     Method reads plain list inside the <list_filename> and returns it as a dictionary.
@@ -220,7 +230,7 @@ def read_TMHMM_output(input_filename, min_helix_num = 1):
 
 def read_DeepTMHMM_output(input_filename, min_TM_num = 1):
     """
-    Reads TMRs.gff3 output of the DeepTMHMM.
+    Reads TMRs.gff3 output of the DeepTMHMM (file name or file-like object).
     Returns: dictionary connecting IDs of proteins with enought TM elements to
     the corresponding feature strings. 'Enought TM elements' means it has more than
     <min_TM_num> helices or beta-strands.
@@ -228,7 +238,7 @@ def read_DeepTMHMM_output(input_filename, min_TM_num = 1):
     id_to_list_of_TM = dict()
     id_to_list_of_strings = dict()
     id_order = list()
-    input_file = open(input_filename)
+    input_file = open_input(input_filename) #FIX: version 3.5
     for string in input_file:
         string = string.strip()
         if len(string) == 0:
@@ -270,94 +280,76 @@ def read_DeepTMHMM_output(input_filename, min_TM_num = 1):
 #                            (3) Pfam files
 #------------------------------------------------------------------------------
 class Pfam_domain:
+    __slots__ = ("name", "ac", "description")
+
     def __init__(self, name, ac, description):
         self.name = name
         self.ac = ac
         self.description = description
 
-def get_values(field):
-    values = field.split("..")
-    begin = int(values[0])
-    end = int(values[1])
-    evalue = float(values[2])
-    score = float(values[3])
-    try:
-        hmm_begin = int(values[4])
-        hmm_end = int(values[5])
-    except ValueError:
-        hmm_begin = 1
-        hmm_end = 100500
-    return (begin, end, evalue, score, hmm_begin, hmm_end)
+class Pfam_hit:
+    """
+    Single hit of a domain in a protein read from the HMMer domtable (FIX: version 3.7: hits are
+    kept as typed records instead of the 'begin..end..evalue..score..hmm_begin..hmm_end..cov' strings)
+    """
+    __slots__ = ("begin", "end", "evalue", "score", "hmm_begin", "hmm_end", "hmm_covered")
+
+    def __init__(self, begin, end, evalue, score, hmm_begin, hmm_end, hmm_covered = None):
+        self.begin = begin
+        self.end = end
+        self.evalue = evalue
+        self.score = score
+        self.hmm_begin = hmm_begin
+        self.hmm_end = hmm_end
+        self.hmm_covered = hmm_covered
 
 def get_feature_from_Pfam(id_to_domains, add_score = False):
      """
-     Converts double-hash <id_to_domains> to a single string hash id-to-feature.
+     Converts double-hash <id_to_domains> (lists of <Pfam_hit> objects) to a single string hash id-to-feature.
      Could add score information (e-value, score, hmm coordinates) to the feature string,
      if <add_score> is True
      """
      Pfam_result = dict()
      for curr_id in id_to_domains.keys():
-         feature_string = ""
+         parts = list()
          for curr_name in id_to_domains[curr_id].keys():
-             feature_string += "[%s] " % curr_name
-             fields = id_to_domains[curr_id][curr_name].strip().split(" ")
-             for f in fields:
-                 (begin, end, e_value, score, hmm_begin, hmm_end) = get_values(f)
-                 if add_score:
-                     feature_string += "%i..%i..%s..%s..%s..%s," % (begin, end, e_value, score, hmm_begin, hmm_end)
-                 else:
-                     feature_string += "%i..%i," % (begin, end)
-             feature_string = feature_string.strip(",")
-             feature_string += "\t"
-         feature_string.strip("\t")
-         Pfam_result[curr_id] = feature_string
+             if add_score:
+                 hits = ["%i..%i..%s..%s..%s..%s" % (h.begin, h.end, h.evalue, h.score, h.hmm_begin, h.hmm_end) for h in id_to_domains[curr_id][curr_name]]
+             else:
+                 hits = ["%i..%i" % (h.begin, h.end) for h in id_to_domains[curr_id][curr_name]]
+             parts.append("[%s] %s\t" % (curr_name, ",".join(hits)))
+         Pfam_result[curr_id] = "".join(parts)
      return Pfam_result
 
 def remove_hit(remove_begin, remove_end, remove_name, protein_id, all_domains):
-    fields = all_domains[protein_id][remove_name].strip().split(" ")
-    all_domains[protein_id][remove_name] = ""
-    for f in fields:
-        (begin, end, evalue, score, hmm_begin, hmm_end) = get_values(f)
-        if (begin == remove_begin) and (end == remove_end): # Removing
-            continue
-        all_domains[protein_id][remove_name] += "%s..%s..%s..%s..%s..%s " % (begin, end, evalue, score, hmm_begin, hmm_end)
-    all_domains[protein_id][remove_name] = all_domains[protein_id][remove_name].strip()
+    hits = [h for h in all_domains[protein_id][remove_name] if (h.begin != remove_begin) or (h.end != remove_end)]
+    if len(hits) == 0: # This whole domain is marked for removal
+        hits = [Pfam_hit(0, 0, 100.0, 0.0, 0, 0)]
+    all_domains[protein_id][remove_name] = hits
 
-    if all_domains[protein_id][remove_name] == "": # This whole domain is marked for removal
-        all_domains[protein_id][remove_name] = "0..0..100..0..0..0"
-
-def check_overlap(target_domain, target_domain_name, protein_id, domains, threshold):
-    #print ("  OVERLAP FOR DOMAIN: %s" % target_domain_name)
-    target_fields = target_domain.strip().split(" ")
+def check_overlap(target_hits, target_domain_name, protein_id, domains, threshold):
+    """
+    Method removes hits overlapping with the <target_hits> (list of <Pfam_hit> objects) of the domain <target_domain_name>:
+    hit with worse e-value is removed. Returns tuple of numbers of target and other hits removed
+    """
     c = 0
     t = 0
-    for tf in target_fields:                               # Itterating domain hits
-        (target_begin, target_end, target_evalue, target_score, target_hmm_begin, target_hmm_end) = get_values(tf)
-        target_len = target_end - target_begin + 1
-        #print ("  TBEGIN = %i, TEND = %i, TEVALUE = %s" % (target_begin, target_end, target_evalue))
-
+    for target in list(target_hits):                       # Itterating domain hits
+        target_len = target.end - target.begin + 1
         for domain_name in domains[protein_id].keys():
             if domain_name == target_domain_name: # This is the same domain; skipping
                 continue
-            fields = domains[protein_id][domain_name].strip().split(" ")
-            for f in fields:                               # Itterating domain hits
-                (curr_begin, curr_end, curr_evalue, curr_score, curr_hmm_begin, curr_hmm_end) = get_values(f)
-                #print ("    CBEGIN = %i, CEND = %i, CEVALUE = %s" % (curr_begin, curr_end, curr_evalue))
-                curr_len = curr_end - curr_begin + 1
-                overlap = min(curr_end, target_end) - max(curr_begin, target_begin) + 1
+            for curr in list(domains[protein_id][domain_name]): # Itterating domain hits
+                curr_len = curr.end - curr.begin + 1
+                overlap = min(curr.end, target.end) - max(curr.begin, target.begin) + 1
                 if overlap < 0:
                    overlap = 0
                 if 100 * float(overlap) / max(target_len, curr_len) > threshold:
-                    if curr_evalue < target_evalue:
-                        #print ("    Current (%s) better than target (%s) for %s (%s vs. %s)" % (domain_name, target_domain_name, protein_id, curr_evalue, target_evalue))
-                        remove_hit(target_begin, target_end, target_domain_name, protein_id, domains)
+                    if curr.evalue < target.evalue:
+                        remove_hit(target.begin, target.end, target_domain_name, protein_id, domains)
                         c += 1
-                    elif (target_evalue < curr_evalue):
-                        #print ("    Target (%s) better than current (%s) for %s (%s vs. %s)" % (target_domain_name, domain_name, protein_id, target_evalue, curr_evalue))
-                        remove_hit(curr_begin, curr_end, domain_name, protein_id, domains)
-                        t += 1
-                    else: # Rare case of e-value equality
-                        remove_hit(curr_begin, curr_end, domain_name, protein_id, domains)
+                    else: # Target is better than current (or rare case of e-value equality)
+                        remove_hit(curr.begin, curr.end, domain_name, protein_id, domains)
                         t += 1
     return (c, t)
 
@@ -365,7 +357,6 @@ def filter_Pfam_hits(id_to_domains, threshold):
     print ("Filtering of domains started...")
     n = 0
     for curr_id in id_to_domains.keys():
-        #print ("OVERLAP FOR PROTEIN: %s" % curr_id)
         for curr_name in id_to_domains[curr_id].keys(): # Itterating by domains
             (c, t) = check_overlap(id_to_domains[curr_id][curr_name], curr_name, curr_id, id_to_domains, threshold)
             n += c + t
@@ -375,14 +366,9 @@ def filter_Pfam_hits(id_to_domains, threshold):
     d = 0
     for curr_id in id_to_domains.keys():
         for curr_name in id_to_domains[curr_id].keys():
-            fields = id_to_domains[curr_id][curr_name].strip().split(" ")
-            remove = False
-            for f in fields:
-                (begin, end, evalue, score, hmm_begin, hmm_end) = get_values(f)
-                if (begin == 0) and (end == 0):
-                    d += 1
-                    remove = True
-            if not remove:
+            removed = len([h for h in id_to_domains[curr_id][curr_name] if (h.begin == 0) and (h.end == 0)])
+            d += removed
+            if removed == 0:
                 if not curr_id in filtered:
                     filtered[curr_id] = dict()
                 filtered[curr_id][curr_name] = id_to_domains[curr_id][curr_name]
@@ -400,46 +386,31 @@ def unite_same_Pfam_hits(id_to_domains, max_distance = 50, max_hmm_overlap = 20)
     """
     n = 0
     for protein_id in id_to_domains.keys():
-        #print ("Protein_id = %s" % protein_id)
         for domain_name in id_to_domains[protein_id].keys():
-            curr_data = id_to_domains[protein_id][domain_name].strip().split(" ")
+            curr_data = id_to_domains[protein_id][domain_name]
             if len(curr_data) > 1: # More than a single hit of this domain found
-                curr_data.sort(key = lambda k: int(k.split("..")[0]), reverse = False)
+                curr_data.sort(key = lambda h: h.begin, reverse = False)
                 p = 0
-                #print ("  Domain occuring more than once = %s" % domain_name)
                 while p < len(curr_data) - 1:
-                     (fst_begin, fst_end, fst_evalue, fst_score, fst_hmm_begin, fst_hmm_end) = get_values(curr_data[p])
-                     (snd_begin, snd_end, snd_evalue, snd_score, snd_hmm_begin, snd_hmm_end) = get_values(curr_data[p + 1])
-                     try:
-                         curr_hmm_overlap = min(fst_hmm_end, snd_hmm_end) - max(fst_hmm_begin, snd_hmm_begin) + 1
-                         fst_hmm_size = fst_hmm_end - fst_hmm_begin
-                         snd_hmm_size = snd_hmm_end - snd_hmm_begin
-
-                         if ((snd_begin - fst_end) < max_distance) and (curr_hmm_overlap < (max(fst_hmm_size, snd_hmm_size) * max_hmm_overlap / 100)):
-                             if (fst_hmm_begin < snd_hmm_begin): #FIX: version 3.0 (added condition on HMM coordinates)
-                                 #curr_data[p] = "%s..%s..%s..%s..%s..%s" % (fst_begin, snd_end, min(fst_evalue, snd_evalue), max(fst_score, snd_score), fst_hmm_begin, snd_hmm_end)
-                                 curr_data[p] = "%s..%s..%s..%s..%s..%s" % (fst_begin, snd_end, fst_evalue * snd_evalue, fst_score + snd_score, fst_hmm_begin, snd_hmm_end) #FIX: version 2.9
-                                 curr_data.pop(p + 1)
-                                 n += 1
-                                 p -= 1
-                             #else:
-                             #    print ("    Yes! protein_id = %s" % protein_id)
-                             #    print (curr_data)
-                             #    print (fst_begin, fst_end, fst_evalue, fst_score, fst_hmm_begin, fst_hmm_end)
-                             #    print (snd_begin, snd_end, snd_evalue, snd_score, snd_hmm_begin, snd_hmm_end)
-                             #    print ("Domain distance: %s; HMM overlap: %s; fst_hmm_size = %s; snd_hmm_size = %s" % (snd_begin - fst_end, curr_hmm_overlap, fst_hmm_size, snd_hmm_size))
-                             #    raw_input()
-                     except:
-                         print ("Bad data found in <unite_same_Pfam_hits> method: '%s'" % curr_data[p])
-                         raw_input()
+                     fst = curr_data[p]
+                     snd = curr_data[p + 1]
+                     curr_hmm_overlap = min(fst.hmm_end, snd.hmm_end) - max(fst.hmm_begin, snd.hmm_begin) + 1
+                     fst_hmm_size = fst.hmm_end - fst.hmm_begin
+                     snd_hmm_size = snd.hmm_end - snd.hmm_begin
+
+                     if ((snd.begin - fst.end) < max_distance) and (curr_hmm_overlap < (max(fst_hmm_size, snd_hmm_size) * max_hmm_overlap / 100)):
+                         if (fst.hmm_begin < snd.hmm_begin): #FIX: version 3.0 (added condition on HMM coordinates)
+                             curr_data[p] = Pfam_hit(fst.begin, snd.end, fst.evalue * snd.evalue, fst.score + snd.score, fst.hmm_begin, snd.hmm_end) #FIX: version 2.9
+                             curr_data.pop(p + 1)
+                             n += 1
+                             p -= 1
                      p += 1
-            id_to_domains[protein_id][domain_name] = " ".join(curr_data)
     print ("Total %i unitings of the same domains were done!" % n)
     return id_to_domains
 
 def read_Pfam_output(input_filename, max_e_value, filter_hits, threshold, add_score = False, unite_same = False, max_distance = 50, max_hmm_overlap = 20, do_not_get_features = False, use_c_evalue = False, hmmsearch_output = False):
     """
-    Method reads <input_filename> produced under -domtblout option by hmmscan. It is
+    Method reads <input_filename> (or file-like object) produced under -domtblout option by hmmscan. It is
     working with hits with i (independent) e-value not higher than that given <max_e_value>.
     If <filter_hits> is set to True, it will apply filtering on the overlap <threshold>,
     which is currently calculated as:
@@ -450,7 +421,7 @@ def read_Pfam_output(input_filename, max_e_value, filter_hits, threshold, add_sc
     (less than <max_hmm_overlap> portion of the larger region in HMM should overlap with smaller) will
     be united
     If <do_not_get_features> is True, features are not obtained and <id_to_domains> are returned
-    as is
+    as is (protein IDs to domain names to lists of <Pfam_hit> objects)
     If <use_c_evalue> if True, conditional e-value (column #11) will be checked against <max_e_value>
     instead of independent e-value (column #12)
 
@@ -462,10 +433,17 @@ def read_Pfam_output(input_filename, max_e_value, filter_hits, threshold, add_sc
     (2) Hash with information about domains found: domain names as keys and <Pfam_domain>
     objects as values
     """
-    id_to_domains = dict()  # Hash of hashes: first by protein id, then by domain name.
+    id_to_domains = dict()  # Hash of hashes: first by protein id, then by domain name; values are lists of <Pfam_hit> objects
     domains = dict() # Hash of domain names as keys and <Pfam_domain> objects as values
-    input_file = open(input_filename, "r")
-    for string in input_file:
+    max_e_value = float(max_e_value)
+    (domain_column, protein_column) = (0, 3)
+    if hmmsearch_output: #FIX: version 3.3
+        (domain_column, protein_column) = (3, 0)
+    evalue_column = 12
+    if use_c_evalue:
+        evalue_column = 11
+    input_file = open_input(input_filename) #FIX: version 3.5
+    for string in input_file: #FIX: version 3.7 (each string is split once and its values are converted once)
         string = string.strip()
         if len(string) == 0:
             continue
@@ -476,54 +454,36 @@ def read_Pfam_output(input_filename, max_e_value, filter_hits, threshold, add_sc
         #  [0]                    [1]       [2]       [3]               [4]      [5]       [6]   [7]    [8]  [9] [10]  [11]        [12]    [13]  [14]  [15] [16]  [17]  [18]   [19]  [20] [21] [22]
         # ------------------- ---------- ----- -------------------- ---------- ----- --------- ------ ----- --- --- --------- --------- ------ ----- ----- ----- ----- ----- ----- ----- ---- ---------------------
         #MatC_N               PF07158.6    149 YP_003148402.1       -            447     1e-56  190.9  19.6   1   2   2.8e-60     1e-56  190.9  13.6     1   149     1   149     1   149 0.99 Dicarboxylate carrier protein MatC N-terminus
-        fields = re.split(" +", string, 22)
-        try:
-            domain_name = fields[0]
-            protein_id = fields[3]
-            if hmmsearch_output: #FIX: version 3.3
-                domain_name = fields[3]
-                protein_id = fields[0]
-            domain_ac = fields[1].split(".")[0]
-            domain_description = fields[22]
-            evalue = None
-            if use_c_evalue:
-                evalue = fields[11]
-            else:
-                evalue = fields[12]
-            score = fields[13]
-            hmm_length = fields[2]
-            hmm_begin = fields[15]
-            hmm_end = fields[16]
-            begin = fields[17]
-            end = fields[18]
-        except IndexError:
+        fields = string.split(None, 22)
+        if len(fields) < 23:
             print ("This string is no standart HMMer domtable output: %i fields detected" % len(fields))
             print (string)
             print (fields)
             sys.exit()
-        #print ("NAME = %s, AC = %s, DESCR = %s, PROTEIN = %s, begin = %s, end = %s" % (domain_name, domain_ac, domain_description, protein_id, begin, end))
-
         #---- 1) E-value check
-        if float(evalue) > float(max_e_value):
+        evalue = float(fields[evalue_column])
+        if evalue > max_e_value:
             continue
 
         #---- 2) Adding to hash with protein id as keys
-        if not protein_id in id_to_domains:
-            id_to_domains[protein_id] = dict()
-            id_to_domains[protein_id][domain_name] = ""
-        else:
-            if not domain_name in id_to_domains[protein_id]:
-                id_to_domains[protein_id][domain_name] = ""
-        hmm_covered = round((int(hmm_end) - int(hmm_begin) + 1) * 100 / int(hmm_length)) # FIX: version 2.1
-        id_to_domains[protein_id][domain_name] += "%s..%s..%s..%s..%s..%s..%s " % (begin, end, evalue, score, hmm_begin, hmm_end, hmm_covered)
+        domain_name = fields[domain_column]
+        protein_id = fields[protein_column]
+        protein_domains = id_to_domains.get(protein_id)
+        if protein_domains == None:
+            protein_domains = dict()
+            id_to_domains[protein_id] = protein_domains
+        hits = protein_domains.get(domain_name)
+        if hits == None:
+            hits = list()
+            protein_domains[domain_name] = hits
+        hmm_begin = int(fields[15])
+        hmm_end = int(fields[16])
+        hmm_covered = round((hmm_end - hmm_begin + 1) * 100 / int(fields[2])) # FIX: version 2.1
+        hits.append(Pfam_hit(int(fields[17]), int(fields[18]), evalue, float(fields[13]), hmm_begin, hmm_end, hmm_covered))
         #---- 3) Adding to hash with domain names as keys
         if not domain_name in domains:
-            curr_domain = Pfam_domain(domain_name, domain_ac, domain_description)
-            domains[domain_name] = curr_domain
+            domains[domain_name] = Pfam_domain(domain_name, fields[1].split(".")[0], fields[22])
     input_file.close()
-    for pid in id_to_domains.keys(): # FIX: version 3.1 (removement of the last space)
-        for domain in id_to_domains[pid].keys():
-            id_to_domains[pid][domain] = id_to_domains[pid][domain].strip()
  
     if unite_same == True:
         id_to_domains = unite_same_Pfam_hits(id_to_domains, max_distance, max_hmm_overlap)
@@ -611,6 +571,52 @@ def read_HMMer_table(filename, max_e_value, report_file = None):
     input_file.close()
     return hits
 
+def merge_HMMer_tables(filenames, output_filename):
+    """
+    Method merges HMMer tables (--tblout or --domtblout outputs) obtained for the parts of the same
+    query file into the <output_filename>: header of the first table, hits of all tables in the given
+    order and the summary of the first table with a single '# [ok]' line at the end.
+    Tables are read line by line, so large files are not kept in memory. FIX: version 3.6
+    """
+    output_file = open(output_filename, "w")
+    summary = list()
+    for i in range(len(filenames)):
+        reading_summary = False
+        input_file = open(filenames[i])
+        for string in input_file:
+            if string.strip() == "#": # Summary of the program run starts
+                reading_summary = True
+            if reading_summary:
+                if (i == 0) and (string.strip() != "# [ok]"):
+                    summary.append(string)
+                continue
+            if (string[0] == "#") and (i != 0): # Header is written only once
+                continue
+            output_file.write(string)
+        input_file.close()
+    output_file.write("".join(summary))
+    output_file.write("# [ok]\n")
+    output_file.close()
+
+def merge_HMMer_reports(filenames, output_filename):
+    """
+    Method merges main outputs of HMMer (-o option) obtained for the parts of the same query file
+    into the <output_filename>: header of the first output, results of all queries in the given
+    order and a single '[ok]' line at the end. FIX: version 3.6
+    """
+    output_file = open(output_filename, "w")
+    for i in range(len(filenames)):
+        reading_queries = (i == 0) # Header (before the first query) is written only once
+        input_file = open(filenames[i])
+        for string in input_file:
+            if string.startswith("Query:"):
+                reading_queries = True
+            if reading_queries and (string.strip() != "[ok]"):
+                output_file.write(string)
+        input_file.close()
+    output_file.write("[ok]\n")
+    output_file.close()
+
 def read_HMM_report(filename, reverse_order, type_of_id = "GI"):
     """
     Method reads the report file printed by the <read_HMMer_table> method of this package. Returns
@@ -653,19 +659,31 @@ def read_HMM_report(filename, reverse_order, type_of_id = "GI"):
 #                            (5) COG methods
 #------------------------------------------------------------------------------
 class COG_hit:
+    """
+    FIX: version 3.4 (coordinates are kept as integers in <begin_pos> and <end_pos>, COG names
+    are interned; <begin_end>, <begin()> and <end()> still return strings as before)
+    """
+    __slots__ = ("begin_pos", "end_pos", "COG_full", "protein_length")
+
     def __init__(self, begin, end, COG, protein_length = None):
-        self.begin_end = "%s..%s" % (begin, end)
-        self.COG_full = COG
+        self.begin_pos = int(begin)
+        self.end_pos = int(end)
+        self.COG_full = sys.intern(COG)
         self.protein_length = protein_length
 
+    @property
+    def begin_end(self):
+        return "%i..%i" % (self.begin_pos, self.end_pos)
+
     def get_COG(self):
         return self.COG_full.split("/")[0]
 
     def set_COG(self, new_COG):
         quality = self.get_problem_code()
-        self.COG_full = new_COG
+        COG_full = new_COG
         if quality != None:
-            self.COG_full += "/%s" % quality
+            COG_full += "/%s" % quality
+        self.COG_full = sys.intern(COG_full)
 
     def get_problem_code(self):
         if self.COG_full.count("/") != 0:
@@ -683,10 +701,10 @@ class COG_hit:
         return "[%s] %s" % (self.COG_full, self.begin_end)
 
     def begin(self):
-        return self.begin_end.split("..")[0]
+        return str(self.begin_pos)
 
     def end(self):
-        return self.begin_end.split("..")[1]
+        return str(self.end_pos)
 
     """
     def get_problem_data(self):
@@ -699,8 +717,8 @@ class COG_hit:
     """
 
 def sort_COGs(c1, c2):
-    b1 = int(c1.begin_end.split("..")[0])
-    b2 = int(c2.begin_end.split("..")[0])
+    b1 = c1.begin_pos
+    b2 = c2.begin_pos
 
     if b1 < b2:
         return -1
@@ -786,8 +804,8 @@ def read_single_COG_assignment(file_path, COG_assignment_large, gi_order, uid_to
         if not gi in COG_assignment:
             COG_assignment[gi] = list()
             #curr_uid = fields[1].split("_")[-1] #FIX: v.2.4 Old-style format of organism name (xxx_uidzzzz) is no longer applicable
-            curr_uid = fields[1]
-            organism = fields[1]
+            curr_uid = sys.intern(fields[1]) #FIX: version 3.4 (one string per organism)
+            organism = curr_uid
             prot_dict = {"gi" : gi, "org_uid" : curr_uid}
             uid_to_org[curr_uid] = fields[1]
             gi_order.append(prot_dict)
@@ -805,7 +823,7 @@ def read_single_COG_assignment(file_path, COG_assignment_large, gi_order, uid_to
             print ("WARNING: gi '%s' is found in multiple files!" % gi)
             #sys.exit()
         COG_assignment_large[gi].extend(COG_assignment[gi])
-        COG_assignment_large[gi] = sorted(COG_assignment_large[gi], key = lambda cog: cog.begin_end.split("..")[0])
+        COG_assignment_large[gi] = sorted(COG_assignment_large[gi], key = lambda cog: cog.begin())
     return (COG_assignment, organism)
 
 def read_COG_assignment(assign_folder, gi_to_org_file = None, type_of_id = "ID"):
@@ -1180,6 +1198,8 @@ def read_protein_table_info(filename, reverse = False):
 #------------------------------------------------------------------------------
 
 class BLAST_hit:
+    __slots__ = ("curr_id", "start", "end", "score")
+
     def __init__ (self, curr_id, start, end, score = None):
         self.curr_id = curr_id
         self.start = int(start)